@@ -1,8 +1,16 @@
 """
 This module provides the entry point for running the NotifyMe API. 
 Running application is possible using python -m notify.
+A single scheduler run is started with python -m notify scheduler, see `notify.celery_app.cli`.
 """
+import sys
+
 from notify.run import run
 
 if __name__ == "__main__":
-    run()
+    if sys.argv[1:2] == ["scheduler"]:
+        from notify.celery_app.cli import main
+
+        main(sys.argv[2:])
+    else:
+        run()
@@ -8,9 +8,11 @@ from notify.celery_app.init_celery import celery_init_app
 from notify.celery_app.tasks import celery_app
 from notify.repositories import bcrypt
 
+from . import http_client
 from .config import Config, DevConfig, ProdConfig, TestConfig
 from .database import mongo_db, psql_db
 from .routes import event_bp, main_bp, user_bp
+from .schema import upgrade_schema
 
 
 class CustomJSONProvider(DefaultJSONProvider):
@@ -40,6 +42,7 @@ def create_app(config: type[Config] = DevConfig) -> Flask:
     app = Flask(__name__)
     app.config.from_object(config)
     app.json = CustomJSONProvider(app)
+    http_client.configure(http_client.HttpClientConfig(**app.config.get("HTTP", {})))
 
     # Extensions initialization
     jwt.init_app(app)
@@ -58,6 +61,7 @@ def create_app(config: type[Config] = DevConfig) -> Flask:
     elif os.environ.get("FLASK_ENV") == "production":
         with app.app_context():
             psql_db.create_all()
+            upgrade_schema(psql_db)
 
     # Blueprints registration
     app.register_blueprint(main_bp)
@@ -3,11 +3,63 @@ from abc import ABC
 
 from .database import PSQL
 
+# Redis redelivers a task not acknowledged within the visibility timeout, even while its worker is still running it.
+# Scheduled runs are acknowledged after they finish, so the timeout has to be well above the longest run.
+BROKER_TRANSPORT_OPTIONS = dict(
+    visibility_timeout=max(
+        int(os.environ.get("CELERY_VISIBILITY_TIMEOUT", 6 * 3600)),
+        2 * int(float(os.environ.get("SCHEDULER_RUN_BUDGET", 0))),
+    ),
+)
+
 
 class Config(ABC):
     SECRET_KEY: str = os.environ.get('SECRET_KEY', 'secret')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     TESTING = False
+    SCHEDULER = dict(
+        grouped=os.environ.get("SCHEDULER_GROUPED", "false").lower() == "true",
+        shard_count=int(os.environ.get("SCHEDULER_SHARDS", 1)),
+        workers=int(os.environ.get("SCHEDULER_WORKERS", 1)),
+        engine=os.environ.get("SCHEDULER_ENGINE", "sync"),
+        concurrency=int(os.environ.get("SCHEDULER_CONCURRENCY", 100)),
+        pipeline=os.environ.get("SCHEDULER_PIPELINE", "false").lower() == "true",
+        fetch_workers=int(os.environ.get("SCHEDULER_FETCH_WORKERS", 4)),
+        render_workers=int(os.environ.get("SCHEDULER_RENDER_WORKERS", 1)),
+        send_workers=int(os.environ.get("SCHEDULER_SEND_WORKERS", 4)),
+        queue_size=int(os.environ.get("SCHEDULER_QUEUE_SIZE", 100)),
+        digest=os.environ.get("SCHEDULER_DIGEST", "false").lower() == "true",
+        merge_monday=os.environ.get("SCHEDULER_MERGE_MONDAY", "false").lower() == "true",
+        checkpoints=os.environ.get("SCHEDULER_CHECKPOINTS", "false").lower() == "true",
+        ledger=os.environ.get("SCHEDULER_LEDGER", "false").lower() == "true",
+        prewarm_lead_minutes=int(os.environ.get("SCHEDULER_PREWARM_LEAD_MINUTES", 15)),
+        prewarm_rate=float(os.environ.get("SCHEDULER_PREWARM_RATE", 5.0)),
+        weather_batch_size=int(os.environ.get("SCHEDULER_WEATHER_BATCH_SIZE", 1)),
+        flight_lock=os.environ.get("SCHEDULER_FLIGHT_LOCK", "false").lower() == "true",
+        flight_lock_ttl=float(os.environ.get("SCHEDULER_FLIGHT_LOCK_TTL", 30.0)),
+        combined_fetch=os.environ.get("SCHEDULER_COMBINED_FETCH", "false").lower() == "true",
+        lease=os.environ.get("SCHEDULER_LEASE", "false").lower() == "true",
+        lease_ttl=int(os.environ.get("SCHEDULER_LEASE_TTL", 120)),
+        shard_lease_ttl=int(os.environ.get("SCHEDULER_SHARD_LEASE_TTL", 3600)),
+        reports=os.environ.get("SCHEDULER_REPORTS", "false").lower() == "true",
+        send_windows=os.environ.get("SCHEDULER_SEND_WINDOWS", "false").lower() == "true",
+        send_window_backfill=int(os.environ.get("SCHEDULER_SEND_WINDOW_BACKFILL", 60)),
+        only_changes=os.environ.get("SCHEDULER_ONLY_CHANGES", "false").lower() == "true",
+        change_temperature=float(os.environ.get("SCHEDULER_CHANGE_TEMPERATURE", 2.0)),
+        change_precipitation=float(os.environ.get("SCHEDULER_CHANGE_PRECIPITATION", 1.0)),
+        change_probability=float(os.environ.get("SCHEDULER_CHANGE_PROBABILITY", 20.0)),
+        run_budget=float(os.environ.get("SCHEDULER_RUN_BUDGET", 0)),
+        catch_up_attempts=int(os.environ.get("SCHEDULER_CATCH_UP_ATTEMPTS", 3)),
+        memory_profile=os.environ.get("SCHEDULER_MEMORY_PROFILE", "false").lower() == "true",
+        memory_every=int(os.environ.get("SCHEDULER_MEMORY_EVERY", 1000)),
+        memory_top=int(os.environ.get("SCHEDULER_MEMORY_TOP", 10)),
+        redis_url=os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379"),
+    )
+    HTTP = dict(
+        pool_maxsize=int(os.environ.get("HTTP_POOL_SIZE", 10)),
+        retries=int(os.environ.get("HTTP_RETRIES", 3)),
+        backoff_factor=float(os.environ.get("HTTP_BACKOFF", 0.5)),
+    )
 
 
 class TestConfig(Config):
@@ -19,7 +71,8 @@ class TestConfig(Config):
     CELERY = dict(
         broker_url=f"redis://{HOST}:6379",
         result_backend=f"redis://{HOST}:6379",
-        task_ignore_result=True
+        task_ignore_result=True,
+        broker_transport_options=BROKER_TRANSPORT_OPTIONS,
     )
     MONGO_COLLECTION_NAME = 'test_collection'
 
@@ -34,7 +87,8 @@ class DevConfig(Config):
     CELERY = dict(
         broker_url=os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379"),
         result_backend=os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379"),
-        task_ignore_result=True
+        task_ignore_result=True,
+        broker_transport_options=BROKER_TRANSPORT_OPTIONS,
     )
 
 
@@ -47,5 +101,6 @@ class ProdConfig(Config):
     CELERY = dict(
         broker_url=os.environ.get("CELERY_BROKER_URL"),
         result_backend=os.environ.get("CELERY_RESULT_BACKEND"),
-        task_ignore_result=True
+        task_ignore_result=True,
+        broker_transport_options=BROKER_TRANSPORT_OPTIONS,
     )
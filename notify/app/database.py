@@ -1,8 +1,10 @@
 import os
 from contextlib import contextmanager
+from functools import lru_cache
 
 from flask_pymongo import PyMongo
 from flask_sqlalchemy import SQLAlchemy
+from redis import Redis
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.scoping import scoped_session
 
@@ -23,6 +25,12 @@ class PSQL:
         return f'postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.db_name}'
 
 
+@lru_cache
+def get_redis(url: str) -> Redis:
+    """Return a Redis client for the given URL. Clients are shared, as every client holds its own connection pool."""
+    return Redis.from_url(url)
+
+
 @contextmanager
 def session_scope(session: Session | scoped_session):
     """Provide a transactional scope around a series of operations."""
@@ -0,0 +1,53 @@
+import time
+
+from notify.exceptions.exceptions import DeadlineExceededException
+
+
+class Deadline:
+    """
+    Time budget shared by all calls made during a scheduler run.
+
+    Services performing network calls receive a `Deadline` and derive their timeouts from it, so a slow
+    upstream cannot make a run last longer than its budget.
+
+    Attributes:
+        budget: A float representing the number of seconds a run may take.
+        expires_at: A float representing the `time.monotonic` value at which the budget is used up.
+    """
+
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+        self.start()
+
+    def start(self) -> None:
+        self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, default: float, operation: str = "call") -> float:
+        """
+        Returns the timeout of a single call, limited by the remaining budget.
+
+        Args:
+            default: A float representing the timeout used when there is enough time left.
+            operation: A string describing the call, used in the exception message.
+
+        Returns:
+            A float representing the timeout in seconds.
+
+        Raises:
+            DeadlineExceededException: If the budget is already used up.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededException(operation)
+        return min(default, remaining)
+
+
+def call_timeout(deadline: Deadline | None, default: float, operation: str = "call") -> float:
+    """Returns `default`, or the timeout derived from `deadline` if one is given."""
+    return default if deadline is None else deadline.timeout(default, operation)
@@ -0,0 +1,290 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from notify.app.deadline import Deadline
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.WEATHER, "HTTP_CLIENT")
+
+
+@dataclass(frozen=True)
+class HttpClientConfig:
+    """
+    Settings of the connection pool and retry policy of outbound HTTP calls.
+
+    Attributes:
+        pool_connections: An integer representing the number of hosts with a pool of kept-alive connections.
+        pool_maxsize: An integer representing the number of connections kept alive per host. It should be
+            at least the number of threads calling the same host, e.g. the scheduler workers.
+        retries: An integer representing the number of times a failed request is repeated.
+        backoff_factor: A float representing the base delay in seconds before a retry. The delay doubles
+            with every retry.
+        backoff_jitter: A float representing the maximum random delay in seconds added to every backoff,
+            so requests failed at the same time are not repeated at the same time.
+        backoff_max: A float representing the maximum delay in seconds before a retry.
+        status_forcelist: A tuple of HTTP status codes after which a request is repeated.
+        async_max_connections: An integer representing the maximum number of connections opened by
+            the async client of an event loop, which limits the number of requests in flight.
+    """
+
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    retries: int = 3
+    backoff_factor: float = 0.5
+    backoff_jitter: float = 0.5
+    backoff_max: float = 10.0
+    status_forcelist: tuple[int, ...] = (429, 500, 502, 503, 504)
+    async_max_connections: int = 100
+
+
+class RetryPolicy:
+    """
+    Retry policy shared by the sync and async clients.
+
+    A request is repeated after connection errors, timeouts and the status codes of
+    `HttpClientConfig.status_forcelist`, with exponential, jittered backoff. With a `Deadline`, the timeout
+    of every attempt is limited by the remaining budget, and a request is not repeated if the budget runs out
+    before the backoff is over, so all attempts together never take longer than the deadline allows.
+
+    Attributes:
+        config: An `HttpClientConfig` object with the settings of the pool and retries.
+    """
+
+    config: HttpClientConfig
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the number of seconds to wait before the retry following the given attempt."""
+        delay = min(self.config.backoff_max, self.config.backoff_factor * 2 ** attempt)
+        return delay + random.uniform(0, self.config.backoff_jitter)
+
+    @staticmethod
+    def attempt_timeout(timeout: float | None, deadline: Deadline | None) -> float | None:
+        """Returns the timeout of a single attempt, limited by the remaining budget of the deadline."""
+        if deadline is None:
+            return timeout
+        return deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+
+    def retry_delay(self, attempt: int, deadline: Deadline | None) -> float | None:
+        """
+        Returns the number of seconds to wait before repeating a failed attempt.
+
+        Returns:
+            A float, or None if the request should not be repeated, since it was the last attempt
+                or the deadline would pass during the backoff.
+        """
+        if attempt >= self.config.retries:
+            return None
+        delay = self.backoff(attempt)
+        if deadline is not None and deadline.remaining() <= delay:
+            return None
+        return delay
+
+
+class HttpClient(RetryPolicy):
+    """
+    Per-process HTTP client keeping connections alive between calls.
+
+    All threads of a process share a single connection pool, while every thread uses its own `requests.Session`,
+    since sessions are not guaranteed to be thread-safe. The pool is created again in a forked process,
+    e.g. a Celery worker, so connections opened by the parent are never shared with a child.
+
+    Requests are sent with gzip compression accepted and are repeated according to `RetryPolicy`.
+
+    Attributes:
+        config: An `HttpClientConfig` object with the settings of the pool and retries.
+    """
+
+    def __init__(self, config: HttpClientConfig | None = None) -> None:
+        self.config = config or HttpClientConfig()
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._adapter: HTTPAdapter | None = None
+        self._local = threading.local()
+
+    def configure(self, config: HttpClientConfig) -> None:
+        """Applies new settings. The pool is created again on the next request."""
+        with self._lock:
+            self.config = config
+            self._pid = None
+
+    def get(
+        self, url: str, timeout: float | None = None, deadline: Deadline | None = None, **kwargs
+    ) -> requests.Response:
+        """
+        Sends a GET request, repeating it after errors.
+
+        Args:
+            url: A string representing the URL to get.
+            timeout: An optional float representing the connect and read timeout of every attempt in seconds.
+            deadline: An optional `Deadline` object limiting the total time of all attempts.
+
+        Returns:
+            A `requests.Response` object of the last attempt.
+        """
+        session = self.session()
+        attempt = 0
+        while True:
+            try:
+                response = session.get(url, timeout=self.attempt_timeout(timeout, deadline), **kwargs)
+                if response.status_code not in self.config.status_forcelist:
+                    return response
+                delay = self.retry_delay(attempt, deadline)
+                if delay is None:
+                    return response
+                logger.warning(f"Status {response.status_code} while getting {url}, attempt {attempt + 1}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self.retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                logger.warning(f"Error {e!r} while getting {url}, attempt {attempt + 1}")
+            time.sleep(delay)
+            attempt += 1
+
+    def session(self) -> requests.Session:
+        """Returns the session of the calling thread, sharing the connection pool of the process."""
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # Connections inherited from the parent process are dropped without closing them,
+                    # since their sockets are still used by the parent.
+                    self._adapter = self.create_adapter()
+                    self._local = threading.local()
+                    self._pid = pid
+                    logger.info(f"Created HTTP connection pool in process {pid}")
+
+        local = self._local
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = self.create_session(self._adapter)
+        return session
+
+    def create_adapter(self) -> HTTPAdapter:
+        # Requests are repeated by `get`, which keeps the attempts within the deadline of the call.
+        return HTTPAdapter(
+            pool_connections=self.config.pool_connections,
+            pool_maxsize=self.config.pool_maxsize,
+            max_retries=0,
+        )
+
+    @staticmethod
+    def create_session(adapter: HTTPAdapter) -> requests.Session:
+        session = requests.Session()
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+
+class AsyncHttpClient(RetryPolicy):
+    """
+    Non-blocking HTTP client keeping connections alive between calls.
+
+    An `httpx.AsyncClient` is bound to the event loop it is used in, so every event loop of a process
+    gets its own client and connection pool. Like `HttpClient`, the clients are created again in a forked
+    process, and requests are repeated according to `RetryPolicy`.
+
+    Attributes:
+        config: An `HttpClientConfig` object with the settings of the pool and retries.
+    """
+
+    def __init__(self, config: HttpClientConfig | None = None) -> None:
+        self.config = config or HttpClientConfig()
+        self._pid: int | None = None
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def configure(self, config: HttpClientConfig) -> None:
+        """Applies new settings. The clients are created again on the next request."""
+        self.config = config
+        self._pid = None
+
+    async def get(
+        self, url: str, timeout: float | None = None, deadline: Deadline | None = None, **kwargs
+    ) -> httpx.Response:
+        """
+        Sends a GET request, repeating it after errors.
+
+        Args:
+            url: A string representing the URL to get.
+            timeout: An optional float representing the timeout of every attempt in seconds.
+            deadline: An optional `Deadline` object limiting the total time of all attempts.
+
+        Returns:
+            An `httpx.Response` object of the last attempt.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = await self.client().get(url, timeout=self.attempt_timeout(timeout, deadline), **kwargs)
+                if response.status_code not in self.config.status_forcelist:
+                    return response
+                delay = self.retry_delay(attempt, deadline)
+                if delay is None:
+                    return response
+                logger.warning(f"Status {response.status_code} while getting {url}, attempt {attempt + 1}")
+            except httpx.TransportError as e:
+                delay = self.retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                logger.warning(f"Error {e!r} while getting {url}, attempt {attempt + 1}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def client(self) -> httpx.AsyncClient:
+        """Returns the client of the running event loop."""
+        if self._pid != os.getpid():
+            self._clients = weakref.WeakKeyDictionary()
+            self._pid = os.getpid()
+            logger.info(f"Created async HTTP clients in process {self._pid}")
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._clients[loop] = self.create_client()
+        return client
+
+    def create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.config.async_max_connections,
+            max_keepalive_connections=self.config.pool_maxsize,
+        )
+        return httpx.AsyncClient(limits=limits)
+
+    async def aclose(self) -> None:
+        """Closes the client of the running event loop. It is created again by the next request."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+client = HttpClient()
+async_client = AsyncHttpClient()
+
+
+def get(url: str, timeout: float | None = None, deadline: Deadline | None = None, **kwargs) -> requests.Response:
+    """Sends a GET request with the client of the process."""
+    return client.get(url, timeout, deadline, **kwargs)
+
+
+async def aget(url: str, timeout: float | None = None, deadline: Deadline | None = None, **kwargs) -> httpx.Response:
+    """Sends a GET request with the async client of the running event loop."""
+    return await async_client.get(url, timeout, deadline, **kwargs)
+
+
+async def aclose() -> None:
+    """Closes the async client of the running event loop, e.g. at the end of a run owning the loop."""
+    await async_client.aclose()
+
+
+def configure(config: HttpClientConfig) -> None:
+    client.configure(config)
+    async_client.configure(config)
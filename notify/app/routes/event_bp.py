@@ -22,10 +22,14 @@ def home_event():
         A JSON response containing a welcome message, JWT token, and available fields.
     """
     fields = {
-        "event_type": "all/precipitation/temperature",
+        "event_type": "all/precipitation/temperature/alert",
         "frequency": "day/hour",
         "city": "city",
         "country": "country",
+        "only_changes": "true/false (optional)",
+        "alert_measure": "temperature/humidity/precipitation/precipitation_probability (alert only)",
+        "alert_operator": "> or < (alert only)",
+        "alert_threshold": "number (alert only)",
     }
     return jsonify({"message": "Welcome to event page", "jwt_token": "obligatory", "fields": fields}), 200
 
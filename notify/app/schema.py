@@ -0,0 +1,58 @@
+"""
+Upgrades of the PostgreSQL schema.
+
+`create_all` creates missing tables, but does not change tables which already exist. Columns and indexes
+added to the models later are added by `upgrade_schema` instead, which runs after `create_all` in production.
+Every statement can be repeated, so the upgrade runs at every start of the application.
+"""
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from notify.app.logger import LoggerType, create_logger
+from notify.repositories.event_repository import EventRepository
+
+logger = create_logger(LoggerType.EVENT, "SCHEMA")
+
+# Values of the event_type enum added after the table was created. Postgres does not allow a new enum value
+# to be used in the transaction adding it, so they are committed before the columns are upgraded.
+EVENT_TYPES = ("ALERT",)
+
+EVENT_UPGRADES = (
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS timezone VARCHAR(64)",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS send_minute INTEGER",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS only_changes BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS alert_measure VARCHAR(32)",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS alert_operator VARCHAR(1)",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS alert_threshold FLOAT",
+    "ALTER TABLE event ADD COLUMN IF NOT EXISTS location_hash BIGINT",
+    "CREATE INDEX IF NOT EXISTS ix_event_send_window ON event (frequency, send_minute)",
+    # Reports and alerts of a location are kept unique by separate indexes, see `Event`.
+    "ALTER TABLE event DROP CONSTRAINT IF EXISTS unique_event",
+    "CREATE UNIQUE INDEX IF NOT EXISTS unique_report ON event (user_id, frequency, city, country, event_type)"
+    " WHERE alert_measure IS NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS unique_alert"
+    " ON event (user_id, frequency, city, country, alert_measure, alert_operator, alert_threshold)"
+    " WHERE alert_measure IS NOT NULL",
+)
+
+
+def upgrade_schema(db: SQLAlchemy) -> None:
+    """
+    Adds the columns and indexes missing in an existing PostgreSQL database, and sets the location hash
+    of events created before it was stored. Other databases are created from the models, so they are skipped.
+
+    Args:
+        db: A `SQLAlchemy` object of the application, used within its application context.
+    """
+    if db.engine.dialect.name != "postgresql":
+        return
+
+    with db.engine.begin() as connection:
+        for value in EVENT_TYPES:
+            connection.execute(text(f"ALTER TYPE eventtype ADD VALUE IF NOT EXISTS '{value}'"))
+    with db.engine.begin() as connection:
+        for statement in EVENT_UPGRADES:
+            connection.execute(text(statement))
+
+    updated = EventRepository(db.session).set_location_hashes()
+    logger.info(f"Schema upgraded, location hash set for {updated} events")
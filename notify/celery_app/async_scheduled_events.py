@@ -0,0 +1,438 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Iterable, Protocol
+
+from notify.app import http_client
+from notify.app.deadline import Deadline
+from notify.app.logger import LoggerType, create_logger
+from notify.exceptions.exceptions import DeadlineExceededException
+from notify.models.event import Event
+from notify.models.query_params import EventType, Frequency
+from notify.models.subscription import Subscription
+from notify.weather.alerts import Alert
+
+from .catch_up import CatchUpQueue
+from .checkpoints import RUN_FINISHED, CheckpointStore
+from .config import SchedulerConfig
+from .delivery_ledger import DeliveryLedger
+from .forecast_changes import ChangeFilter
+from .memory_profile import MemoryProfiler
+from .run_report import RunMetrics, RunReportStore
+from .scheduled_events import (DatabaseEvents, MailScheduler, MessageBuilder,
+                               Place, RunSummary, Sender, WeatherProvider,
+                               evaluate_alerts)
+
+logger = create_logger(LoggerType.WEATHER, "ASYNC_SCHEDULER")
+
+
+class AsyncSender(Protocol):
+    async def send(self, subject: str, msg: str, receiver: str) -> bool:
+        ...
+
+    async def aclose(self) -> None:
+        ...
+
+
+class AsyncWeatherProvider(Protocol):
+    async def get_weather(self, frequency: Frequency, city: str, country: str) -> list[Any] | None:
+        ...
+
+
+class PooledSender:
+    """
+    Adapter sending emails with a blocking `Sender` in a small pool of threads, so sends can be awaited.
+
+    There is no awaitable SMTP client among the dependencies, so emails are sent by `workers` threads of a pool
+    owned by the adapter. Sends beyond that wait for a free thread, without holding up weather requests.
+    The pool is created by the first send and shut down by `aclose` at the end of a run.
+
+    Attributes:
+        sender: A `Sender` object sending the emails.
+        workers: An integer representing the number of emails sent at the same time.
+    """
+
+    def __init__(self, sender: Sender, workers: int = 4) -> None:
+        self.sender = sender
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def send(self, subject: str, msg: str, receiver: str) -> bool:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="async_sender")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.sender.send, subject, msg, receiver)
+
+    async def aclose(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class ThreadedWeatherProvider:
+    """
+    Adapter running a blocking `WeatherProvider` in a thread of the default executor, so it can be awaited.
+
+    Scheduled runs use `AsyncWeatherManager` instead. The adapter is used for blocking providers,
+    e.g. the synthetic ones of `notify.celery_app.benchmark`.
+    """
+
+    def __init__(self, weather_provider: WeatherProvider) -> None:
+        self.weather_provider = weather_provider
+
+    async def get_weather(self, frequency: Frequency, city: str, country: str) -> list[Any] | None:
+        return await asyncio.to_thread(self.weather_provider.get_weather, frequency, city, country)
+
+
+class AsyncMailScheduler:
+    """
+    Class for scheduling emails on an asyncio event loop.
+
+    Subscriptions are grouped by location like in `MailScheduler`, but locations are processed as concurrent tasks.
+    The number of weather fetches and sends in flight at the same time is limited by `config.concurrency`.
+    Weather and geocoding requests are awaited on the event loop, see `AsyncWeatherManager`, while emails are sent
+    by the small thread pool of `PooledSender`. Short blocking calls, such as reading the next batch of
+    subscriptions and the Redis lookups of the ledger, change filter and checkpoints, run in the default executor,
+    so they do not stall the event loop.
+
+    Like the grouped mode of `MailScheduler`, the engine evaluates alert rules once per location, saves
+    a checkpoint once a location and all locations before it are finished, and samples the memory of the run.
+
+    Attributes:
+        sender: An `AsyncSender` object representing the email sender to use.
+        database_events: A `DatabaseEvents` object representing the event database to use.
+        weather_provider: An `AsyncWeatherProvider` object representing the weather provider to use.
+        message_builder: A `MessageBuilder` object representing the message builder to use.
+        frequency: A `Frequency` object representing the frequency of the email sends.
+        config: A `SchedulerConfig` object representing the settings of the run.
+        ledger: An optional `DeliveryLedger` object recording delivered reports, so a report is not sent twice
+            for the same forecast date.
+        metrics: A `RunMetrics` object collecting the stage timers and counters of the current run.
+        reports: An optional `RunReportStore` object persisting the report of every finished run.
+        changes: An optional `ChangeFilter` object skipping the reports of events subscribed with `only_changes`
+            whose forecast did not change since the last report.
+        deadline: An optional `Deadline` object limiting the duration of a run, shared with the weather provider
+            and the sender like in `MailScheduler`.
+        catch_up: An optional `CatchUpQueue` object receiving the subscriptions that could not be processed
+            before the deadline.
+        checkpoints: An optional `CheckpointStore` object used to save the progress of the run,
+            so an interrupted run continues after the last finished location.
+        memory: An optional `MemoryProfiler` object sampling the memory of the run. Its results are added
+            to the run report.
+        summary: A `RunSummary` object with the counts of the current run.
+    """
+
+    def __init__(
+        self,
+        sender: AsyncSender,
+        database_events: DatabaseEvents,
+        weather_provider: AsyncWeatherProvider,
+        message_builder: MessageBuilder,
+        frequency: Frequency,
+        config: SchedulerConfig | None = None,
+        ledger: DeliveryLedger | None = None,
+        metrics: RunMetrics | None = None,
+        reports: RunReportStore | None = None,
+        changes: ChangeFilter | None = None,
+        deadline: Deadline | None = None,
+        catch_up: CatchUpQueue | None = None,
+        checkpoints: CheckpointStore | None = None,
+        memory: MemoryProfiler | None = None,
+    ) -> None:
+        self.sender = sender
+        self.database_events = database_events
+        self.weather_provider = weather_provider
+        self.message_builder = message_builder
+        self.frequency = frequency
+        self.config = config or SchedulerConfig()
+        self.ledger = ledger
+        self.metrics = metrics or RunMetrics()
+        self.reports = reports
+        self.changes = changes
+        self.deadline = deadline
+        self.catch_up = catch_up
+        self.checkpoints = checkpoints
+        self.memory = memory
+        self.memory_report: dict[str, Any] | None = None
+        self.watermark: Any = None
+        self.summary = RunSummary()
+
+    def get_subscriptions(self) -> Iterable[Subscription]:
+        config = self.config
+        after = tuple(self.watermark) if isinstance(self.watermark, list) else None
+        shard = None if config.shard_count == 1 else (config.shard_index, config.shard_count)
+        return self.metrics.timed(
+            "get_events",
+            self.database_events.get_subscriptions(
+                self.frequency, after=after, send_minute=config.send_minute, shard=shard
+            ),
+        )
+
+    def run(self) -> RunSummary:
+        """
+        Sends the reports of the given frequency to all subscribers, blocking until the run is finished.
+
+        Returns:
+            A `RunSummary` object with the counts of sent, failed and skipped reports.
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> RunSummary:
+        """
+        Sends the reports of the given frequency to all subscribers.
+
+        Errors reading subscriptions are raised, and the run is then not marked as finished,
+        so a retried run continues from its last checkpoint.
+
+        Returns:
+            A `RunSummary` object with the counts of sent, failed and skipped reports.
+        """
+        self.summary = RunSummary()
+        self.metrics.reset()
+        self.memory_report = None
+        if self.memory is not None:
+            self.memory.start()
+        try:
+            if self.deadline is not None:
+                self.deadline.start()
+            self.watermark = await asyncio.to_thread(self.load_checkpoint)
+            if self.watermark == RUN_FINISHED:
+                logger.info(f"Run {self.run_id} has already finished")
+                return self.summary
+            if self.watermark is not None:
+                logger.info(f"Resuming run {self.run_id} after {self.watermark}")
+
+            await self.process_locations()
+
+            await asyncio.to_thread(self.save_checkpoint, RUN_FINISHED)
+            logger.info(f"Run finished: {self.summary}")
+        finally:
+            self.stop_memory_profile()
+            await self.sender.aclose()
+            # The HTTP client of the weather requests is bound to this event loop, which ends with the run.
+            await http_client.aclose()
+        self.save_report()
+        return self.summary
+
+    async def process_locations(self) -> None:
+        """
+        Creates a task for every location.
+
+        At most `config.concurrency` location tasks are pending at once, so subscriptions are not read from
+        the database faster than they are processed. Locations are read in a thread, as reading the next one
+        may fetch a batch of subscriptions from the database.
+        """
+        self._semaphore = asyncio.Semaphore(self.config.concurrency)
+        pending: set[asyncio.Task] = set()
+        locations: deque[tuple[Place, asyncio.Task]] = deque()
+
+        stream = MailScheduler.group_by_location(self.get_subscriptions())
+        while (location := await asyncio.to_thread(next, stream, None)) is not None:
+            (_, city, country), subscriptions = location
+            if len(pending) >= self.config.concurrency:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await self.checkpoint_locations(locations)
+            task = asyncio.create_task(self.process_location(city, country, subscriptions))
+            pending.add(task)
+            if self.checkpoints is not None:
+                locations.append(((city, country), task))
+
+        if pending:
+            await asyncio.wait(pending)
+
+    async def checkpoint_locations(self, locations: deque[tuple[Place, asyncio.Task]]) -> None:
+        """
+        Saves a checkpoint after the last location finished together with all locations before it.
+
+        Args:
+            locations: A deque of the locations and their tasks, in the order the locations were read.
+        """
+        finished = None
+        while locations and locations[0][1].done():
+            finished, _ = locations.popleft()
+        if finished is not None:
+            await asyncio.to_thread(self.save_checkpoint, list(finished))
+
+    @property
+    def run_id(self) -> str:
+        """ID of the run, unique per frequency, day, shard and send minute, like the ID of `MailScheduler`."""
+        config = self.config
+        run_id = f"{self.frequency.value}:{date.today().isoformat()}:{config.shard_index}-{config.shard_count}"
+        if config.send_minute is not None:
+            run_id += f":{config.send_minute}"
+        if config.catch_up:
+            run_id += ":catch-up"
+        return run_id
+
+    def load_checkpoint(self) -> Any:
+        if self.checkpoints is None:
+            return None
+        try:
+            return self.checkpoints.get(self.run_id)
+        except Exception as e:
+            logger.exception(e)
+            return None
+
+    def save_checkpoint(self, watermark: Any) -> None:
+        if self.checkpoints is None:
+            return
+        try:
+            self.checkpoints.save(self.run_id, watermark)
+        except Exception as e:
+            logger.exception(e)
+
+    def save_report(self) -> None:
+        if self.reports is None:
+            return
+        try:
+            report = self.metrics.report(self.run_id, self.frequency.value, self.summary)
+            if self.memory_report is not None:
+                report["memory"] = self.memory_report
+            self.reports.save(report)
+        except Exception as e:
+            logger.exception(e)
+
+    def stop_memory_profile(self) -> None:
+        if self.memory is None:
+            return
+        try:
+            self.memory_report = self.memory.stop()
+        except Exception as e:
+            logger.exception(e)
+
+    def check_deadline(self, operation: str) -> None:
+        """Raises `DeadlineExceededException` if the deadline of the run is exceeded."""
+        if self.deadline is not None and self.deadline.expired():
+            raise DeadlineExceededException(operation)
+
+    async def defer(self, subscriptions: list[Subscription]) -> None:
+        """
+        Moves subscriptions which could not be processed before the deadline to the catch-up queue.
+
+        Args:
+            subscriptions: A list of `Subscription` objects whose reports were not sent.
+        """
+        self.summary.deferred += len(subscriptions)
+        self.metrics.increment("deferred", len(subscriptions))
+        if self.catch_up is None:
+            return
+        try:
+            await asyncio.to_thread(self.catch_up.push, subscriptions)
+        except Exception as e:
+            logger.exception(e)
+
+    async def process_location(self, city: str, country: str, subscriptions: list[Subscription]) -> None:
+        """
+        Sends reports to all subscribers of a single location.
+
+        Args:
+            city: A string representing the city of the location.
+            country: A string representing the country of the location.
+            subscriptions: A list of `Subscription` objects for the location.
+        """
+        try:
+            async with self._semaphore:
+                self.check_deadline("getting weather")
+                with self.metrics.timer("get_weather"):
+                    weather = await self.weather_provider.get_weather(self.frequency, city, country)
+        except DeadlineExceededException:
+            await self.defer(subscriptions)
+            return
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("weather_failures")
+            self.summary.failed += len(subscriptions)
+            return
+        if weather is None:
+            self.metrics.increment("weather_missing")
+            self.summary.skipped += len(subscriptions)
+            return
+        logger.info(f"Weather fetched for {city}, {country}, sending to {len(subscriptions)} subscribers")
+
+        deliverable = self.filter_alerts(subscriptions, weather)
+        await asyncio.gather(*(self.deliver(s.email, s.event, weather, alert) for s, alert in deliverable))
+        if self.memory is not None:
+            self.memory.tick("locations")
+
+    def filter_alerts(
+        self, subscriptions: list[Subscription], weather: list
+    ) -> list[tuple[Subscription, Alert | None]]:
+        """Evaluates the rules of all alert subscriptions of a location at once, see `MailScheduler.filter_alerts`."""
+        if all(s.event.event_type != EventType.ALERT for s in subscriptions):
+            return [(s, None) for s in subscriptions]
+
+        with self.metrics.timer("evaluate_alerts"):
+            deliverable = evaluate_alerts(subscriptions, weather)
+        quiet = len(subscriptions) - len(deliverable)
+        self.metrics.increment("quiet_alerts", quiet)
+        self.summary.skipped += quiet
+        return deliverable
+
+    async def deliver(self, email: str, event: Event, weather: list, alert: Alert | None = None) -> None:
+        """
+        Builds the report for an event and sends it to the recipient.
+
+        Args:
+            email: A string representing the email address of the recipient.
+            event: An `Event` object representing the event to build the report for.
+            weather: A list of measurements for the event location.
+            alert: An optional `Alert` object of an alert event, if its rule was already evaluated.
+        """
+        try:
+            if await self.was_delivered(event):
+                logger.info(f"Report for event #{event.event_id} was already delivered to {email}")
+                self.metrics.increment("already_delivered")
+                self.summary.skipped += 1
+                return
+            if self.changes is not None and await asyncio.to_thread(self.changes.is_unchanged, event, weather):
+                logger.info(f"Forecast for event #{event.event_id} did not change, skipping report to {email}")
+                self.metrics.increment("unchanged_reports")
+                self.summary.skipped += 1
+                return
+
+            with self.metrics.timer("build_message"):
+                title, message = self.message_builder.compose_message(event, weather, alert)
+            if title is None or message is None:
+                self.metrics.increment("empty_reports")
+                self.summary.skipped += 1
+                return
+
+            async with self._semaphore:
+                self.check_deadline("sending email")
+                with self.metrics.timer("send_mail"):
+                    sent = await self.sender.send(title, message, email)
+            if sent:
+                self.summary.sent += 1
+                await self.mark_delivered(event)
+                if self.changes is not None:
+                    await asyncio.to_thread(self.changes.record, event, weather)
+                logger.info(f"Email sent to {email}")
+            else:
+                self.metrics.increment("send_failures")
+                self.summary.failed += 1
+        except DeadlineExceededException:
+            await self.defer([Subscription(user_id=event.user_id, email=email, event=event)])
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("delivery_failures")
+            self.summary.failed += 1
+
+    async def was_delivered(self, event: Event) -> bool:
+        if self.ledger is None:
+            return False
+        try:
+            return await asyncio.to_thread(
+                self.ledger.was_delivered, event.user_id, event.event_id, date.today().isoformat()
+            )
+        except Exception as e:
+            logger.exception(e)
+            return False
+
+    async def mark_delivered(self, event: Event) -> None:
+        if self.ledger is None:
+            return
+        try:
+            await asyncio.to_thread(self.ledger.mark_delivered, event.user_id, event.event_id, date.today().isoformat())
+        except Exception as e:
+            logger.exception(e)
@@ -0,0 +1,338 @@
+"""
+Synthetic dry-run benchmark of the scheduler.
+
+The scheduler is run with generated users and events, a deterministic fake weather provider and a sender
+which only counts messages, so no database, weather API or SMTP server is needed. The benchmark reports
+the throughput, the latency of single events and the peak memory of a run.
+
+Usage:
+    python -m notify.celery_app.benchmark --events 10000 --locations 500 --workers 8 --grouped
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+import zlib
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+from threading import Lock
+from typing import Callable, Iterator, Sequence
+
+import notify.app  # noqa: F401, the app package has to be initialized before the models
+from notify.models.event import Event
+from notify.models.measurements import DayMeasurements, HourMeasurements
+from notify.models.query_params import EventType, Frequency
+from notify.models.shard import Shard, shard_of
+from notify.models.subscription import Subscription
+from notify.models.user import User
+from notify.weather.message_builder import TextMessageBuilder
+
+from .config import SchedulerConfig
+from .run_report import percentile
+from .setup_scheduled_events import create_scheduler
+
+
+class SyntheticDatabase:
+    """
+    Generated users and events, implementing `DatabaseUsers` and `DatabaseEvents`.
+
+    User `i` has a single event for location `i % locations`. Subscriptions are generated lazily
+    in location order, so the dataset does not have to be kept in memory. Alert events get rules
+    with thresholds spread over the range of the fake forecasts.
+
+    Attributes:
+        events: An integer representing the number of users and events.
+        locations: An integer representing the number of distinct locations.
+        frequency: A `Frequency` object representing the frequency of the generated events.
+        event_type: An `EventType` object representing the type of the generated events.
+    """
+
+    def __init__(
+        self, events: int, locations: int, frequency: Frequency, event_type: EventType = EventType.ALL
+    ) -> None:
+        self.events = events
+        self.locations = max(1, min(locations, events))
+        self.frequency = frequency
+        self.event_type = event_type
+
+    @staticmethod
+    def email(user_id: int) -> str:
+        return f"user{user_id}@example.com"
+
+    def location(self, user_id: int) -> tuple[str, str]:
+        return f"City{user_id % self.locations}", "Benchland"
+
+    def location_of(self, email: str) -> tuple[str, str]:
+        return self.location(int(email.removeprefix("user").split("@")[0]))
+
+    def event(self, user_id: int) -> Event:
+        city, country = self.location(user_id)
+        event = Event(
+            event_id=user_id,
+            user_id=user_id,
+            event_type=self.event_type,
+            frequency=self.frequency,
+            city=city,
+            country=country,
+        )
+        if self.event_type == EventType.ALERT:
+            event.alert_measure = "temperature"
+            event.alert_operator = ">" if user_id % 2 else "<"
+            event.alert_threshold = user_id * 7 % 80 - 25
+        return event
+
+    def get_users(self) -> list[User]:
+        return [User(user_id=i, username=f"user{i}", email=self.email(i)) for i in range(self.events)]
+
+    def get_events_by_frequency(self, user: User, frequency: Frequency) -> list[Event]:
+        return [self.event(user.user_id)] if frequency == self.frequency else []
+
+    def get_subscriptions(
+        self,
+        frequency: Frequency | Sequence[Frequency],
+        after: tuple[str, str] | None = None,
+        send_minute: int | None = None,
+        shard: Shard | None = None,
+    ) -> Iterator[Subscription]:
+        if self.frequency not in ([frequency] if isinstance(frequency, Frequency) else frequency):
+            return
+        for location in range(self.locations):
+            for user_id in range(location, self.events, self.locations):
+                event = self.event(user_id)
+                if shard is None or shard_of(event.city, event.country, shard[1]) == shard[0]:
+                    yield Subscription(user_id=user_id, email=self.email(user_id), event=event)
+
+    def get_user_subscriptions(
+        self, frequency: Frequency, after_user: int | None = None, send_minute: int | None = None
+    ) -> Iterator[Subscription]:
+        if frequency != self.frequency:
+            return
+        for user_id in range(0 if after_user is None else after_user + 1, self.events):
+            yield Subscription(user_id=user_id, email=self.email(user_id), event=self.event(user_id))
+
+
+class FakeWeatherProvider:
+    """
+    Weather provider returning deterministic measurements after a fixed delay.
+
+    Attributes:
+        latency: A float representing the number of seconds every request takes.
+        requested: A dictionary mapping (city, country) to the time of the last request for the location.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.requested: dict[tuple[str, str], float] = {}
+
+    def get_weather(self, frequency: Frequency, city: str, country: str) -> list[HourMeasurements | DayMeasurements]:
+        self.requested[city, country] = time.perf_counter()
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        seed = zlib.crc32(f"{city}|{country}".encode())
+        today = date.today()
+        if frequency == Frequency.HOUR:
+            return [
+                HourMeasurements(f"{today}T{hour:02}:00", (seed + hour) % 30 - 5, seed % 100, (seed >> hour) % 3, 10)
+                for hour in range(24)
+            ]
+        return [
+            DayMeasurements(str(today + timedelta(days=day)), ((seed + day) % 20 - 5, (seed + day) % 20 + 5), 1.5, 40)
+            for day in range(7)
+        ]
+
+    def get_weathers(
+        self, frequencies: list[Frequency], city: str, country: str
+    ) -> dict[Frequency, list[HourMeasurements | DayMeasurements]]:
+        return {frequency: self.get_weather(frequency, city, country) for frequency in frequencies}
+
+
+class CountingSender:
+    """
+    Sender which only counts messages, after a fixed delay.
+
+    Attributes:
+        latency: A float representing the number of seconds every send takes.
+        on_send: An optional function called with the receiver of every message.
+        count: An integer representing the number of messages sent.
+    """
+
+    def __init__(self, latency: float = 0.0, on_send: Callable[[str], None] | None = None) -> None:
+        self.latency = latency
+        self.on_send = on_send
+        self.count = 0
+        self._lock = Lock()
+
+    def send(self, subject: str, msg: str, receiver: str) -> bool:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self.count += 1
+        if self.on_send is not None:
+            self.on_send(receiver)
+        return True
+
+
+@dataclass
+class BenchmarkResult:
+    """
+    Results of a benchmark run.
+
+    Latency of an event is measured from the last weather request for its location until its report is sent.
+
+    Attributes:
+        events: An integer representing the number of generated events.
+        sent: An integer representing the number of reports sent.
+        failed: An integer representing the number of reports that failed.
+        skipped: An integer representing the number of reports that were skipped.
+        duration: A float representing the duration of the run in seconds.
+        p50: A float representing the median latency of an event in seconds.
+        p95: A float representing the 95th percentile of the latency in seconds.
+        p99: A float representing the 99th percentile of the latency in seconds.
+        peak_memory: An integer representing the peak memory allocated during the run in bytes.
+    """
+
+    events: int
+    sent: int
+    failed: int
+    skipped: int
+    duration: float
+    p50: float
+    p95: float
+    p99: float
+    peak_memory: int
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.duration if self.duration > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"events: {self.events} (sent {self.sent}, failed {self.failed}, skipped {self.skipped})\n"
+            f"duration: {self.duration:.3f} s, {self.events_per_second:.1f} events/s\n"
+            f"latency: p50 {self.p50 * 1000:.2f} ms, p95 {self.p95 * 1000:.2f} ms, p99 {self.p99 * 1000:.2f} ms\n"
+            f"peak memory: {self.peak_memory / 1024 / 1024:.2f} MiB"
+        )
+
+
+class Benchmark:
+    """
+    Runs the scheduler against a `SyntheticDatabase`, a `FakeWeatherProvider` and a `CountingSender`.
+
+    Attributes:
+        frequency: A `Frequency` object representing the frequency of the run.
+        config: A `SchedulerConfig` object with the settings of the benchmarked scheduler.
+        database: A `SyntheticDatabase` object with the generated users and events.
+        weather_provider: A `FakeWeatherProvider` object.
+        sender: A `CountingSender` object.
+        latencies: A list of floats with the latency of every sent event.
+    """
+
+    def __init__(
+        self,
+        events: int,
+        locations: int,
+        frequency: Frequency = Frequency.HOUR,
+        config: SchedulerConfig | None = None,
+        weather_latency: float = 0.0,
+        send_latency: float = 0.0,
+        event_type: EventType = EventType.ALL,
+    ) -> None:
+        self.frequency = frequency
+        self.config = replace(config or SchedulerConfig(), checkpoints=False, ledger=False)
+        self.database = SyntheticDatabase(events, locations, frequency, event_type)
+        self.weather_provider = FakeWeatherProvider(weather_latency)
+        self.sender = CountingSender(send_latency, self.record)
+        self.latencies: list[float] = []
+
+    def record(self, receiver: str) -> None:
+        requested = self.weather_provider.requested.get(self.database.location_of(receiver))
+        if requested is not None:
+            self.latencies.append(time.perf_counter() - requested)
+
+    def run(self) -> BenchmarkResult:
+        """
+        Runs the scheduler once and measures it.
+
+        Returns:
+            A `BenchmarkResult` object.
+        """
+        self.latencies = []
+        scheduler = create_scheduler(
+            self.frequency,
+            self.config,
+            self.sender,
+            self.database,
+            self.database,
+            self.weather_provider,
+            TextMessageBuilder(),
+        )
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            summary = scheduler.run()
+            duration = time.perf_counter() - started
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        latencies = sorted(self.latencies)
+        return BenchmarkResult(
+            events=self.database.events,
+            sent=summary.sent,
+            failed=summary.failed,
+            skipped=summary.skipped,
+            duration=duration,
+            p50=percentile(latencies, 50),
+            p95=percentile(latencies, 95),
+            p99=percentile(latencies, 99),
+            peak_memory=peak_memory,
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler with synthetic data.")
+    parser.add_argument("--events", type=int, default=1000, help="number of generated users and events")
+    parser.add_argument("--locations", type=int, default=100, help="number of distinct locations")
+    parser.add_argument("--frequency", choices=["hour", "day"], default="hour")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="seconds per weather request")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="seconds per sent message")
+    parser.add_argument("--engine", choices=["sync", "async"], default="sync")
+    parser.add_argument("--grouped", action="store_true", help="group subscriptions by location")
+    parser.add_argument("--workers", type=int, default=1, help="threads of the sync engine")
+    parser.add_argument("--concurrency", type=int, default=100, help="requests in flight in the async engine")
+    parser.add_argument("--pipeline", action="store_true", help="use the fetch/render/deliver pipeline")
+    parser.add_argument("--alerts", action="store_true", help="generate threshold alert events")
+    parser.add_argument("--log", action="store_true", help="keep logging enabled during the run")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> BenchmarkResult:
+    args = parse_args(argv)
+    config = SchedulerConfig(
+        grouped=args.grouped,
+        workers=args.workers,
+        engine=args.engine,
+        concurrency=args.concurrency,
+        pipeline=args.pipeline,
+    )
+    frequency = Frequency.DAY if args.frequency == "day" else Frequency.HOUR
+    event_type = EventType.ALERT if args.alerts else EventType.ALL
+    benchmark = Benchmark(
+        args.events, args.locations, frequency, config, args.weather_latency, args.send_latency, event_type
+    )
+
+    if not args.log:
+        logging.disable(logging.INFO)
+    try:
+        result = benchmark.run()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import time
+from typing import Protocol
+
+from notify.app.logger import LoggerType, create_logger
+from notify.models.measurements import DayMeasurements, HourMeasurements
+from notify.models.query_params import Frequency
+
+from .scheduled_events import WeatherProvider
+
+logger = create_logger(LoggerType.WEATHER, "CACHE_WARMER")
+
+
+class DatabaseLocations(Protocol):
+    def get_locations(
+        self, frequency: Frequency | None = None, send_minute: int | None = None
+    ) -> list[tuple[str, str, Frequency]] | None:
+        ...
+
+
+class BatchWeatherProvider(WeatherProvider, Protocol):
+    def get_weather_batch(
+        self, frequency: Frequency, places: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], list[DayMeasurements] | list[HourMeasurements]]:
+        ...
+
+
+class CacheWarmer:
+    """
+    Class for filling the weather cache before a scheduled run.
+
+    Weather of every subscribed location is requested through the weather provider, which stores it
+    in the database, so the scheduled run only reads cached data. Requests are spread out, so that
+    at most `rate` locations are resolved per second.
+
+    With `batch_size` above 1, locations of the same frequency are resolved in batches, so the weather
+    of a whole batch is retrieved with a few requests instead of a request per location.
+
+    Attributes:
+        weather_provider: A `BatchWeatherProvider` object caching the weather it retrieves.
+        database_locations: A `DatabaseLocations` object representing the source of subscribed locations.
+        rate: A float representing the maximum number of locations resolved per second.
+        batch_size: An integer representing the number of locations resolved at once.
+    """
+
+    def __init__(
+        self,
+        weather_provider: BatchWeatherProvider,
+        database_locations: DatabaseLocations,
+        rate: float,
+        batch_size: int = 1,
+    ) -> None:
+        self.weather_provider = weather_provider
+        self.database_locations = database_locations
+        self.rate = rate
+        self.batch_size = max(1, batch_size)
+
+    def run(self, frequency: Frequency, send_minute: int | None = None) -> int:
+        """
+        Resolves the weather for all locations subscribed with the given frequency.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the upcoming run.
+            send_minute: An optional integer limiting the locations to events sent at this UTC minute.
+
+        Returns:
+            An integer representing the number of locations resolved successfully.
+        """
+        locations = self.database_locations.get_locations(frequency, send_minute)
+        if locations is None:
+            return 0
+        logger.info(f"Warming cache for {len(locations)} locations")
+
+        interval = 1 / self.rate if self.rate > 0 else 0
+        warmed = 0
+        if self.batch_size > 1:
+            for location_frequency, batch in self.batches(locations):
+                started = time.monotonic()
+                try:
+                    weathers = self.weather_provider.get_weather_batch(location_frequency, batch)
+                    warmed += sum(1 for weather in weathers.values() if weather)
+                except Exception as e:
+                    logger.exception(e)
+
+                if (remaining := interval * len(batch) - (time.monotonic() - started)) > 0:
+                    time.sleep(remaining)
+            logger.info(f"Cache warmed for {warmed} of {len(locations)} locations")
+            return warmed
+
+        for city, country, location_frequency in locations:
+            started = time.monotonic()
+            try:
+                if self.weather_provider.get_weather(location_frequency, city, country):
+                    warmed += 1
+            except Exception as e:
+                logger.exception(e)
+
+            if (remaining := interval - (time.monotonic() - started)) > 0:
+                time.sleep(remaining)
+
+        logger.info(f"Cache warmed for {warmed} of {len(locations)} locations")
+        return warmed
+
+    def batches(
+        self, locations: list[tuple[str, str, Frequency]]
+    ) -> list[tuple[Frequency, list[tuple[str, str]]]]:
+        """Splits the locations by frequency into batches of at most `batch_size` locations."""
+        by_frequency: dict[Frequency, list[tuple[str, str]]] = {}
+        for city, country, frequency in locations:
+            by_frequency.setdefault(frequency, []).append((city, country))
+        return [
+            (frequency, places[start: start + self.batch_size])
+            for frequency, places in by_frequency.items()
+            for start in range(0, len(places), self.batch_size)
+        ]
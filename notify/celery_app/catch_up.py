@@ -0,0 +1,173 @@
+import json
+from typing import Iterable, Iterator, Protocol, Sequence
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+from notify.models.event import Event
+from notify.models.query_params import EventType, Frequency
+from notify.models.shard import Shard
+from notify.models.subscription import Subscription
+
+logger = create_logger(LoggerType.CELERY, "CATCH_UP")
+
+# Moves the deferred subscriptions to the processing list of a claim and returns all of its items, including those
+# claimed before by the same catch-up run which did not finish, so they are processed again instead of being lost.
+CLAIM_SCRIPT = """
+local items = redis.call("lrange", KEYS[1], 0, -1)
+for _, item in ipairs(items) do
+    redis.call("rpush", KEYS[2], item)
+end
+redis.call("del", KEYS[1])
+redis.call("expire", KEYS[2], ARGV[1])
+return redis.call("lrange", KEYS[2], 0, -1)
+"""
+
+
+class CatchUpQueue(Protocol):
+    def push(self, subscriptions: Iterable[Subscription]) -> None:
+        ...
+
+    def claim(self, frequency: Frequency, claim_id: str) -> list[Subscription]:
+        ...
+
+    def acknowledge(self, frequency: Frequency, claim_id: str) -> None:
+        ...
+
+
+class RedisCatchUpQueue:
+    """
+    Queue of subscriptions deferred by a scheduler run that ran out of time, kept in Redis.
+
+    Subscriptions are stored as JSON documents in one Redis list per frequency. A catch-up run claims them
+    by moving them to a processing list of its own, named after the claim ID, which is deleted once the run
+    is acknowledged. Concurrent catch-up runs therefore neither send nor acknowledge each other's subscriptions.
+    A run interrupted before the acknowledgement, e.g. by a lost worker, leaves its processing list in place,
+    so the same run delivered again claims its subscriptions again. The lists expire after `ttl` seconds,
+    so reports which are not caught up in time are dropped instead of being sent late.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        ttl: An integer representing the number of seconds deferred subscriptions are kept.
+    """
+
+    prefix = "notify:catchup"
+
+    def __init__(self, client: Redis, ttl: int = 60 * 60) -> None:
+        self.client = client
+        self.ttl = ttl
+
+    def key(self, frequency: Frequency) -> str:
+        return f"{self.prefix}:{frequency.name.lower()}"
+
+    def processing_key(self, frequency: Frequency, claim_id: str) -> str:
+        return f"{self.key(frequency)}:processing:{claim_id}"
+
+    def push(self, subscriptions: Iterable[Subscription]) -> None:
+        """
+        Adds subscriptions to the queues of their frequencies.
+
+        Args:
+            subscriptions: An iterable of `Subscription` objects whose reports were not sent.
+        """
+        pipeline = self.client.pipeline()
+        for subscription in subscriptions:
+            key = self.key(subscription.event.frequency)
+            pipeline.rpush(key, serialize_subscription(subscription))
+            pipeline.expire(key, self.ttl)
+        pipeline.execute()
+
+    def claim(self, frequency: Frequency, claim_id: str) -> list[Subscription]:
+        """
+        Moves the deferred subscriptions of a frequency to the processing list of a claim and returns the whole list.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the queue.
+            claim_id: A string identifying the catch-up run, e.g. the ID of its task, which is kept when
+                the task is delivered again.
+
+        Returns:
+            A list of `Subscription` objects, in the order they were deferred.
+        """
+        values = self.client.eval(
+            CLAIM_SCRIPT, 2, self.key(frequency), self.processing_key(frequency, claim_id), self.ttl
+        )
+        return [deserialize_subscription(value) for value in values]
+
+    def acknowledge(self, frequency: Frequency, claim_id: str) -> None:
+        """Deletes the processing list of a claim once its catch-up run has processed it."""
+        self.client.delete(self.processing_key(frequency, claim_id))
+
+
+class CatchUpEvents:
+    """
+    Deferred subscriptions of a catch-up run, implementing `DatabaseEvents`.
+
+    Attributes:
+        queue: A `CatchUpQueue` object the subscriptions are claimed from.
+        claim_id: A string identifying the catch-up run, see `RedisCatchUpQueue.claim`.
+    """
+
+    def __init__(self, queue: CatchUpQueue, claim_id: str) -> None:
+        self.queue = queue
+        self.claim_id = claim_id
+
+    def get_events_by_frequency(self, *_) -> list[Event]:
+        return []
+
+    def get_user_subscriptions(self, *_, **__) -> Iterator[Subscription]:
+        return iter(())
+
+    def get_subscriptions(
+        self,
+        frequency: Frequency | Sequence[Frequency],
+        after: tuple[str, str] | None = None,
+        send_minute: int | None = None,
+        shard: Shard | None = None,
+    ) -> Iterator[Subscription]:
+        """
+        Claims the deferred subscriptions of the given frequencies. The queue is shared by all shards,
+        and catch-up runs are not sharded, so `shard` is ignored.
+
+        Yields:
+            `Subscription` objects ordered by location, as expected by the grouped scheduler.
+        """
+        frequencies = [frequency] if isinstance(frequency, Frequency) else frequency
+        subscriptions = [subscription for f in frequencies for subscription in self.queue.claim(f, self.claim_id)]
+        logger.info(f"Catching up {len(subscriptions)} deferred reports")
+        yield from sorted(
+            subscriptions,
+            key=lambda s: (s.event.city, s.event.country, s.event.frequency.value, s.user_id, s.event.event_id),
+        )
+
+
+def serialize_subscription(subscription: Subscription) -> str:
+    event = subscription.event
+    return json.dumps(
+        {
+            "user_id": subscription.user_id,
+            "email": subscription.email,
+            "event_id": event.event_id,
+            "event_type": event.event_type.name,
+            "frequency": event.frequency.name,
+            "city": event.city,
+            "country": event.country,
+            "only_changes": bool(event.only_changes),
+            "alert": [event.alert_measure, event.alert_operator, event.alert_threshold],
+        }
+    )
+
+
+def deserialize_subscription(value: str | bytes) -> Subscription:
+    data = json.loads(value)
+    event = Event(
+        event_id=data["event_id"],
+        user_id=data["user_id"],
+        event_type=EventType[data["event_type"]],
+        frequency=Frequency[data["frequency"]],
+        city=data["city"],
+        country=data["country"],
+        only_changes=data.get("only_changes", False),
+    )
+    event.alert_measure, event.alert_operator, event.alert_threshold = data.get("alert", [None, None, None])
+    return Subscription(user_id=data["user_id"], email=data["email"], event=event)
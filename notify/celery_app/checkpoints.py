@@ -0,0 +1,63 @@
+import json
+from typing import Any, Protocol
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.CELERY, "CHECKPOINTS")
+
+RUN_FINISHED = "finished"
+
+
+class CheckpointStore(Protocol):
+    def get(self, run_id: str) -> Any | None:
+        ...
+
+    def save(self, run_id: str, watermark: Any) -> None:
+        ...
+
+
+class RedisCheckpointStore:
+    """
+    Checkpoint store keeping the progress of scheduler runs in Redis.
+
+    Every run has a single key holding its watermark, the position after which a restarted run continues.
+    Keys expire after `ttl` seconds, so finished runs do not have to be cleaned up.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        ttl: An integer representing the number of seconds a checkpoint is kept.
+    """
+
+    prefix = "notify:checkpoint"
+
+    def __init__(self, client: Redis, ttl: int = 2 * 24 * 60 * 60) -> None:
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, run_id: str) -> Any | None:
+        """
+        Retrieve the watermark of a run.
+
+        Args:
+            run_id: A string representing the ID of the run.
+
+        Returns:
+            The saved watermark, or None if the run has no checkpoint.
+        """
+        value = self.client.get(f"{self.prefix}:{run_id}")
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def save(self, run_id: str, watermark: Any) -> None:
+        """
+        Save the watermark of a run.
+
+        Args:
+            run_id: A string representing the ID of the run.
+            watermark: A JSON serializable value representing the last processed position of the run.
+        """
+        self.client.set(f"{self.prefix}:{run_id}", json.dumps(watermark), ex=self.ttl)
+        logger.debug(f"Checkpoint {watermark} saved for run {run_id}")
@@ -0,0 +1,151 @@
+"""
+Command-line entry point running a single scheduler run outside of Celery.
+
+The run uses the databases, weather cache and settings of the Flask configuration, like a run started
+by Celery beat, so production runs can be reproduced and tuned locally. With `--dry-run` the reports are
+built but not sent, and nothing is recorded in the ledger, the fingerprints or the catch-up queue.
+
+Usage:
+    python -m notify scheduler hour --concurrency 8 --shard-index 0 --shard-count 4 --dry-run --profile run.prof
+"""
+import argparse
+import cProfile
+import logging
+import pstats
+from dataclasses import replace
+from typing import Any, Callable, TypeVar
+
+from notify.models.query_params import Frequency
+
+from .benchmark import CountingSender
+from .config import SchedulerConfig
+from .scheduled_events import RunSummary
+
+T = TypeVar("T")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m notify scheduler", description="Run the scheduler once.")
+    parser.add_argument("frequency", choices=["hour", "day", "merged"], help="reports to send")
+    parser.add_argument("--engine", choices=["sync", "async"], help="scheduler engine, configured one by default")
+    parser.add_argument(
+        "--concurrency", type=int, help="threads of the sync engine, or requests in flight in the async engine"
+    )
+    parser.add_argument("--shard-index", type=int, default=0, help="shard processed by this run")
+    parser.add_argument("--shard-count", type=int, default=1, help="number of shards the run is split into")
+    parser.add_argument("--send-minute", type=int, help="limit the run to events sent at this UTC minute")
+    parser.add_argument("--dry-run", action="store_true", help="build the reports without sending them")
+    parser.add_argument("--profile", metavar="PATH", help="write cProfile statistics of the run to PATH")
+    parser.add_argument("--memory", action="store_true", help="trace memory and print the top allocation sites")
+    parser.add_argument("--log", action="store_true", help="keep logging enabled during the run")
+    args = parser.parse_args(argv)
+
+    if args.shard_count < 1 or not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index has to be between 0 and --shard-count - 1")
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency has to be positive")
+    return args
+
+
+def create_config(args: argparse.Namespace, config: SchedulerConfig) -> SchedulerConfig:
+    """
+    Applies the command-line options to the configured scheduler settings.
+
+    Args:
+        args: A `Namespace` object returned by `parse_args`.
+        config: A `SchedulerConfig` object read from the Flask configuration.
+
+    Returns:
+        A `SchedulerConfig` object of the run. Checkpoints are disabled, so a local run does not resume
+        or finish a production run, and a dry run does not write any delivery state.
+    """
+    config = replace(
+        config,
+        merged=args.frequency == "merged",
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        send_minute=args.send_minute,
+        checkpoints=False,
+    )
+    if args.engine is not None:
+        config = replace(config, engine=args.engine)
+    if args.concurrency is not None:
+        if config.engine == "async":
+            config = replace(config, concurrency=args.concurrency)
+        else:
+            config = replace(config, workers=args.concurrency)
+    if args.memory:
+        config = replace(config, memory_profile=True)
+    if args.dry_run:
+        config = replace(config, ledger=False, only_changes=False, run_budget=0, reports=False)
+    return config
+
+
+def profile(function: Callable[[], T], path: str) -> T:
+    """
+    Calls a function under cProfile and writes the statistics to `path`.
+
+    The file can be read with `pstats` or converted to a flame graph, e.g. with `flameprof` or `snakeviz`.
+    The 20 functions with the highest cumulative time are printed.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function)
+    finally:
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(20)
+        print(f"Profile written to {path}")
+
+
+def format_report(summary: RunSummary, report: dict[str, Any] | None = None) -> str:
+    """Formats the summary of a run and the timings of its stages."""
+    lines = [
+        f"sent: {summary.sent}, failed: {summary.failed}, skipped: {summary.skipped}, deferred: {summary.deferred}"
+    ]
+    if report is None:
+        return "\n".join(lines)
+
+    lines.append(f"duration: {report['duration']:.3f} s, {report['throughput']:.1f} reports/s")
+    for stage, statistics in sorted(report["stages"].items()):
+        lines.append(
+            f"{stage}: {statistics['count']} calls, total {statistics['total']:.3f} s, "
+            f"p50 {statistics['p50'] * 1000:.2f} ms, p95 {statistics['p95'] * 1000:.2f} ms, "
+            f"max {statistics['max'] * 1000:.2f} ms"
+        )
+    for counter, value in sorted(report["counters"].items()):
+        lines.append(f"{counter}: {value}")
+    if "memory" in report:
+        lines.append(f"peak memory: {report['memory']['peak'] / 1024 / 1024:.2f} MiB")
+        for site in report["memory"]["top"]:
+            lines.append(f"{site['site']}: {site['size'] / 1024:.1f} KiB in {site['count']} blocks")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> RunSummary:
+    args = parse_args(argv)
+
+    from notify.app import create_app
+
+    from .setup_scheduled_events import setup_scheduled_events
+    from .tasks import get_scheduler_config
+
+    flask_app = create_app()
+    with flask_app.app_context():
+        config = create_config(args, get_scheduler_config(flask_app))
+        frequency = Frequency.DAY if args.frequency == "day" else Frequency.HOUR
+        sender = CountingSender() if args.dry_run else None
+        scheduler = setup_scheduled_events(frequency, config, sender)
+
+        if not args.log:
+            logging.disable(logging.INFO)
+        try:
+            summary = profile(scheduler.run, args.profile) if args.profile else scheduler.run()
+        finally:
+            logging.disable(logging.NOTSET)
+
+        frequency_name = "+".join(f.value for f in scheduler.frequencies) if config.merged else frequency.value
+        report = scheduler.metrics.report(scheduler.run_id, frequency_name, summary)
+        if getattr(scheduler, "memory_report", None) is not None:
+            report["memory"] = scheduler.memory_report
+        print(format_report(summary, report))
+        return summary
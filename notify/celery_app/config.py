@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class SchedulerConfig:
+    """
+    Settings controlling how `MailScheduler` executes a run.
+
+    Values are read from the `SCHEDULER` dictionary of the Flask configuration.
+
+    Attributes:
+        grouped: A boolean indicating whether subscriptions are grouped by location, so that weather
+            is resolved once per location before the reports are sent to its subscribers.
+        shard_count: An integer representing the number of shards a run is split into. Every location
+            belongs to exactly one shard, so all of its subscribers are processed by the same task.
+        shard_index: An integer representing the shard processed by this scheduler, from 0 to `shard_count` - 1.
+        workers: An integer representing the number of threads processing subscriptions. With a single worker,
+            subscriptions are processed sequentially.
+        engine: A string selecting the scheduler implementation, "sync" for `MailScheduler`
+            or "async" for `AsyncMailScheduler`.
+        concurrency: An integer representing the maximum number of weather fetches and sends in flight
+            at the same time in the async engine.
+        pipeline: A boolean indicating whether subscriptions are processed by a pipeline of fetch, render
+            and deliver stages connected by bounded queues.
+        fetch_workers: An integer representing the number of threads resolving weather in the pipeline.
+        render_workers: An integer representing the number of threads building reports in the pipeline.
+        send_workers: An integer representing the number of threads sending reports in the pipeline,
+            and in the async engine.
+        queue_size: An integer representing the maximum number of items waiting in front of a pipeline stage.
+        merged: A boolean indicating whether the run sends both hourly and daily reports in a single pass,
+            resolving the weather of a location once for both frequencies. It is set per run by the merged
+            Monday task.
+        digest: A boolean indicating whether every user gets a single message with the reports of all of their
+            events of the run frequency, instead of a message per event.
+        merge_monday: A boolean indicating whether the hourly and daily runs on Monday are replaced
+            with a single merged run at 6:00.
+        checkpoints: A boolean indicating whether the progress of a run is saved in Redis,
+            so a restarted or retried run continues where the previous attempt stopped.
+        ledger: A boolean indicating whether delivered reports are recorded in Redis, so a report is sent
+            at most once per event and forecast date, even if a run is repeated.
+        prewarm_lead_minutes: An integer representing how many minutes before a scheduled run the weather cache
+            is filled. The cache is not filled in advance if it is 0.
+        prewarm_rate: A float representing the maximum number of locations resolved per second while
+            filling the cache.
+        weather_batch_size: An integer representing the maximum number of locations in a single weather request.
+            The cache is filled with batch requests if it is above 1.
+        flight_lock: A boolean indicating whether concurrent cache misses of the same location are coalesced
+            across processes with a lock in Redis, so the weather is fetched by one worker and read from the cache
+            by the others. Misses within a process are always coalesced.
+        flight_lock_ttl: A float representing the number of seconds a lock is held and waited for at most.
+        combined_fetch: A boolean indicating whether a cache miss fetches the hourly and daily weather of
+            the location with a single request and caches both, so the run of the other frequency reads it
+            from the cache. Merged runs always fetch both with a single request.
+        lease: A boolean indicating whether a run holds a lease in Redis, so a run is skipped while
+            the previous run of the same frequency and date is still in progress.
+        lease_ttl: An integer representing the number of seconds a lease is kept without a heartbeat.
+        shard_lease_ttl: An integer representing the number of seconds the lease of a sharded run is kept
+            after its shards are queued. It should cover the wait of the shards in the queue and the run itself,
+            since nothing renews the lease before a shard starts. The lease is released when the run finishes.
+        reports: A boolean indicating whether a report with the stage timings and counters of every run
+            is stored in the `run_reports` MongoDB collection.
+        send_windows: A boolean indicating whether reports are sent at local time of the event location.
+            A run is then started every minute for the events whose UTC send minute has come,
+            instead of a single run for all events.
+        send_window_backfill: An integer representing the number of past minutes the send window task starts
+            runs for, if it was executed late or a previous task was missed.
+        send_minute: An optional integer limiting a run to the events sent at this UTC minute of the report period.
+            It is set per run by the send window task.
+        only_changes: A boolean indicating whether reports of events subscribed with `only_changes` are skipped
+            when the forecast did not change since the last report. Fingerprints of sent forecasts are kept in Redis.
+        change_temperature: A float representing the smallest change of the minimum or maximum temperature,
+            in degrees Celsius, worth a new report.
+        change_precipitation: A float representing the smallest change of the total precipitation,
+            in millimetres, worth a new report.
+        change_probability: A float representing the smallest change of the highest precipitation probability,
+            in percentage points, worth a new report.
+        run_budget: A float representing the number of seconds a run may take. Timeouts of the weather, geocoding
+            and SMTP calls are limited by the remaining budget, and reports which cannot be sent in time are
+            deferred to a catch-up run. The duration of a run is not limited if it is 0.
+        catch_up: A boolean indicating whether the run sends the reports deferred by a previous run which
+            exceeded its budget, instead of the subscribed reports. It is set per run by the catch-up task.
+        catch_up_claim: A string identifying the claim of a catch-up run, the ID of its task. Every claim
+            keeps the reports it processes in a list of its own, see `RedisCatchUpQueue`.
+        catch_up_attempts: An integer representing the number of catch-up runs started for the same deferred
+            reports, since a catch-up run defers the reports it cannot send within its own budget again.
+        memory_profile: A boolean indicating whether the memory of a run is traced with `tracemalloc`. The peak
+            memory, the samples and the top allocation sites are added to the run report. Tracing slows
+            the run down, so it is meant for diagnostic runs.
+        memory_every: An integer representing the number of processed users, locations or subscriptions
+            between memory samples.
+        memory_top: An integer representing the number of allocation sites in the run report.
+        redis_url: A string representing the URL of the Redis server used by the scheduler.
+    """
+
+    grouped: bool = False
+    shard_count: int = 1
+    shard_index: int = 0
+    workers: int = 1
+    engine: str = "sync"
+    concurrency: int = 100
+    pipeline: bool = False
+    fetch_workers: int = 4
+    render_workers: int = 1
+    send_workers: int = 4
+    queue_size: int = 100
+    merged: bool = False
+    digest: bool = False
+    merge_monday: bool = False
+    checkpoints: bool = False
+    ledger: bool = False
+    prewarm_lead_minutes: int = 15
+    prewarm_rate: float = 5.0
+    weather_batch_size: int = 1
+    flight_lock: bool = False
+    flight_lock_ttl: float = 30.0
+    combined_fetch: bool = False
+    lease: bool = False
+    lease_ttl: int = 120
+    shard_lease_ttl: int = 3600
+    reports: bool = False
+    send_windows: bool = False
+    send_window_backfill: int = 60
+    send_minute: int | None = None
+    only_changes: bool = False
+    change_temperature: float = 2.0
+    change_precipitation: float = 1.0
+    change_probability: float = 20.0
+    run_budget: float = 0
+    catch_up: bool = False
+    catch_up_claim: str = ""
+    catch_up_attempts: int = 3
+    memory_profile: bool = False
+    memory_every: int = 1000
+    memory_top: int = 10
+    redis_url: str = "redis://localhost:6379"
@@ -0,0 +1,63 @@
+from typing import Protocol
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.CELERY, "DELIVERY_LEDGER")
+
+
+class DeliveryLedger(Protocol):
+    def was_delivered(self, user_id: int, event_id: int, date: str) -> bool:
+        ...
+
+    def mark_delivered(self, user_id: int, event_id: int, date: str) -> None:
+        ...
+
+
+class RedisDeliveryLedger:
+    """
+    Ledger of delivered reports kept in Redis.
+
+    Deliveries of a forecast date are stored as members of a single Redis set, so checking and recording
+    a delivery is O(1). The set expires after `ttl` seconds.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        ttl: An integer representing the number of seconds deliveries of a date are kept.
+    """
+
+    prefix = "notify:delivered"
+
+    def __init__(self, client: Redis, ttl: int = 8 * 24 * 60 * 60) -> None:
+        self.client = client
+        self.ttl = ttl
+
+    def was_delivered(self, user_id: int, event_id: int, date: str) -> bool:
+        """
+        Check if the report of an event was already delivered for a forecast date.
+
+        Args:
+            user_id: An integer representing the ID of the user who subscribed to the event.
+            event_id: An integer representing the ID of the event.
+            date: A string representing the forecast date of the report.
+
+        Returns:
+            A boolean indicating whether the report was already delivered.
+        """
+        return bool(self.client.sismember(f"{self.prefix}:{date}", f"{user_id}:{event_id}"))
+
+    def mark_delivered(self, user_id: int, event_id: int, date: str) -> None:
+        """
+        Record the delivery of the report of an event for a forecast date.
+
+        Args:
+            user_id: An integer representing the ID of the user who subscribed to the event.
+            event_id: An integer representing the ID of the event.
+            date: A string representing the forecast date of the report.
+        """
+        key = f"{self.prefix}:{date}"
+        pipeline = self.client.pipeline()
+        pipeline.sadd(key, f"{user_id}:{event_id}")
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
@@ -0,0 +1,173 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Iterable, Protocol
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+from notify.models.event import Event
+from notify.models.query_params import EventType
+
+logger = create_logger(LoggerType.CELERY, "FORECAST_CHANGES")
+
+Fingerprint = dict[str, float | None]
+
+TEMPERATURE_FIELDS = ("temperature_min", "temperature_max")
+PRECIPITATION_FIELDS = ("precipitation", "precipitation_probability")
+
+
+@dataclass
+class ChangeThresholds:
+    """
+    Smallest changes of a forecast which are worth a new report.
+
+    Attributes:
+        temperature: A float representing the change of the minimum or maximum temperature in degrees Celsius.
+        precipitation: A float representing the change of the total precipitation in millimetres.
+        precipitation_probability: A float representing the change of the highest precipitation probability
+            in percentage points.
+    """
+
+    temperature: float = 2.0
+    precipitation: float = 1.0
+    precipitation_probability: float = 20.0
+
+    def of(self, field: str) -> float:
+        return self.temperature if field in TEMPERATURE_FIELDS else getattr(self, field)
+
+
+class ForecastFingerprints(Protocol):
+    def get(self, user_id: int, event_id: int) -> Fingerprint | None:
+        ...
+
+    def save(self, user_id: int, event_id: int, fingerprint: Fingerprint) -> None:
+        ...
+
+
+class RedisForecastFingerprints:
+    """
+    Fingerprints of the last forecast sent for every event, kept in Redis.
+
+    A fingerprint is a handful of numbers, so it is stored as a small JSON string per event.
+    Fingerprints expire after `ttl` seconds, so an event which was not sent for a long time gets a full report.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        ttl: An integer representing the number of seconds a fingerprint is kept.
+    """
+
+    prefix = "notify:fingerprint"
+
+    def __init__(self, client: Redis, ttl: int = 8 * 24 * 60 * 60) -> None:
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, user_id: int, event_id: int) -> Fingerprint | None:
+        value = self.client.get(f"{self.prefix}:{user_id}:{event_id}")
+        return None if value is None else json.loads(value)
+
+    def save(self, user_id: int, event_id: int, fingerprint: Fingerprint) -> None:
+        self.client.set(f"{self.prefix}:{user_id}:{event_id}", json.dumps(fingerprint), ex=self.ttl)
+
+
+def fingerprint(weather: Iterable[Any]) -> Fingerprint:
+    """
+    Summarizes a forecast into its temperature range, total precipitation and highest precipitation probability.
+
+    Args:
+        weather: An iterable of `HourMeasurements` or `DayMeasurements` objects.
+
+    Returns:
+        A dictionary mapping the summarized fields to their values, or None for fields without data.
+    """
+    temperatures: list[float] = []
+    precipitation: list[float] = []
+    probabilities: list[float] = []
+    for measurement in weather:
+        temperature = measurement.temperature
+        temperatures.extend(temperature if isinstance(temperature, tuple) else [temperature])
+        precipitation.append(measurement.precipitation)
+        probabilities.append(measurement.precipitation_probability)
+
+    temperatures = [value for value in temperatures if value is not None]
+    precipitation = [value for value in precipitation if value is not None]
+    probabilities = [value for value in probabilities if value is not None]
+    return {
+        "temperature_min": min(temperatures, default=None),
+        "temperature_max": max(temperatures, default=None),
+        "precipitation": round(sum(precipitation), 2) if precipitation else None,
+        "precipitation_probability": max(probabilities, default=None),
+    }
+
+
+def has_changed(event: Event, previous: Fingerprint, current: Fingerprint, thresholds: ChangeThresholds) -> bool:
+    """
+    Checks whether the forecast changed enough since the last report to send a new one.
+
+    Only the fields shown in the report of the event type are compared.
+
+    Args:
+        event: An `Event` object the report is built for.
+        previous: The fingerprint of the last forecast sent for the event.
+        current: The fingerprint of the new forecast.
+        thresholds: A `ChangeThresholds` object with the smallest changes worth a report.
+
+    Returns:
+        A boolean indicating whether any compared field changed by at least its threshold.
+    """
+    fields = {
+        EventType.TEMPERATURE: TEMPERATURE_FIELDS,
+        EventType.PRECIPITATION: PRECIPITATION_FIELDS,
+    }.get(event.event_type, TEMPERATURE_FIELDS + PRECIPITATION_FIELDS)
+
+    for field in fields:
+        before, after = previous.get(field), current.get(field)
+        if before is None or after is None:
+            if before != after:
+                return True
+        elif abs(after - before) >= thresholds.of(field):
+            return True
+    return False
+
+
+class ChangeFilter:
+    """
+    Suppresses reports of events subscribed with `only_changes` when their forecast did not change.
+
+    The fingerprint of a forecast is saved after its report is sent, so a new forecast is always compared
+    with the last one the user received. Errors of the store are logged and the report is sent.
+
+    Attributes:
+        fingerprints: A `ForecastFingerprints` object storing the fingerprints of sent forecasts.
+        thresholds: A `ChangeThresholds` object with the smallest changes worth a report.
+    """
+
+    def __init__(self, fingerprints: ForecastFingerprints, thresholds: ChangeThresholds | None = None) -> None:
+        self.fingerprints = fingerprints
+        self.thresholds = thresholds or ChangeThresholds()
+
+    def is_unchanged(self, event: Event, weather: Iterable[Any]) -> bool:
+        """
+        Checks whether the report of an event can be skipped because its forecast did not change.
+
+        Returns:
+            A boolean indicating whether the event is subscribed with `only_changes` and the forecast changed
+            less than the thresholds since the last report.
+        """
+        if not event.only_changes:
+            return False
+        try:
+            previous = self.fingerprints.get(event.user_id, event.event_id)
+            return previous is not None and not has_changed(event, previous, fingerprint(weather), self.thresholds)
+        except Exception as e:
+            logger.exception(e)
+            return False
+
+    def record(self, event: Event, weather: Iterable[Any] | None) -> None:
+        """Saves the fingerprint of a forecast sent for an event subscribed with `only_changes`."""
+        if not event.only_changes or weather is None:
+            return
+        try:
+            self.fingerprints.save(event.user_id, event.event_id, fingerprint(weather))
+        except Exception as e:
+            logger.exception(e)
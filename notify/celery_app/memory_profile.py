@@ -0,0 +1,85 @@
+import tracemalloc
+from threading import Lock
+from typing import Any
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.CELERY, "MEMORY_PROFILE")
+
+# Allocations made by the profiler itself are left out of the top allocation sites.
+IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>")
+
+
+class MemoryProfiler:
+    """
+    Samples the memory allocated by Python during a scheduler run using `tracemalloc`.
+
+    The traced and peak memory is sampled at stage boundaries and after every `every` processed items
+    (users, locations or subscriptions, depending on the mode of the run). When the run finishes,
+    a snapshot is taken and the `top` source lines holding the most memory are reported.
+
+    Tracing slows down allocations considerably, so the profiler is meant for diagnostic runs.
+    If tracing was already started, e.g. by the benchmark, it is left running.
+
+    Attributes:
+        every: An integer representing the number of processed items between samples.
+        top: An integer representing the number of allocation sites in the report.
+        frames: An integer representing the number of frames stored per allocation.
+        samples: A list of dictionaries with the label, traced and peak memory of every sample.
+    """
+
+    def __init__(self, every: int = 1000, top: int = 10, frames: int = 1) -> None:
+        self.every = max(1, every)
+        self.top = top
+        self.frames = frames
+        self.samples: list[dict[str, Any]] = []
+        self._counts: dict[str, int] = {}
+        self._started = False
+        self._lock = Lock()
+
+    def start(self) -> None:
+        self.samples = []
+        self._counts = {}
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        self.sample("start")
+
+    def sample(self, label: str) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self.samples.append({"label": label, "current": current, "peak": peak})
+
+    def tick(self, unit: str) -> None:
+        """Counts a processed item, sampling the memory after every `every` items of the unit."""
+        with self._lock:
+            count = self._counts[unit] = self._counts.get(unit, 0) + 1
+        if count % self.every == 0:
+            self.sample(f"{count} {unit}")
+
+    def stop(self) -> dict[str, Any]:
+        """
+        Takes the final sample and snapshot, and stops tracing if it was started by the profiler.
+
+        Returns:
+            A dictionary with the peak and final traced memory in bytes, the samples and the top allocation sites.
+        """
+        self.sample("finished")
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES]
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started:
+            tracemalloc.stop()
+
+        sites = [
+            {
+                "site": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+                "size": statistic.size,
+                "count": statistic.count,
+            }
+            for statistic in snapshot.statistics("lineno")[: self.top]
+        ]
+        logger.info(f"Peak memory of the run: {peak / 1024 / 1024:.2f} MiB")
+        return {"peak": peak, "current": self.samples[-1]["current"], "samples": self.samples, "top": sites}
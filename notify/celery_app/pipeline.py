@@ -0,0 +1,79 @@
+from queue import Queue
+from threading import Thread
+from typing import Any, Callable, Iterable
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.WEATHER, "PIPELINE")
+
+Emit = Callable[[Any], None]
+Handler = Callable[[Any, Emit], None]
+
+_STOP = object()
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues.
+
+    Every stage is processed by its own group of threads. A handler receives an item and an `emit` function,
+    which passes results to the next stage. As the queues are bounded, `emit` blocks while the next stage
+    is busy, so a slow stage slows down the stages before it instead of letting items pile up in memory.
+
+    Attributes:
+        queue_size: An integer representing the maximum number of items waiting in front of a stage.
+        stages: A list of (handler, workers) tuples, in the order items pass through them.
+    """
+
+    def __init__(self, queue_size: int = 100) -> None:
+        self.queue_size = queue_size
+        self.stages: list[tuple[Handler, int]] = []
+
+    def add_stage(self, handler: Handler, workers: int = 1) -> "Pipeline":
+        self.stages.append((handler, workers))
+        return self
+
+    def run(self, items: Iterable[Any]) -> None:
+        """
+        Pass all items through the stages and wait until every stage is finished.
+
+        The stages are stopped and joined even if `items` raises an exception, which is then raised
+        once the items already queued are processed.
+
+        Args:
+            items: An iterable of items for the first stage.
+        """
+        queues: list[Queue] = [Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads: list[list[Thread]] = []
+
+        for index, (handler, workers) in enumerate(self.stages):
+            emit = queues[index + 1].put if index + 1 < len(queues) else _discard
+            stage_threads = [
+                Thread(target=self._work, args=(handler, queues[index], emit), name=f"pipeline-{index}", daemon=True)
+                for _ in range(workers)
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+
+        try:
+            for item in items:
+                queues[0].put(item)
+        finally:
+            for index, stage_threads in enumerate(threads):
+                for _ in stage_threads:
+                    queues[index].put(_STOP)
+                for thread in stage_threads:
+                    thread.join()
+
+    @staticmethod
+    def _work(handler: Handler, source: Queue, emit: Emit) -> None:
+        while (item := source.get()) is not _STOP:
+            try:
+                handler(item, emit)
+            except Exception as e:
+                logger.exception(e)
+
+
+def _discard(_: Any) -> None:
+    pass
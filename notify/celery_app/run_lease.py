@@ -0,0 +1,114 @@
+from threading import Event, Thread
+from types import TracebackType
+from uuid import uuid4
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.CELERY, "RUN_LEASE")
+
+# The scripts change the key only if it still holds our token, so an expired lease taken over
+# by another worker is never renewed or released by the previous holder. A renewal never shortens the lease,
+# so the heartbeat of a shard does not cut the longer lease taken for a whole sharded run.
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    if redis.call("ttl", KEYS[1]) < tonumber(ARGV[2]) then
+        redis.call("expire", KEYS[1], ARGV[2])
+    end
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RunLease:
+    """
+    Lease on a scheduled run kept in Redis, so the same run is not executed by two workers at once.
+
+    The lease expires after `ttl` seconds unless it is renewed. While the lease is used as a context manager,
+    a heartbeat thread renews it every `ttl / 3` seconds, so a lease of a crashed worker expires quickly,
+    while a long run keeps it.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        key: A string representing the Redis key of the lease.
+        ttl: An integer representing the number of seconds the lease is valid without a heartbeat.
+        token: A string identifying the holder of the lease.
+    """
+
+    prefix = "notify:lease"
+
+    def __init__(self, client: Redis, name: str, ttl: int = 120, token: str | None = None) -> None:
+        self.client = client
+        self.key = f"{self.prefix}:{name}"
+        self.ttl = ttl
+        self.token = token or uuid4().hex
+        self._stopped = Event()
+        self._heartbeat: Thread | None = None
+
+    def acquire(self) -> bool:
+        """
+        Try to take the lease. The lease is taken only if it is free, i.e. it was released or it expired,
+        so every attempt of a run, including a redelivered task, needs its own token.
+
+        Returns:
+            A boolean indicating whether the lease was taken. It is False if another worker holds it.
+        """
+        return bool(self.client.set(self.key, self.token, nx=True, ex=self.ttl))
+
+    def holder(self) -> str | None:
+        """Returns the token of the current holder of the lease, or None if the lease is free."""
+        token = self.client.get(self.key)
+        return token.decode() if isinstance(token, bytes) else token
+
+    def renew(self, ttl: int | None = None) -> bool:
+        """
+        Extend the lease to `ttl` seconds, `self.ttl` by default. A lease with a longer time left is not shortened.
+
+        Returns:
+            A boolean indicating whether the lease is still held with our token.
+        """
+        return bool(self.client.eval(RENEW_SCRIPT, 1, self.key, self.token, ttl or self.ttl))
+
+    def release(self) -> None:
+        self.client.eval(RELEASE_SCRIPT, 1, self.key, self.token)
+
+    def start_heartbeat(self) -> None:
+        self._stopped.clear()
+        self._heartbeat = Thread(target=self._beat, name=f"lease-{self.key}", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self) -> None:
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def _beat(self) -> None:
+        while not self._stopped.wait(self.ttl / 3):
+            try:
+                if not self.renew():
+                    logger.warning(f"Lease {self.key} was lost")
+                    return
+            except Exception as e:
+                logger.exception(e)
+
+    def __enter__(self) -> "RunLease":
+        self.start_heartbeat()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.stop_heartbeat()
@@ -0,0 +1,145 @@
+import math
+import time
+from array import array
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from threading import Lock
+from typing import Any, Iterable, Iterator, Protocol, TypeVar
+
+from pymongo.collection import Collection
+
+T = TypeVar("T")
+
+
+class RunReportStore(Protocol):
+    def save(self, report: dict[str, Any]) -> None:
+        ...
+
+
+class MongoRunReportStore:
+    """
+    Stores run reports as documents in a MongoDB collection, one document per run.
+
+    Attributes:
+        collection: A `Collection` object representing the MongoDB collection for run reports.
+    """
+
+    def __init__(self, collection: Collection[Any]) -> None:
+        self.collection = collection
+
+    def save(self, report: dict[str, Any]) -> None:
+        self.collection.insert_one(dict(report))
+
+
+class RunMetrics:
+    """
+    Timers and counters of a single scheduler run.
+
+    Durations are recorded per stage (e.g. "get_weather" or "send_mail") and counters are incremented
+    by name (e.g. "cache_hits"). All methods are thread-safe, so the metrics can be shared by worker threads
+    and by the services used by the scheduler.
+
+    Attributes:
+        started_at: A `datetime` object representing the start of the run.
+        durations: A dictionary mapping stage names to arrays of durations in seconds.
+        counters: A `Counter` object mapping counter names to their values.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = datetime.now(UTC)
+            self._started = time.perf_counter()
+            self.durations: defaultdict[str, array] = defaultdict(lambda: array("d"))
+            self.counters: Counter[str] = Counter()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def increment(self, counter: str, number: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += number
+
+    def timed(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        Yields the given items, recording the time spent waiting for each of them as `stage`.
+
+        This is used to time lazily streamed database results.
+        """
+        iterator = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(stage, time.perf_counter() - started)
+            yield item
+
+    def report(self, run_id: str, frequency: str, summary: Any) -> dict[str, Any]:
+        """
+        Builds a report document of the run.
+
+        Args:
+            run_id: A string representing the ID of the run.
+            frequency: A string representing the frequency of the run.
+            summary: A `RunSummary` object with the counts of the run.
+
+        Returns:
+            A dictionary with the durations, percentiles, counters and throughput of the run.
+        """
+        duration = time.perf_counter() - self._started
+        processed = summary.sent + summary.failed + summary.skipped
+        with self._lock:
+            stages = {stage: stage_statistics(durations) for stage, durations in self.durations.items()}
+            counters = dict(self.counters)
+        return {
+            "run_id": run_id,
+            "frequency": frequency,
+            "started_at": self.started_at,
+            "finished_at": datetime.now(UTC),
+            "duration": duration,
+            "sent": summary.sent,
+            "failed": summary.failed,
+            "skipped": summary.skipped,
+            "deferred": summary.deferred,
+            "throughput": processed / duration if duration > 0 else 0.0,
+            "stages": stages,
+            "counters": counters,
+        }
+
+
+def stage_statistics(durations: Iterable[float]) -> dict[str, float]:
+    """Returns the count, total, mean, percentiles and maximum of the durations of a stage."""
+    values = sorted(durations)
+    total = sum(values)
+    return {
+        "count": len(values),
+        "total": total,
+        "mean": total / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Returns the nearest-rank percentile of sorted values, or 0 if there are no values."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values), math.ceil(percent / 100 * len(values))) - 1)
+    return values[index]
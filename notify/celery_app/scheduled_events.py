@@ -1,12 +1,35 @@
-from typing import Any, Protocol
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from itertools import groupby
+from threading import BoundedSemaphore, Lock
+from typing import Any, Iterable, Iterator, Protocol, Self, Sequence
 
+from notify.app.deadline import Deadline
 from notify.app.logger import LoggerType, create_logger
+from notify.exceptions.exceptions import DeadlineExceededException, RunDataException
 from notify.models.event import Event
-from notify.models.query_params import Frequency
+from notify.models.query_params import EventType, Frequency
+from notify.models.shard import Shard, shard_of
+from notify.models.subscription import Subscription
 from notify.models.user import User
+from notify.weather.alerts import Alert, AlertIndex, AlertRule
+
+from .catch_up import CatchUpQueue
+from .checkpoints import RUN_FINISHED, CheckpointStore
+from .config import SchedulerConfig
+from .delivery_ledger import DeliveryLedger
+from .forecast_changes import ChangeFilter
+from .memory_profile import MemoryProfiler
+from .pipeline import Emit, Pipeline
+from .run_report import RunMetrics, RunReportStore
 
 logger = create_logger(LoggerType.WEATHER, "SCHEDULER")
 
+Location = tuple[Frequency, str, str]
+Place = tuple[str, str]
+
 
 class Sender(Protocol):
     def send(self, subject: str, msg: str, receiver: str) -> bool:
@@ -22,16 +45,115 @@ class DatabaseEvents(Protocol):
     def get_events_by_frequency(self, user: User, frequency: Frequency) -> list[Event] | None:
         ...
 
+    def get_subscriptions(
+        self,
+        frequency: Frequency | Sequence[Frequency],
+        after: tuple[str, str] | None = None,
+        send_minute: int | None = None,
+        shard: Shard | None = None,
+    ) -> Iterable[Subscription]:
+        ...
+
+    def get_user_subscriptions(
+        self, frequency: Frequency, after_user: int | None = None, send_minute: int | None = None
+    ) -> Iterable[Subscription]:
+        ...
+
 
 class WeatherProvider(Protocol):
     def get_weather(self, frequency: Frequency, city: str, country: str) -> list[Any] | None:
         ...
 
+    def get_weathers(self, frequencies: list[Frequency], city: str, country: str) -> dict[Frequency, list[Any]]:
+        ...
+
 
 class MessageBuilder(Protocol):
-    def compose_message(self, event: Event, weather: list) -> tuple[str, Any] | tuple[None, None]:
+    def compose_message(
+        self, event: Event, weather: list, alert: Alert | None = None
+    ) -> tuple[str, Any] | tuple[None, None]:
         ...
 
+    def compose_digest(self, sections: list[tuple[str, Any]]) -> tuple[str, Any]:
+        ...
+
+
+@dataclass
+class RunSummary:
+    """
+    Counts of reports handled during a scheduler run.
+
+    Attributes:
+        sent: An integer representing the number of reports sent successfully.
+        failed: An integer representing the number of reports that could not be built or sent because of an error.
+        skipped: An integer representing the number of reports skipped because there was nothing to send.
+        deferred: An integer representing the number of reports deferred to a catch-up run because the deadline
+            of the run was exceeded.
+    """
+
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    deferred: int = 0
+
+    def __add__(self, other: Self) -> Self:
+        return type(self)(
+            self.sent + other.sent,
+            self.failed + other.failed,
+            self.skipped + other.skipped,
+            self.deferred + other.deferred,
+        )
+
+
+class LocationProgress:
+    """Number of unfinished tasks of a location, or of a user, decremented by the worker threads."""
+
+    def __init__(self, key: tuple[str, str] | int) -> None:
+        self.key = key
+        self.pending = 0
+        self._lock = Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.pending == 0
+
+    def add(self, future: Future) -> None:
+        self.start()
+        future.add_done_callback(self.finish)
+
+    def start(self, count: int = 1) -> None:
+        with self._lock:
+            self.pending += count
+
+    def finish(self, *_: Any) -> None:
+        with self._lock:
+            self.pending -= 1
+
+
+def evaluate_alerts(subscriptions: list[Subscription], weather: list) -> list[tuple[Subscription, Alert | None]]:
+    """
+    Evaluates the rules of all alert subscriptions of a location at once with an `AlertIndex`.
+
+    The triggered alerts are returned with their subscriptions and passed on to the message builder,
+    so the forecast is not scanned again for every subscriber.
+
+    Args:
+        subscriptions: A list of `Subscription` objects of a single location and frequency.
+        weather: A list of measurements for the location.
+
+    Returns:
+        A list of tuples of the subscriptions to deliver, which are the reports and the triggered alerts,
+        and their `Alert` objects, or None for the reports.
+    """
+    alerts = [s for s in subscriptions if s.event.event_type == EventType.ALERT]
+    rules = ((AlertRule.from_event(s.event), s) for s in alerts if s.event.alert_threshold is not None)
+    triggered = {id(subscription): alert for subscription, alert in AlertIndex(rules).triggered(weather)}
+    return [
+        (s, triggered.get(id(s)))
+        for s in subscriptions
+        if s.event.event_type != EventType.ALERT or id(s) in triggered
+    ]
+
 
 class MailScheduler:
     """
@@ -44,6 +166,22 @@ class MailScheduler:
         weather_provider: A `WeatherProvider` object representing the weather provider to use.
         message_builder: A `MessageBuilder` object representing the message builder to use.
         frequency: A `Frequency` object representing the frequency of the email sends.
+        config: A `SchedulerConfig` object representing the settings of the run.
+        checkpoints: An optional `CheckpointStore` object used to save the progress of the run,
+            so an interrupted run continues from the last processed user or location.
+        ledger: An optional `DeliveryLedger` object recording delivered reports, so a report is not sent twice
+            for the same forecast date.
+        metrics: A `RunMetrics` object collecting the stage timers and counters of the current run.
+        reports: An optional `RunReportStore` object persisting the report of every finished run.
+        deadline: An optional `Deadline` object limiting the duration of a run. It is restarted by `run` and should
+            be shared with the weather provider and the sender, so their calls time out within the budget.
+        catch_up: An optional `CatchUpQueue` object receiving the subscriptions that could not be processed
+            before the deadline.
+        changes: An optional `ChangeFilter` object skipping the reports of events subscribed with `only_changes`
+            whose forecast did not change since the last report.
+        memory: An optional `MemoryProfiler` object sampling the memory of the run. Its results are added
+            to the run report.
+        summary: A `RunSummary` object with the counts of the current run.
     """
 
     def __init__(
@@ -54,6 +192,15 @@ class MailScheduler:
         weather_provider: WeatherProvider,
         message_builder: MessageBuilder,
         frequency: Frequency,
+        config: SchedulerConfig | None = None,
+        checkpoints: CheckpointStore | None = None,
+        ledger: DeliveryLedger | None = None,
+        metrics: RunMetrics | None = None,
+        reports: RunReportStore | None = None,
+        deadline: Deadline | None = None,
+        catch_up: CatchUpQueue | None = None,
+        changes: ChangeFilter | None = None,
+        memory: MemoryProfiler | None = None,
     ) -> None:
         self.sender = sender
         self.database_users = database_users
@@ -61,30 +208,709 @@ class MailScheduler:
         self.weather_provider = weather_provider
         self.message_builder = message_builder
         self.frequency = frequency
+        self.config = config or SchedulerConfig()
+        self.checkpoints = checkpoints
+        self.ledger = ledger
+        self.metrics = metrics or RunMetrics()
+        self.reports = reports
+        self.deadline = deadline
+        self.catch_up = catch_up
+        self.changes = changes
+        self.memory = memory
+        self.memory_report: dict[str, Any] | None = None
+        self.watermark: Any = None
+        self.summary = RunSummary()
+        self._summary_lock = Lock()
+        self._checkpoint_lock = Lock()
+        self._pipeline_locations: deque[LocationProgress] = deque()
+        self._location_locks: dict[tuple[str, str], Lock] = {}
+        self._location_locks_guard = Lock()
+        self._location_weather: dict[tuple[str, str], list | Exception | None] = {}
 
-    def get_users(self) -> list[User] | None:
-        return self.database_users.get_users()
+    def get_users(self) -> list[User]:
+        """Returns all users. Raises `RunDataException` if they could not be loaded, so the run is not finished."""
+        with self.metrics.timer("get_users"):
+            users = self.database_users.get_users()
+        if users is None:
+            raise RunDataException("users")
+        return users
 
     def get_events(self, user: User) -> list[Event] | None:
-        return self.database_events.get_events_by_frequency(user, self.frequency)
+        with self.metrics.timer("get_events"):
+            return self.database_events.get_events_by_frequency(user, self.frequency)
 
     def get_weather(self, city: str, country: str) -> list[Any] | None:
-        return self.weather_provider.get_weather(self.frequency, city, country)
+        self.check_deadline("getting weather")
+        with self.metrics.timer("get_weather"):
+            return self.weather_provider.get_weather(self.frequency, city, country)
 
-    def build_message(self, event: Event, weather: list) -> tuple[str, Any] | tuple[None, None]:
-        return self.message_builder.compose_message(event, weather)
+    def get_weathers(self, frequencies: list[Frequency], city: str, country: str) -> dict[Frequency, list[Any]]:
+        self.check_deadline("getting weather")
+        with self.metrics.timer("get_weather"):
+            return self.weather_provider.get_weathers(frequencies, city, country)
 
-    def send_mail(self, subject: str, body: str, recipient: str) -> None:
-        self.sender.send(subject, body, recipient)
+    def build_message(
+        self, event: Event, weather: list, alert: Alert | None = None
+    ) -> tuple[str, Any] | tuple[None, None]:
+        with self.metrics.timer("build_message"):
+            return self.message_builder.compose_message(event, weather, alert)
 
-    def run(self) -> None:
-        users = self.get_users()
-        if users is None:
+    def send_mail(self, subject: str, body: str, recipient: str) -> bool:
+        self.check_deadline("sending email")
+        with self.metrics.timer("send_mail"):
+            return self.sender.send(subject, body, recipient)
+
+    @property
+    def frequencies(self) -> list[Frequency]:
+        """Frequencies of the reports sent in this run. A merged run sends both hourly and daily reports."""
+        if self.config.merged:
+            return list(Frequency)
+        return [self.frequency]
+
+    def get_subscriptions(self) -> Iterable[Subscription]:
+        after = tuple(self.watermark) if isinstance(self.watermark, list) else None
+        frequency = self.frequencies if self.config.merged else self.frequency
+        return self.metrics.timed(
+            "get_events",
+            self.database_events.get_subscriptions(
+                frequency, after=after, send_minute=self.config.send_minute, shard=self.shard
+            ),
+        )
+
+    @property
+    def shard(self) -> Shard | None:
+        """Shard of the run as an (index, count) tuple, or None if the run is not sharded."""
+        if self.config.shard_count == 1:
+            return None
+        return self.config.shard_index, self.config.shard_count
+
+    def in_shard(self, city: str, country: str) -> bool:
+        return shard_of(city, country, self.config.shard_count) == self.config.shard_index
+
+    def run(self) -> RunSummary:
+        """
+        Sends the reports of the given frequency to all subscribers.
+
+        Errors reading users or subscriptions are raised, and the run is then not marked as finished,
+        so a retried run continues from its last checkpoint.
+
+        Returns:
+            A `RunSummary` object with the counts of sent, failed and skipped reports.
+        """
+        self.summary = RunSummary()
+        self.metrics.reset()
+        self.memory_report = None
+        if self.memory is not None:
+            self.memory.start()
+        try:
+            if self.deadline is not None:
+                self.deadline.start()
+            self.watermark = self.load_checkpoint()
+            if self.watermark == RUN_FINISHED:
+                logger.info(f"Run {self.run_id} has already finished")
+                return self.summary
+            if self.watermark is not None:
+                logger.info(f"Resuming run {self.run_id} after {self.watermark}")
+
+            if self.config.merged:
+                self.run_merged()
+            elif self.config.digest:
+                self.run_digest()
+            elif self.config.pipeline:
+                self.run_pipelined()
+            elif self.config.workers > 1:
+                self.run_concurrent()
+            elif self.config.grouped:
+                self.run_grouped()
+            else:
+                self.run_users()
+
+            self.save_checkpoint(RUN_FINISHED)
+            logger.info(f"Run finished: {self.summary}")
+        finally:
+            # Tracing slows down every allocation of the process, so it is stopped even if the run fails.
+            self.stop_memory_profile()
+        self.save_report()
+        return self.summary
+
+    @property
+    def run_id(self) -> str:
+        """ID of the run, unique per frequency, day, shard and send minute."""
+        config = self.config
+        frequency = "+".join(frequency.value for frequency in self.frequencies)
+        run_id = f"{frequency}:{date.today().isoformat()}:{config.shard_index}-{config.shard_count}"
+        if config.send_minute is not None:
+            run_id += f":{config.send_minute}"
+        if config.catch_up:
+            run_id += ":catch-up"
+        return run_id
+
+    def load_checkpoint(self) -> Any:
+        if self.checkpoints is None:
+            return None
+        try:
+            return self.checkpoints.get(self.run_id)
+        except Exception as e:
+            logger.exception(e)
+            return None
+
+    def save_checkpoint(self, watermark: Any) -> None:
+        if self.checkpoints is None:
+            return
+        try:
+            self.checkpoints.save(self.run_id, watermark)
+        except Exception as e:
+            logger.exception(e)
+
+    def check_deadline(self, operation: str) -> None:
+        """Raises `DeadlineExceededException` if the deadline of the run is exceeded."""
+        if self.deadline is not None and self.deadline.expired():
+            raise DeadlineExceededException(operation)
+
+    def defer(self, subscriptions: list[Subscription]) -> None:
+        """
+        Moves subscriptions which could not be processed before the deadline to the catch-up queue.
+
+        Args:
+            subscriptions: A list of `Subscription` objects whose reports were not sent.
+        """
+        self.count("deferred", len(subscriptions))
+        self.metrics.increment("deferred", len(subscriptions))
+        if self.catch_up is None:
             return
+        try:
+            self.catch_up.push(subscriptions)
+        except Exception as e:
+            logger.exception(e)
+
+    def save_report(self) -> None:
+        if self.reports is None:
+            return
+        try:
+            frequency = "+".join(frequency.value for frequency in self.frequencies)
+            report = self.metrics.report(self.run_id, frequency, self.summary)
+            if self.memory_report is not None:
+                report["memory"] = self.memory_report
+            self.reports.save(report)
+        except Exception as e:
+            logger.exception(e)
+
+    def sample_memory(self, label: str) -> None:
+        if self.memory is not None:
+            self.memory.sample(label)
+
+    def tick_memory(self, unit: str) -> None:
+        if self.memory is not None:
+            self.memory.tick(unit)
+
+    def stop_memory_profile(self) -> None:
+        if self.memory is None:
+            return
+        try:
+            self.memory_report = self.memory.stop()
+        except Exception as e:
+            logger.exception(e)
+
+    def run_users(self) -> None:
+        """
+        Processes the events of every user, one user at a time.
+
+        With checkpoints enabled, users are processed in order of their ID, and users up to the saved
+        watermark are skipped.
+        """
+        users = self.get_users()
         logger.info(f"Found {len(users)} users")
+        self.sample_memory("users loaded")
 
+        if self.checkpoints is not None:
+            users = sorted(users, key=lambda user: user.user_id)
         for user in users:
+            if isinstance(self.watermark, int) and user.user_id <= self.watermark:
+                continue
             self.process_user(user)
+            self.save_checkpoint(user.user_id)
+            self.tick_memory("users")
+
+    def run_grouped(self) -> None:
+        """
+        Processes all subscriptions, resolving the weather once per location.
+
+        Subscriptions are streamed from the database ordered by location, so the weather for a location
+        is retrieved once and then used for every subscriber of that location.
+        """
+        for (_, city, country), subscriptions in self.group_by_location(self.get_subscriptions()):
+            self.process_location(city, country, subscriptions)
+            self.save_checkpoint([city, country])
+            self.tick_memory("locations")
+
+    @staticmethod
+    def group_by_location(subscriptions: Iterable[Subscription]) -> Iterator[tuple[Location, list[Subscription]]]:
+        """
+        Groups subscriptions by the location of their event.
+
+        Subscriptions are expected to be ordered by location, as returned by `get_subscriptions`,
+        so only the subscribers of a single location are kept in memory at a time.
+
+        Args:
+            subscriptions: An iterable of `Subscription` objects ordered by location.
+
+        Yields:
+            Tuples of (frequency, city, country) and the list of subscriptions for that location.
+        """
+
+        def location(subscription: Subscription) -> Location:
+            event = subscription.event
+            return event.frequency, event.city, event.country
+
+        for key, group in groupby(subscriptions, key=location):
+            yield key, list(group)
+
+    def process_location(self, city: str, country: str, subscriptions: list[Subscription]) -> None:
+        """
+        Sends reports to all subscribers of a single location.
+
+        Args:
+            city: A string representing the city of the location.
+            country: A string representing the country of the location.
+            subscriptions: A list of `Subscription` objects for the location.
+        """
+        try:
+            weather = self.get_weather(city, country)
+        except DeadlineExceededException:
+            self.defer(subscriptions)
+            return
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("weather_failures")
+            self.count("failed", len(subscriptions))
+            return
+        if weather is None:
+            self.metrics.increment("weather_missing")
+            self.count("skipped", len(subscriptions))
+            return
+        logger.info(f"Weather fetched for {city}, {country}, sending to {len(subscriptions)} subscribers")
+
+        for subscription, alert in self.filter_alerts(subscriptions, weather):
+            self.deliver(subscription.email, subscription.event, weather, alert)
+
+    def run_concurrent(self) -> None:
+        """
+        Processes all subscriptions in a pool of `config.workers` threads.
+
+        Every subscription is processed as a separate task. Weather is fetched by the first task of a location,
+        while other tasks of the same location wait for it and reuse the result, so a location is fetched once.
+        The number of pending tasks is bounded, so subscriptions are not read faster than they are processed.
+        In grouped mode, a location is checkpointed once it and all locations before it are finished.
+        Otherwise, subscriptions are read user by user, and a user is checkpointed the same way.
+        """
+        self._location_locks.clear()
+        self._location_weather.clear()
+        slots = BoundedSemaphore(self.config.workers * 2)
+        locations: deque[LocationProgress] = deque()
+
+        if self.config.grouped:
+            subscriptions = self.get_subscriptions()
+        else:
+            subscriptions = self.get_user_subscriptions()
+
+        with ThreadPoolExecutor(max_workers=self.config.workers, thread_name_prefix="scheduler") as pool:
+            for subscription in subscriptions:
+                slots.acquire()
+                future = pool.submit(self.process_subscription, subscription)
+                future.add_done_callback(lambda _: slots.release())
+                self.track_location(locations, subscription, future)
+
+        self._location_weather.clear()
+
+    def track_location(self, locations: deque[LocationProgress], subscription: Subscription, future: Future) -> None:
+        """
+        Tracks pending tasks per location, or per user without grouped mode, and checkpoints the locations
+        or users that are finished.
+
+        Args:
+            locations: A deque of `LocationProgress` objects, in the order the locations were submitted.
+            subscription: A `Subscription` object that was just submitted.
+            future: A `Future` object of the submitted task.
+        """
+        if self.config.grouped:
+            key: tuple[str, str] | int = (subscription.event.city, subscription.event.country)
+        else:
+            key = subscription.user_id
+        if not locations or locations[-1].key != key:
+            locations.append(LocationProgress(key))
+        locations[-1].add(future)
+
+        finished = None
+        while len(locations) > 1 and locations[0].done:
+            finished = locations.popleft().key
+        if finished is not None:
+            self.save_checkpoint(list(finished) if isinstance(finished, tuple) else finished)
+
+    def run_pipelined(self) -> None:
+        """
+        Processes all subscriptions in three stages connected by bounded queues.
+
+        Weather is resolved once per location by the fetch stage, reports are built by the render stage and
+        sent by the deliver stage. Every stage has its own number of threads, so network fetches, rendering
+        and SMTP traffic overlap, while a slow stage holds back the stages in front of it.
+        A location is checkpointed once the deliver stage has finished it and all locations before it.
+        """
+        places = (
+            ((city, country), subscriptions)
+            for (_, city, country), subscriptions in self.group_by_location(self.get_subscriptions())
+        )
+        pipeline = Pipeline(self.config.queue_size)
+        pipeline.add_stage(self.fetch_stage, self.config.fetch_workers)
+        pipeline.add_stage(self.render_stage, self.config.render_workers)
+        pipeline.add_stage(self.deliver_stage, self.config.send_workers)
+        pipeline.run(self.track_places(places))
+
+    def track_places(
+        self, places: Iterable[tuple[Place, list[Subscription]]]
+    ) -> Iterator[tuple[LocationProgress, list[Subscription]]]:
+        """
+        Attaches a `LocationProgress` object to every location passed through a pipeline.
+
+        The location counts as one unfinished task until the fetch stage has emitted all of its reports,
+        and then as one task for every report until it is delivered or dropped.
+
+        Args:
+            places: An iterable of (city, country) tuples and the subscriptions of the location.
+
+        Yields:
+            Tuples of the `LocationProgress` object and the subscriptions of a location.
+        """
+        self._pipeline_locations.clear()
+        for key, subscriptions in places:
+            progress = LocationProgress(key)
+            progress.start()
+            self._pipeline_locations.append(progress)
+            yield progress, subscriptions
+
+    def finish_location_task(self, progress: LocationProgress) -> None:
+        """
+        Finishes a task of a location in a pipeline, and checkpoints the locations that are finished
+        together with all locations before them.
+        """
+        progress.finish()
+        locations = self._pipeline_locations
+        with self._checkpoint_lock:
+            finished = None
+            while locations and locations[0].done:
+                finished = locations.popleft().key
+            if finished is not None:
+                self.save_checkpoint(list(finished))
+
+    def fetch_stage(self, item: tuple[LocationProgress, list[Subscription]], emit: Emit) -> None:
+        progress, subscriptions = item
+        try:
+            self.emit_location(progress, subscriptions, emit)
+        finally:
+            self.finish_location_task(progress)
+
+    def emit_location(self, progress: LocationProgress, subscriptions: list[Subscription], emit: Emit) -> None:
+        city, country = progress.key
+        try:
+            weather = self.get_weather(city, country)
+        except DeadlineExceededException:
+            self.defer(subscriptions)
+            return
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("weather_failures")
+            self.count("failed", len(subscriptions))
+            return
+        if weather is None:
+            self.metrics.increment("weather_missing")
+            self.count("skipped", len(subscriptions))
+            return
+
+        for subscription, alert in self.filter_alerts(subscriptions, weather):
+            progress.start()
+            emit((progress, subscription, weather, alert))
+        self.tick_memory("locations")
+
+    def render_stage(self, item: tuple[LocationProgress, Subscription, list, Alert | None], emit: Emit) -> None:
+        progress, subscription, weather, alert = item
+        try:
+            report = self.render(subscription.email, subscription.event, weather, alert)
+        except Exception:
+            self.finish_location_task(progress)
+            raise
+        if report is None:
+            self.finish_location_task(progress)
+            return
+        emit((progress, subscription, *report, weather))
+
+    def deliver_stage(self, item: tuple[LocationProgress, Subscription, str, Any, list], emit: Emit) -> None:
+        progress, subscription, title, message, weather = item
+        try:
+            self.dispatch(subscription.email, subscription.event, title, message, weather)
+        finally:
+            self.finish_location_task(progress)
+
+    def run_merged(self) -> None:
+        """
+        Processes the subscriptions of all frequencies in a single pass.
+
+        Subscriptions of every frequency are streamed together, ordered by location. The weather for all
+        frequencies of a location is resolved at once, so a location subscribed both hourly and daily is
+        looked up once, and then both report types are sent. With `config.pipeline`, reports are built
+        and sent by the render and deliver stages of a pipeline.
+        """
+        places = self.group_by_place(self.get_subscriptions())
+        if self.config.pipeline:
+            pipeline = Pipeline(self.config.queue_size)
+            pipeline.add_stage(self.merged_fetch_stage, self.config.fetch_workers)
+            pipeline.add_stage(self.render_stage, self.config.render_workers)
+            pipeline.add_stage(self.deliver_stage, self.config.send_workers)
+            pipeline.run(self.track_places(places))
+            return
+
+        for (city, country), subscriptions in places:
+            for subscription, weather, alert in self.resolve_place(city, country, subscriptions):
+                self.deliver(subscription.email, subscription.event, weather, alert)
+            self.save_checkpoint([city, country])
+            self.tick_memory("locations")
+
+    @staticmethod
+    def group_by_place(subscriptions: Iterable[Subscription]) -> Iterator[tuple[Place, list[Subscription]]]:
+        """
+        Groups subscriptions by the city and country of their event, regardless of the frequency.
+
+        Args:
+            subscriptions: An iterable of `Subscription` objects ordered by location.
+
+        Yields:
+            Tuples of (city, country) and the list of subscriptions for that location.
+        """
+        for key, group in groupby(subscriptions, key=lambda s: (s.event.city, s.event.country)):
+            yield key, list(group)
+
+    def resolve_place(
+        self, city: str, country: str, subscriptions: list[Subscription]
+    ) -> Iterator[tuple[Subscription, list, Alert | None]]:
+        """
+        Resolves the weather of all frequencies needed by the subscribers of a location.
+
+        Args:
+            city: A string representing the city of the location.
+            country: A string representing the country of the location.
+            subscriptions: A list of `Subscription` objects for the location.
+
+        Yields:
+            Tuples of a subscription, the weather for its frequency and the triggered alert of an alert
+            subscription, or None for a report. Subscriptions without weather are counted
+            as skipped, or as failed if the weather could not be retrieved.
+        """
+        frequencies = [f for f in Frequency if any(s.event.frequency == f for s in subscriptions)]
+        try:
+            weathers = self.get_weathers(frequencies, city, country)
+        except DeadlineExceededException:
+            self.defer(subscriptions)
+            return
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("weather_failures")
+            self.count("failed", len(subscriptions))
+            return
+        logger.info(f"Weather fetched for {city}, {country}, sending to {len(subscriptions)} subscribers")
+
+        for frequency in frequencies:
+            group = [s for s in subscriptions if s.event.frequency == frequency]
+            if not (weather := weathers.get(frequency)):
+                self.metrics.increment("weather_missing", len(group))
+                self.count("skipped", len(group))
+                continue
+            for subscription, alert in self.filter_alerts(group, weather):
+                yield subscription, weather, alert
+
+    def filter_alerts(
+        self, subscriptions: list[Subscription], weather: list
+    ) -> list[tuple[Subscription, Alert | None]]:
+        """
+        Evaluates the rules of all alert subscriptions of a location at once, see `evaluate_alerts`.
+
+        Alerts whose rules are not triggered by the forecast are counted as skipped, so reports are built
+        only for the triggered ones.
+
+        Args:
+            subscriptions: A list of `Subscription` objects of a single location and frequency.
+            weather: A list of measurements for the location.
+
+        Returns:
+            A list of tuples of the subscriptions to deliver and their `Alert` objects, or None for the reports.
+        """
+        if all(s.event.event_type != EventType.ALERT for s in subscriptions):
+            return [(s, None) for s in subscriptions]
+
+        with self.metrics.timer("evaluate_alerts"):
+            deliverable = evaluate_alerts(subscriptions, weather)
+        quiet = len(subscriptions) - len(deliverable)
+        self.metrics.increment("quiet_alerts", quiet)
+        self.count("skipped", quiet)
+        return deliverable
+
+    def merged_fetch_stage(self, item: tuple[LocationProgress, list[Subscription]], emit: Emit) -> None:
+        progress, subscriptions = item
+        try:
+            for resolved in self.resolve_place(*progress.key, subscriptions):
+                progress.start()
+                emit((progress, *resolved))
+            self.tick_memory("locations")
+        finally:
+            self.finish_location_task(progress)
+
+    def run_digest(self) -> None:
+        """
+        Sends every user a single digest with the reports of all of their events.
+
+        Subscriptions are streamed from the database ordered by user, and the subscriptions of a user are
+        processed together, while the weather of a location is fetched at most once per run. With sharding,
+        users are split between shards by their ID, so all reports of a user end up in the same digest.
+        """
+        self._location_weather.clear()
+        for user_id, subscriptions in groupby(self.get_digest_subscriptions(), key=lambda s: s.user_id):
+            self.process_digest(list(subscriptions))
+            self.save_checkpoint(user_id)
+            self.tick_memory("users")
+        self._location_weather.clear()
+
+    def get_digest_subscriptions(self) -> Iterable[Subscription]:
+        after_user = self.watermark if isinstance(self.watermark, int) else None
+        subscriptions = self.metrics.timed(
+            "get_events",
+            self.database_events.get_user_subscriptions(
+                self.frequency, after_user=after_user, send_minute=self.config.send_minute
+            ),
+        )
+        if self.config.shard_count == 1:
+            return subscriptions
+        return (s for s in subscriptions if s.user_id % self.config.shard_count == self.config.shard_index)
+
+    def process_digest(self, subscriptions: list[Subscription]) -> None:
+        """
+        Builds the reports of all events of a user and sends them as one message.
+
+        Args:
+            subscriptions: A list of `Subscription` objects of a single user.
+        """
+        sections = []
+        for subscription in subscriptions:
+            event = subscription.event
+            weather = self.get_location_weather(event.city, event.country)
+            if isinstance(weather, DeadlineExceededException):
+                self.defer([subscription])
+            elif isinstance(weather, Exception):
+                self.count("failed")
+            elif weather is None:
+                self.metrics.increment("weather_missing")
+                self.count("skipped")
+            elif (report := self.render(subscription.email, event, weather)) is not None:
+                sections.append((event, weather, *report))
+
+        if len(sections) == 1:
+            event, weather, title, message = sections[0]
+            self.dispatch(subscriptions[0].email, event, title, message, weather)
+        elif sections:
+            self.dispatch_digest(subscriptions[0].user_id, subscriptions[0].email, sections)
+
+    def dispatch_digest(self, user_id: int, email: str, sections: list[tuple[Event, list, str, Any]]) -> None:
+        """
+        Combines built reports into a digest and sends it to the user.
+
+        Args:
+            user_id: An integer representing the ID of the recipient.
+            email: A string representing the email address of the recipient.
+            sections: A list of tuples of the event, the weather, the title and the message of every report.
+        """
+        try:
+            with self.metrics.timer("build_message"):
+                title, message = self.message_builder.compose_digest([(title, body) for _, _, title, body in sections])
+            if self.send_mail(title, message, email):
+                self.count("sent", len(sections))
+                self.metrics.increment("digests")
+                for event, weather, *_ in sections:
+                    self.mark_delivered(event)
+                    if self.changes is not None:
+                        self.changes.record(event, weather)
+                logger.info(f"Digest of {len(sections)} reports sent to {email}")
+            else:
+                self.metrics.increment("send_failures")
+                self.count("failed", len(sections))
+        except DeadlineExceededException:
+            self.defer([Subscription(user_id=user_id, email=email, event=event) for event, *_ in sections])
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("send_failures")
+            self.count("failed", len(sections))
+
+    def get_user_subscriptions(self) -> Iterator[Subscription]:
+        """Yields the subscriptions of every user. With checkpoints, users are ordered by ID like in `run_users`."""
+        users = self.get_users()
+        logger.info(f"Found {len(users)} users")
+
+        if self.checkpoints is not None:
+            users = sorted(users, key=lambda user: user.user_id)
+        for user in users:
+            if isinstance(self.watermark, int) and user.user_id <= self.watermark:
+                continue
+            for event in self.get_events(user) or []:
+                if self.config.shard_count == 1 or self.in_shard(event.city, event.country):
+                    yield Subscription(user_id=user.user_id, email=user.email, event=event)
+
+    def process_subscription(self, subscription: Subscription) -> None:
+        """
+        Processes a single subscription in a worker thread.
+
+        Args:
+            subscription: A `Subscription` object representing the report to send.
+        """
+        event = subscription.event
+        weather = self.get_location_weather(event.city, event.country)
+        if isinstance(weather, DeadlineExceededException):
+            self.defer([subscription])
+        elif isinstance(weather, Exception):
+            self.count("failed")
+        elif weather is None:
+            self.count("skipped")
+        else:
+            self.deliver(subscription.email, event, weather)
+        self.tick_memory("subscriptions")
+
+    def get_location_weather(self, city: str, country: str) -> list | Exception | None:
+        """
+        Retrieves the weather for a location at most once per run.
+
+        A lock is held per location while the weather is fetched, so concurrent tasks for the same location
+        wait for the first one instead of fetching the same forecast again.
+
+        Args:
+            city: A string representing the city of the location.
+            country: A string representing the country of the location.
+
+        Returns:
+            The weather for the location, None if there is no weather, or the exception raised while fetching it.
+        """
+        key = (city, country)
+        with self._location_locks_guard:
+            lock = self._location_locks.setdefault(key, Lock())
+
+        with lock:
+            if key not in self._location_weather:
+                try:
+                    self._location_weather[key] = self.get_weather(city, country)
+                except DeadlineExceededException as e:
+                    self._location_weather[key] = e
+                except Exception as e:
+                    logger.exception(e)
+                    self.metrics.increment("weather_failures")
+                    self._location_weather[key] = e
+            return self._location_weather[key]
+
+    def count(self, outcome: str, number: int = 1) -> None:
+        with self._summary_lock:
+            setattr(self.summary, outcome, getattr(self.summary, outcome) + number)
 
     def process_user(self, user: User) -> None:
         """
@@ -103,30 +929,134 @@ class MailScheduler:
         logger.info(f"Found {len(events)} events for {user.email}")
 
         for event in events:
-            self.process_event(user, event)
+            if self.config.shard_count == 1 or self.in_shard(event.city, event.country):
+                self.process_event(user, event)
 
     def process_event(self, user: User, event: Event) -> None:
         """
-        Processes all events for a given user.
+        Processes a single event for a given user.
 
-        This function retrieves all events for a given user and processes
-        each event using the `process_event` function.
-        If an event has already been processed, it is skipped.
+        This function retrieves the weather for the event location and sends the report to the user.
+        Exceptions are logged, so a failing event does not stop the processing of other events.
 
         Args:
-            user: A `User` object representing the user whose events should be processed.
+            user: A `User` object representing the user who subscribed to the event.
+            event: An `Event` object representing the event to process.
         """
         try:
             weather = self.get_weather(event.city, event.country)
             if weather is None:
+                self.metrics.increment("weather_missing")
+                self.count("skipped")
                 return
             logger.debug("Weather fetched")
+        except DeadlineExceededException:
+            self.defer([Subscription(user_id=user.user_id, email=user.email, event=event)])
+            return
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("weather_failures")
+            self.count("failed")
+            return
+
+        self.deliver(user.email, event, weather)
+
+    def deliver(self, email: str, event: Event, weather: list, alert: Alert | None = None) -> None:
+        """
+        Builds the report for an event and sends it to the recipient.
+
+        Args:
+            email: A string representing the email address of the recipient.
+            event: An `Event` object representing the event to build the report for.
+            weather: A list of measurements for the event location.
+            alert: An optional `Alert` object of an alert event, if its rule was already evaluated.
+        """
+        if (report := self.render(email, event, weather, alert)) is not None:
+            self.dispatch(email, event, *report, weather)
+
+    def render(self, email: str, event: Event, weather: list, alert: Alert | None = None) -> tuple[str, Any] | None:
+        """
+        Builds the report for an event, unless it was already delivered.
+
+        Args:
+            email: A string representing the email address of the recipient.
+            event: An `Event` object representing the event to build the report for.
+            weather: A list of measurements for the event location.
+            alert: An optional `Alert` object of an alert event, if its rule was already evaluated.
+
+        Returns:
+            A tuple of the title and message of the report, or None if there is nothing to send.
+        """
+        if self.deadline is not None and self.deadline.expired():
+            self.defer([Subscription(user_id=event.user_id, email=email, event=event)])
+            return None
+        try:
+            if self.was_delivered(event):
+                logger.info(f"Report for event #{event.event_id} was already delivered to {email}")
+                self.metrics.increment("already_delivered")
+                self.count("skipped")
+                return None
+            if self.changes is not None and self.changes.is_unchanged(event, weather):
+                logger.info(f"Forecast for event #{event.event_id} did not change, skipping report to {email}")
+                self.metrics.increment("unchanged_reports")
+                self.count("skipped")
+                return None
 
-            title, message = self.build_message(event, weather)
-            if title is not None and message is not None:
-                logger.info("Message built successfully")
+            title, message = self.build_message(event, weather, alert)
+            if title is None or message is None:
+                self.metrics.increment("empty_reports")
+                self.count("skipped")
+                return None
+            logger.info("Message built successfully")
+            return title, message
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("render_failures")
+            self.count("failed")
+            return None
+
+    def dispatch(self, email: str, event: Event, title: str, message: Any, weather: list | None = None) -> None:
+        """
+        Sends a built report to the recipient.
+
+        Args:
+            email: A string representing the email address of the recipient.
+            event: An `Event` object representing the event the report was built for.
+            title: A string representing the title of the report.
+            message: The body of the report.
+            weather: An optional list of measurements the report was built from, recorded as the last
+                forecast sent for the event.
+        """
+        try:
+            if self.send_mail(title, message, email):
+                self.count("sent")
+                self.mark_delivered(event)
+                if self.changes is not None:
+                    self.changes.record(event, weather)
+                logger.info(f"Email sent to {email}")
+            else:
+                self.metrics.increment("send_failures")
+                self.count("failed")
+        except DeadlineExceededException:
+            self.defer([Subscription(user_id=event.user_id, email=email, event=event)])
+        except Exception as e:
+            logger.exception(e)
+            self.metrics.increment("send_failures")
+            self.count("failed")
+
+    def was_delivered(self, event: Event) -> bool:
+        if self.ledger is None:
+            return False
+        try:
+            return self.ledger.was_delivered(event.user_id, event.event_id, date.today().isoformat())
+        except Exception as e:
+            logger.exception(e)
+            return False
 
-                self.send_mail(title, message, user.email)
-                logger.info(f"Email sent to {user.email}")
+    def mark_delivered(self, event: Event) -> None:
+        if self.ledger is None:
+            return
+        try:
+            self.ledger.mark_delivered(event.user_id, event.event_id, date.today().isoformat())
         except Exception as e:
             logger.exception(e)
@@ -0,0 +1,59 @@
+from datetime import UTC, datetime
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.CELERY, "SEND_WINDOW_CURSOR")
+
+# Moves the cursor forward only, and returns its previous value, so concurrent or late tasks never claim
+# the same minute twice.
+ADVANCE_SCRIPT = """
+local last = redis.call("get", KEYS[1])
+if last and tonumber(last) >= tonumber(ARGV[1]) then
+    return last
+end
+redis.call("set", KEYS[1], ARGV[1], "EX", ARGV[2])
+return last
+"""
+
+
+class RedisSendWindowCursor:
+    """
+    Last UTC minute handled by the send window task, kept in Redis.
+
+    The send window task starts the runs of the minutes claimed from the cursor. A task executed late,
+    or after a missed one, claims every minute since the last handled one, so no send minute is skipped,
+    and a minute handled by one task is never claimed by another.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        backfill: An integer representing the maximum number of minutes claimed at once. Older minutes are skipped,
+            e.g. after the scheduler was down for a longer time.
+        ttl: An integer representing the number of seconds the cursor is kept.
+    """
+
+    key = "notify:send_window:last"
+
+    def __init__(self, client: Redis, backfill: int = 60, ttl: int = 7 * 24 * 60 * 60) -> None:
+        self.client = client
+        self.backfill = backfill
+        self.ttl = ttl
+
+    def claim(self, now: datetime) -> list[datetime]:
+        """
+        Claims the minutes not handled yet, up to the minute of `now`.
+
+        Args:
+            now: A timezone-aware `datetime` object representing the current time.
+
+        Returns:
+            A list of `datetime` objects representing the claimed UTC minutes, in chronological order.
+        """
+        current = int(now.timestamp()) // 60
+        last = self.client.eval(ADVANCE_SCRIPT, 1, self.key, current, self.ttl)
+        first = current if last is None else int(last) + 1
+        if current - first >= self.backfill:
+            logger.warning(f"Skipping {current - first - self.backfill + 1} send window minutes")
+            first = current - self.backfill + 1
+        return [datetime.fromtimestamp(minute * 60, UTC) for minute in range(first, current + 1)]
@@ -1,5 +1,7 @@
-from notify.app.database import mongo_db as mongo
-from notify.app.database import psql_db as psql
+import inspect
+
+from notify.app.database import get_redis, mongo_db as mongo, psql_db as psql
+from notify.app.deadline import Deadline
 from notify.mail.mail_sender import MailSender
 from notify.models.query_params import Frequency
 from notify.repositories.event_repository import EventRepository
@@ -8,45 +10,252 @@ from notify.repositories.user_repository import UserRepository
 from notify.services.event_service import EventService
 from notify.services.user_service import UserService
 from notify.services.weather_service import WeatherService
-from notify.weather.location_provider import OpenMeteoLocationProvider
+from notify.weather.location_provider import (AsyncOpenMeteoLocationProvider,
+                                              OpenMeteoLocationProvider)
 from notify.weather.message_builder import TextMessageBuilder
-from notify.weather.weather_manager import WeatherManager
-from notify.weather.weather_provider import OpenMeteo
+from notify.weather.single_flight import (FlightLock, RedisFlightLock,
+                                          SingleFlight)
+from notify.weather.weather_manager import AsyncWeatherManager, WeatherManager
+from notify.weather.weather_provider import AsyncOpenMeteo, OpenMeteo
 
-from .scheduled_events import MailScheduler
+from .async_scheduled_events import (AsyncMailScheduler, AsyncWeatherProvider,
+                                     PooledSender, ThreadedWeatherProvider)
+from .cache_warmer import CacheWarmer
+from .catch_up import CatchUpEvents, CatchUpQueue, RedisCatchUpQueue
+from .checkpoints import CheckpointStore, RedisCheckpointStore
+from .config import SchedulerConfig
+from .delivery_ledger import DeliveryLedger, RedisDeliveryLedger
+from .forecast_changes import (ChangeFilter, ChangeThresholds,
+                               RedisForecastFingerprints)
+from .memory_profile import MemoryProfiler
+from .run_report import MongoRunReportStore, RunMetrics, RunReportStore
+from .scheduled_events import (DatabaseEvents, DatabaseUsers, MailScheduler,
+                               MessageBuilder, Sender, WeatherProvider)
 
 
-def setup_scheduled_events(frequency: Frequency):
+def setup_scheduled_events(
+    frequency: Frequency, config: SchedulerConfig | None = None, sender: Sender | None = None
+) -> MailScheduler | AsyncMailScheduler:
     """
     This function initializes the services and providers needed for scheduled events, including the mail sender,
     user service, event service, MongoDB database service, and weather manager.
     These services and providers are used to send weather reports to users on a periodic basis.
 
+    With `config.run_budget`, the weather providers and the mail sender share the deadline of the run,
+    and reports which cannot be sent in time are deferred to the catch-up queue. With `config.catch_up`,
+    the scheduler sends the reports claimed from the catch-up queue instead of the subscribed reports.
+
     Args:
         frequency: A `Frequency` object indicating the frequency of the weather reports.
+        config: A `SchedulerConfig` object with the settings of the run. Defaults are used if not given.
+        sender: An optional `Sender` object used instead of the SMTP `MailSender`, e.g. for a dry run.
 
     Returns:
-        A `MailScheduler` object that schedules weather reports to be sent to users on a periodic basis.
+        A `MailScheduler` object that schedules weather reports to be sent to users on a periodic basis,
+            or an `AsyncMailScheduler` object if the async engine is configured.
     """
-    mail_sender = MailSender()
+    config = config or SchedulerConfig()
+    deadline = Deadline(config.run_budget) if config.run_budget > 0 else None
+    mail_sender = sender or MailSender(deadline=deadline)
 
     session = psql.session
     user_service = UserService(UserRepository(session), BcryptHash())
 
-    event_service = EventService(EventRepository(session))
+    catch_up = RedisCatchUpQueue(get_redis(config.redis_url)) if deadline or config.catch_up else None
+    event_service = CatchUpEvents(catch_up, config.catch_up_claim) if config.catch_up else EventService(EventRepository(session))
+
+    metrics = RunMetrics()
+    weather_manager: WeatherProvider | AsyncWeatherProvider
+    if uses_async_engine(config):
+        weather_manager = create_async_weather_manager(
+            metrics, deadline, flight_lock=create_flight_lock(config), combined=config.combined_fetch
+        )
+    else:
+        weather_manager = create_weather_manager(
+            metrics, deadline, flight_lock=create_flight_lock(config), combined=config.combined_fetch
+        )
+
+    message_builder = TextMessageBuilder()
+
+    ledger = RedisDeliveryLedger(get_redis(config.redis_url)) if config.ledger else None
+    checkpoints = RedisCheckpointStore(get_redis(config.redis_url)) if config.checkpoints else None
+    reports = MongoRunReportStore(get_mongo_db()["run_reports"]) if config.reports else None
+    changes = create_change_filter(config) if config.only_changes else None
+    memory = MemoryProfiler(config.memory_every, config.memory_top) if config.memory_profile else None
+
+    return create_scheduler(
+        frequency,
+        config,
+        mail_sender,
+        user_service,
+        event_service,
+        weather_manager,
+        message_builder,
+        checkpoints,
+        ledger,
+        metrics,
+        reports,
+        deadline,
+        catch_up,
+        changes,
+        memory,
+    )
+
+
+def create_scheduler(
+    frequency: Frequency,
+    config: SchedulerConfig,
+    sender: Sender,
+    database_users: DatabaseUsers,
+    database_events: DatabaseEvents,
+    weather_provider: WeatherProvider | AsyncWeatherProvider,
+    message_builder: MessageBuilder,
+    checkpoints: CheckpointStore | None = None,
+    ledger: DeliveryLedger | None = None,
+    metrics: RunMetrics | None = None,
+    reports: RunReportStore | None = None,
+    deadline: Deadline | None = None,
+    catch_up: CatchUpQueue | None = None,
+    changes: ChangeFilter | None = None,
+    memory: MemoryProfiler | None = None,
+) -> MailScheduler | AsyncMailScheduler:
+    """
+    Create the scheduler selected by `config.engine` from the given services.
+    Merged and digest runs are only supported by `MailScheduler`, so they use it regardless of the engine.
+    The async engine sends emails with a `PooledSender` of `config.send_workers` threads. A blocking weather
+    provider, e.g. a synthetic one, is run in threads by `ThreadedWeatherProvider`.
+
+    This function does not connect to any external service, so it is also used to run the scheduler
+    with synthetic data and fake providers, see `notify.celery_app.benchmark`.
+
+    Returns:
+        A `MailScheduler` object, or an `AsyncMailScheduler` object if the async engine is configured.
+    """
+    if uses_async_engine(config):
+        if not inspect.iscoroutinefunction(weather_provider.get_weather):
+            weather_provider = ThreadedWeatherProvider(weather_provider)
+        return AsyncMailScheduler(
+            PooledSender(sender, config.send_workers),
+            database_events,
+            weather_provider,
+            message_builder,
+            frequency,
+            config,
+            ledger,
+            metrics,
+            reports,
+            changes,
+            deadline,
+            catch_up,
+            checkpoints,
+            memory,
+        )
+
+    return MailScheduler(
+        sender,
+        database_users,
+        database_events,
+        weather_provider,
+        message_builder,
+        frequency,
+        config,
+        checkpoints,
+        ledger,
+        metrics,
+        reports,
+        deadline,
+        catch_up,
+        changes,
+        memory,
+    )
+
+
+def uses_async_engine(config: SchedulerConfig) -> bool:
+    """Whether the run uses `AsyncMailScheduler`, which does not support merged and digest runs."""
+    return config.engine == "async" and not config.merged and not config.digest
+
+
+def create_change_filter(config: SchedulerConfig) -> ChangeFilter:
+    """Create a `ChangeFilter` keeping the fingerprints of sent forecasts in Redis."""
+    thresholds = ChangeThresholds(config.change_temperature, config.change_precipitation, config.change_probability)
+    return ChangeFilter(RedisForecastFingerprints(get_redis(config.redis_url)), thresholds)
+
+
+def setup_cache_warmer(config: SchedulerConfig | None = None) -> CacheWarmer:
+    """
+    This function initializes a `CacheWarmer`, which fills the weather cache before a scheduled run.
+    Locations are resolved in batches of `config.weather_batch_size`.
+
+    Args:
+        config: A `SchedulerConfig` object with the settings of the run. Defaults are used if not given.
+
+    Returns:
+        A `CacheWarmer` object resolving the weather of all subscribed locations.
+    """
+    config = config or SchedulerConfig()
+    event_service = EventService(EventRepository(psql.session))
+    weather_manager = create_weather_manager(
+        batch_size=config.weather_batch_size, flight_lock=create_flight_lock(config), combined=config.combined_fetch
+    )
+    return CacheWarmer(weather_manager, event_service, config.prewarm_rate, config.weather_batch_size)
+
 
+def create_weather_manager(
+    metrics: RunMetrics | None = None,
+    deadline: Deadline | None = None,
+    batch_size: int = 100,
+    flight_lock: FlightLock | None = None,
+    combined: bool = False,
+) -> WeatherManager:
+    """
+    Create a `WeatherManager` caching weather in the MongoDB weather collection.
+    OpenMeteo batch requests hold at most `batch_size` locations. Concurrent cache misses of a location
+    are coalesced within the process, and across processes if a `flight_lock` is given. With `combined`,
+    a miss fetches and caches both the hourly and daily weather of the location.
+    """
     collection = "weather_collection"
-    mongo_db = mongo.db
-    if mongo_db is None:
-        raise Exception("MongoDB is not available.")
+    db_service = WeatherService(get_mongo_db()[collection])
+
+    return WeatherManager(
+        location_provider=OpenMeteoLocationProvider(deadline),
+        weather_provider=OpenMeteo(deadline, batch_size),
+        database_service=db_service,
+        metrics=metrics,
+        single_flight=SingleFlight(),
+        flight_lock=flight_lock,
+        combined=combined,
+    )
 
-    db_service = WeatherService(mongo_db[collection])
 
-    weather_manager = WeatherManager(
-        location_provider=OpenMeteoLocationProvider(), weather_provider=OpenMeteo(), database_service=db_service
+def create_async_weather_manager(
+    metrics: RunMetrics | None = None,
+    deadline: Deadline | None = None,
+    flight_lock: FlightLock | None = None,
+    combined: bool = False,
+) -> AsyncWeatherManager:
+    """
+    Create an `AsyncWeatherManager` requesting the weather with the awaitable OpenMeteo providers,
+    and caching it in the same MongoDB collection as `create_weather_manager`.
+    """
+    return AsyncWeatherManager(
+        location_provider=AsyncOpenMeteoLocationProvider(deadline),
+        weather_provider=AsyncOpenMeteo(deadline),
+        database_service=WeatherService(get_mongo_db()["weather_collection"]),
+        metrics=metrics,
+        flight_lock=flight_lock,
+        combined=combined,
     )
 
-    message_builder = TextMessageBuilder()
 
-    ms = MailScheduler(mail_sender, user_service, event_service, weather_manager, message_builder, frequency)
-    return ms
+def create_flight_lock(config: SchedulerConfig) -> RedisFlightLock | None:
+    """Create the Redis lock coalescing weather fetches across processes, if enabled by `config.flight_lock`."""
+    if not config.flight_lock:
+        return None
+    return RedisFlightLock(get_redis(config.redis_url), config.flight_lock_ttl, config.flight_lock_ttl)
+
+
+def get_mongo_db():
+    mongo_db = mongo.db
+    if mongo_db is None:
+        raise Exception("MongoDB is not available.")
+    return mongo_db
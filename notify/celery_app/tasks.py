@@ -1,16 +1,27 @@
 # type: ignore
 import os
-from datetime import datetime
+from dataclasses import asdict, replace
+from datetime import UTC, date, datetime, timedelta
+from uuid import uuid4
 
 import pytz
-from celery import shared_task
+from celery import chord, shared_task
 from celery.schedules import crontab
 
+from notify.app.database import get_redis, psql_db as psql
 from notify.app.logger import LoggerType, create_logger
 from notify.models.query_params import Frequency
+from notify.models.send_window import minute_of_period
+from notify.repositories.event_repository import EventRepository
+from notify.services.event_service import EventService
 
+from .catch_up import RedisCatchUpQueue
+from .config import SchedulerConfig
 from .init_celery import celery_create_app
-from .setup_scheduled_events import setup_scheduled_events
+from .run_lease import RunLease
+from .scheduled_events import RunSummary
+from .send_window_cursor import RedisSendWindowCursor
+from .setup_scheduled_events import setup_cache_warmer, setup_scheduled_events
 
 logger = create_logger(LoggerType.CELERY, "SCHEDULER")
 
@@ -31,26 +42,301 @@ def setup_periodic_tasks(sender, **kwargs):
         sender.add_periodic_task(tasks["crontab"], tasks["task"], name=tasks["name"])
 
 
-@celery_app.task()
-def run_periodic_send(frequency_str: str):
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def run_periodic_send(self, frequency_str: str, send_minute: int | None = None):
     """
     Runs a periodic task to send weather reports to users.
 
     This function is called by the Celery app to send weather reports to users on a periodic basis.
-    The frequency of the reports is determined by the `frequency_str` argument.
+    The frequency of the reports is determined by the `frequency_str` argument. With "merged",
+    hourly and daily reports are sent in a single pass.
+    If the scheduler is configured with more than one shard, the run is split into `run_shard_send` tasks
+    executed as a chord, with `summarize_run` aggregating their results.
+    The task is acknowledged after it finishes, so a run interrupted by a lost worker is delivered again
+    and continues from its checkpoint.
+    With leases enabled, a run is skipped if the same run is still in progress on another worker.
+    The lease is renewed by a heartbeat while the run, or any of its shards, is in progress. A sharded run
+    extends the lease to `shard_lease_ttl` while its shards wait in the queue, and the lease is released
+    by `summarize_run`, or by `release_run_lease` if a shard fails. Every attempt
+    takes the lease with its own token, so a redelivered task never shares the lease with an attempt still
+    running. If the lease is held by an earlier attempt of the same task, e.g. of a lost worker, the task
+    is retried once after the lease would have expired without a heartbeat.
+    Reports deferred because the run exceeded its budget are sent by a `run_catch_up` task started afterwards.
+
+    Args:
+        frequency_str: A string indicating the frequency of the weather reports ("day", "hour" or "merged").
+        send_minute: An optional integer limiting the run to the events sent at this UTC minute of the report period.
+    """
+    from .make_celery import flask_app
+
+    with flask_app.app_context():
+        config = get_run_config(flask_app, frequency_str, send_minute=send_minute)
+        lease = create_run_lease(config, frequency_str, f"{self.request.id}:{uuid4().hex}")
+        if lease is not None and not lease.acquire():
+            holder = lease.holder() or ""
+            if holder.startswith(f"{self.request.id}:") and self.request.retries == 0:
+                logger.info(f"Retrying {frequency_str} run, the lease is held by an earlier attempt")
+                raise self.retry(countdown=config.lease_ttl, max_retries=1)
+            logger.info(f"Skipping {frequency_str} run, the previous run is still in progress")
+            return
+
+        if config.shard_count > 1:
+            token = lease.token if lease is not None else None
+            shards = [
+                run_shard_send.s(frequency_str, index, config.shard_count, send_minute, token)
+                for index in range(config.shard_count)
+            ]
+            callback = summarize_run.s(frequency_str, send_minute, token)
+            if lease is not None:
+                lease.renew(config.shard_lease_ttl)
+                callback = callback.on_error(release_run_lease.si(frequency_str, send_minute, token))
+            chord(shards)(callback)
+            logger.info(f"Started {config.shard_count} shards for {frequency_str} run")
+            return
+
+        service = setup_scheduled_events(get_frequency(frequency_str), config)
+        if lease is None:
+            schedule_catch_up(config, frequency_str, service.run())
+            return
+        try:
+            with lease:
+                summary = service.run()
+        finally:
+            lease.release()
+        schedule_catch_up(config, frequency_str, summary)
+
+
+@celery_app.task(ignore_result=False, acks_late=True, reject_on_worker_lost=True)
+def run_shard_send(
+    frequency_str: str,
+    shard_index: int,
+    shard_count: int,
+    send_minute: int | None = None,
+    lease_token: str | None = None,
+) -> dict:
+    """
+    Sends weather reports for the locations belonging to a single shard.
 
     Args:
         frequency_str: A string indicating the frequency of the weather reports ("day" or "hour").
+        shard_index: An integer representing the shard to process.
+        shard_count: An integer representing the total number of shards of the run.
+        send_minute: An optional integer limiting the run to the events sent at this UTC minute of the report period.
+        lease_token: An optional string representing the token of the run lease, renewed while the shard runs.
+
+    Returns:
+        A dictionary with the counts of sent, failed and skipped reports.
+    """
+    from .make_celery import flask_app
+
+    with flask_app.app_context():
+        config = get_run_config(
+            flask_app, frequency_str, shard_index=shard_index, shard_count=shard_count, send_minute=send_minute
+        )
+        service = setup_scheduled_events(get_frequency(frequency_str), config)
+        lease = create_run_lease(config, frequency_str, lease_token) if lease_token is not None else None
+        if lease is None:
+            return asdict(service.run())
+        with lease:
+            return asdict(service.run())
+
+
+@celery_app.task(ignore_result=False)
+def summarize_run(
+    results: list[dict], frequency_str: str, send_minute: int | None = None, lease_token: str | None = None
+) -> dict:
+    """
+    Aggregates the results of all shards of a run, releases the run lease and starts the catch-up
+    of the deferred reports.
+
+    Args:
+        results: A list of dictionaries returned by the `run_shard_send` tasks.
+        frequency_str: A string indicating the frequency of the weather reports ("day" or "hour").
+        send_minute: An optional integer representing the UTC send minute of the run.
+        lease_token: An optional string representing the token of the run lease.
+
+    Returns:
+        A dictionary with the total counts of sent, failed and skipped reports.
+    """
+    summary = sum((RunSummary(**result) for result in results), RunSummary())
+    logger.info(f"Finished {frequency_str} run in {len(results)} shards: {summary}")
+
+    if lease_token is not None or summary.deferred > 0:
+        from .make_celery import flask_app
+
+        config = get_run_config(flask_app, frequency_str, send_minute=send_minute)
+        if lease_token is not None:
+            create_run_lease(config, frequency_str, lease_token).release()
+        schedule_catch_up(config, frequency_str, summary)
+    return asdict(summary)
+
+
+@celery_app.task()
+def release_run_lease(frequency_str: str, send_minute: int | None, lease_token: str) -> None:
+    """
+    Releases the lease of a sharded run whose shards failed, so `summarize_run` was not called.
+
+    Args:
+        frequency_str: A string indicating the frequency of the weather reports ("day" or "hour").
+        send_minute: An optional integer representing the UTC send minute of the run.
+        lease_token: A string representing the token of the run lease.
+    """
+    from .make_celery import flask_app
+
+    config = get_run_config(flask_app, frequency_str, send_minute=send_minute)
+    create_run_lease(config, frequency_str, lease_token).release()
+    logger.warning(f"Released the lease of the failed {frequency_str} run")
+
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def run_catch_up(self, frequency_str: str, attempt: int = 1) -> dict:
+    """
+    Sends the reports deferred by runs which exceeded their budget.
+
+    The deferred subscriptions of the frequency are claimed from the catch-up queue and processed
+    in a single grouped run with a budget of its own. The claim is named after the task ID, so concurrent
+    catch-up runs process separate reports. They are removed from the queue only after the run finishes,
+    so a run interrupted by a lost worker processes them again when the task is delivered again.
+    Reports it cannot send in time are deferred again and sent by another catch-up run, started at most
+    `catch_up_attempts` times. Reports still deferred after the last attempt are dropped from the queue
+    when it expires. Reports deferred from a digest are caught up separately.
+
+    Args:
+        frequency_str: A string indicating the frequency of the weather reports ("day", "hour" or "merged").
+        attempt: An integer representing the number of the catch-up run started for the same reports.
+
+    Returns:
+        A dictionary with the counts of sent, failed, skipped and deferred reports.
+    """
+    from .make_celery import flask_app
+
+    with flask_app.app_context():
+        config = get_run_config(
+            flask_app,
+            frequency_str,
+            catch_up=True,
+            catch_up_claim=self.request.id,
+            grouped=True,
+            digest=False,
+            checkpoints=False,
+            shard_count=1,
+            shard_index=0,
+        )
+        summary = setup_scheduled_events(get_frequency(frequency_str), config).run()
+        queue = RedisCatchUpQueue(get_redis(config.redis_url))
+        for frequency in list(Frequency) if config.merged else [get_frequency(frequency_str)]:
+            queue.acknowledge(frequency, config.catch_up_claim)
+        logger.info(f"Finished {frequency_str} catch-up run {attempt}: {summary}")
+
+        if summary.deferred > 0:
+            if attempt < config.catch_up_attempts:
+                run_catch_up.delay(frequency_str, attempt + 1)
+            else:
+                logger.warning(
+                    f"Giving up on {summary.deferred} {frequency_str} reports deferred after {attempt} catch-up runs, "
+                    f"they expire from the catch-up queue within {queue.ttl} s"
+                )
+        return asdict(summary)
+
+
+@celery_app.task()
+def prewarm_weather_cache(frequency_str: str, send_minute: int | None = None):
+    """
+    Fills the weather cache for all locations subscribed with the given frequency.
+
+    This task runs shortly before `run_periodic_send`, so the scheduled run reads weather from the cache
+    instead of waiting for the geocoding and forecast APIs.
+
+    Args:
+        frequency_str: A string indicating the frequency of the weather reports ("day" or "hour").
+        send_minute: An optional integer limiting the locations to events sent at this UTC minute.
+    """
+    from .make_celery import flask_app
+
+    with flask_app.app_context():
+        warmer = setup_cache_warmer(get_scheduler_config(flask_app))
+        warmer.run(get_frequency(frequency_str), send_minute)
+
+
+@celery_app.task()
+def run_send_window():
+    """
+    Starts the runs for the events whose send minute has come.
+
+    This task is executed every minute when send windows are enabled. For every frequency, it starts
+    `run_periodic_send` for the UTC minute of the report period, and fills the weather cache for the events
+    sent `prewarm_lead_minutes` later. The minutes are claimed from a cursor in Redis, so a task executed
+    late handles every minute since the last handled one, up to `send_window_backfill` minutes. Minutes
+    without any events are skipped, so no run is started for them.
     """
     from .make_celery import flask_app
 
+    config = get_scheduler_config(flask_app)
+    cursor = RedisSendWindowCursor(get_redis(config.redis_url), config.send_window_backfill)
+    minutes = cursor.claim(datetime.now(UTC))
+    if not minutes:
+        return
+
     with flask_app.app_context():
-        if frequency_str.lower() == "day":
-            frequency = Frequency.DAY
-        else:
-            frequency = Frequency.HOUR
-        service = setup_scheduled_events(frequency)
-        service.run()
+        event_service = EventService(EventRepository(psql.session))
+        for frequency in Frequency:
+            scheduled = event_service.get_send_minutes(frequency)
+            for moment in minutes:
+                minute = minute_of_period(frequency, moment)
+                if scheduled is None or minute in scheduled:
+                    run_periodic_send.delay(frequency.name, minute)
+                if config.prewarm_lead_minutes > 0:
+                    upcoming = minute_of_period(frequency, moment + timedelta(minutes=config.prewarm_lead_minutes))
+                    if scheduled is None or upcoming in scheduled:
+                        prewarm_weather_cache.delay(frequency.name, upcoming)
+
+
+@celery_app.task()
+def refresh_send_windows():
+    """
+    Recalculates the send minutes of all events, so reports follow daylight saving time changes.
+    """
+    from .make_celery import flask_app
+
+    with flask_app.app_context():
+        EventService(EventRepository(psql.session)).refresh_send_minutes()
+
+
+def schedule_catch_up(config: SchedulerConfig, frequency_str: str, summary: RunSummary) -> None:
+    """Starts a `run_catch_up` task if the run deferred any reports. Catch-up runs do not start another one."""
+    if summary.deferred > 0 and not config.catch_up:
+        logger.info(f"Catching up {summary.deferred} reports deferred by the {frequency_str} run")
+        run_catch_up.delay(frequency_str)
+
+
+def get_frequency(frequency_str: str) -> Frequency:
+    if frequency_str.lower() == "day":
+        return Frequency.DAY
+    return Frequency.HOUR
+
+
+def get_scheduler_config(flask_app) -> SchedulerConfig:
+    return SchedulerConfig(**flask_app.config.get("SCHEDULER", {}))
+
+
+def get_run_config(flask_app, frequency_str: str, **changes) -> SchedulerConfig:
+    """Returns the scheduler configuration of a single run, merged if `frequency_str` is "merged"."""
+    return replace(get_scheduler_config(flask_app), merged=frequency_str.lower() == "merged", **changes)
+
+
+def create_run_lease(config: SchedulerConfig, frequency_str: str, token: str | None = None) -> RunLease | None:
+    """
+    Creates the lease of a run, keyed by its frequency, date and send minute.
+
+    Returns:
+        A `RunLease` object, or None if leases are disabled.
+    """
+    if not config.lease:
+        return None
+    name = f"{frequency_str.lower()}:{date.today().isoformat()}"
+    if config.send_minute is not None:
+        name += f":{config.send_minute}"
+    return RunLease(get_redis(config.redis_url), name, config.lease_ttl, token)
 
 
 @shared_task(ignore_result=False)
@@ -68,40 +354,131 @@ def create_periodic_tasks():
     Yields:
         A dictionary containing the crontab schedule, task function, and task name for each periodic task.
     """
+    from .make_celery import flask_app
+
     test_env = os.environ.get("CELERY_TEST", False)
     if test_env:
         tasks = create_test_tasks()
     else:
-        tasks = create_tasks()
+        tasks = create_tasks(get_scheduler_config(flask_app))
 
     for task in tasks:
         yield task
 
 
-def create_tasks():
+def create_tasks(config: SchedulerConfig | None = None):
     """
     Creates production periodic tasks for the NotifyMe API.
 
     This function creates periodic tasks for the API that are used in production.
-    The tasks include sending weather reports to users on a daily and hourly basis.
+    The tasks include sending weather reports to users on a daily and hourly basis,
+    and filling the weather cache `prewarm_lead_minutes` before each of them.
+
+    Args:
+        config: A `SchedulerConfig` object with the settings of the scheduler. Defaults are used if not given.
+
+    Returns:
+        A list of dictionaries containing the crontab schedule, task function, and task name for each periodic task.
+    """
+    config = config or SchedulerConfig()
+    if config.send_windows:
+        return create_send_window_tasks()
+
+    if config.merge_monday:
+        tasks = create_merged_monday_tasks()
+        day_minute = 0
+    else:
+        tasks = [
+            {
+                "crontab": crontab(hour=6, minute=10, day_of_week=1),
+                "task": run_periodic_send.s("DAY"),
+                "name": "Send mail for 7 day weather report every Monday at 6:10",
+            },
+            {
+                "crontab": crontab(hour=6, minute=0),
+                "task": run_periodic_send.s("HOUR"),
+                "name": "Send mail for 24 hour weather report every day at 6:00",
+            },
+        ]
+        day_minute = 10
+
+    if (lead := config.prewarm_lead_minutes) > 0:
+        tasks += [
+            {
+                "crontab": crontab_before(6, day_minute, lead, day_of_week=1),
+                "task": prewarm_weather_cache.s("DAY"),
+                "name": f"Warm weather cache {lead} minutes before the 7 day weather report",
+            },
+            {
+                "crontab": crontab_before(6, 0, lead),
+                "task": prewarm_weather_cache.s("HOUR"),
+                "name": f"Warm weather cache {lead} minutes before the 24 hour weather report",
+            },
+        ]
+    return tasks
+
+
+def create_merged_monday_tasks():
+    """
+    Creates periodic tasks sending hourly and daily reports on Monday in a single merged run.
 
     Returns:
         A list of dictionaries containing the crontab schedule, task function, and task name for each periodic task.
     """
     return [
         {
-            "crontab": crontab(hour=6, minute=10, day_of_week=1),
-            "task": run_periodic_send.s("DAY"),
-            "name": "Send mail for 7 day weather report every Monday at 6:10",
+            "crontab": crontab(hour=6, minute=0, day_of_week=1),
+            "task": run_periodic_send.s("MERGED"),
+            "name": "Send mail for 7 day and 24 hour weather reports every Monday at 6:00",
         },
         {
-            "crontab": crontab(hour=6),
+            "crontab": crontab(hour=6, minute=0, day_of_week="0,2-6"),
             "task": run_periodic_send.s("HOUR"),
-            "name": "Send mail for 24 hour weather report every day at 6:00",
+            "name": "Send mail for 24 hour weather report every day except Monday at 6:00",
+        },
+    ]
+
+
+def create_send_window_tasks():
+    """
+    Creates periodic tasks sending reports at local time of the event locations.
+
+    Returns:
+        A list of dictionaries containing the crontab schedule, task function, and task name for each periodic task.
+    """
+    return [
+        {
+            "crontab": crontab(),
+            "task": run_send_window.s(),
+            "name": "Send mail for events due in the current minute",
+        },
+        {
+            "crontab": crontab(minute=30),
+            "task": refresh_send_windows.s(),
+            "name": "Recalculate send minutes every hour",
         },
     ]
 
 
+def crontab_before(hour: int, minute: int, lead_minutes: int, day_of_week: int | None = None) -> crontab:
+    """
+    Creates a crontab firing `lead_minutes` before the given time.
+
+    Args:
+        hour: An integer representing the hour of the original schedule.
+        minute: An integer representing the minute of the original schedule.
+        lead_minutes: An integer representing the number of minutes to move the schedule back.
+        day_of_week: An optional integer representing the day of the week of the original schedule (0 is Sunday).
+
+    Returns:
+        A `crontab` object. If the schedule moves to the previous day, the day of the week moves with it.
+    """
+    days, minutes = divmod(hour * 60 + minute - lead_minutes, 24 * 60)
+    if day_of_week is None:
+        return crontab(hour=minutes // 60, minute=minutes % 60)
+    return crontab(hour=minutes // 60, minute=minutes % 60, day_of_week=(day_of_week + days) % 7)
+
+
 def create_test_tasks():
     """
     Creates test periodic tasks for the NotifyMe API.
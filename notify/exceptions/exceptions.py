@@ -4,3 +4,17 @@ class InvalidUserDataException(Exception):
     def __init__(self, data: dict) -> None:
         self.message = f"Invalid user data: {data.get('username'), data.get('email')}"
         super().__init__(self.message)
+
+
+class RunDataException(Exception):
+    """The data of a scheduled run could not be loaded."""
+    def __init__(self, data: str) -> None:
+        self.message = f"Could not load {data} of the run"
+        super().__init__(self.message)
+
+
+class DeadlineExceededException(Exception):
+    """The time budget of a scheduled run is used up."""
+    def __init__(self, operation: str) -> None:
+        self.message = f"Deadline exceeded before {operation}"
+        super().__init__(self.message)
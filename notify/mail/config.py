@@ -11,6 +11,7 @@ class Config:
     SMTP_PORT: int = 587
     SMTP_SERVER: str = 'smtp.gmail.com'
     MAIL_USE_TLS: bool = True
+    SMTP_TIMEOUT: float = 30
     SMTP_USERNAME: str = os.environ.get('SMTP_USERNAME', '')
     SMTP_PASSWORD: str = os.environ.get('SMTP_PASSWORD', '')
     MAIL_FROM: str = os.environ.get('SMTP_USERNAME', '')
@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+from notify.app.deadline import Deadline, call_timeout
 from notify.app.logger import LoggerType, create_logger
 
 from .config import Config
@@ -16,20 +17,22 @@ class Sender(ABC):
 
 
 class MailSender(Sender):
-    def __init__(self, config=Config()):
+    def __init__(self, config=Config(), deadline: Deadline | None = None):
         self.config = config
+        self.deadline = deadline
         if self.config.SMTP_USERNAME is None or self.config.SMTP_PASSWORD is None:
             raise ValueError('SMTP_USERNAME and SMTP_PASSWORD must be set')
 
-    def _send_with_smtp(self, message: MIMEMultipart, reciever: str) -> None:
+    def _send_with_smtp(self, message: MIMEMultipart, reciever: str, timeout: float) -> None:
         """
         Sends an email message using SMTP.
 
         Args:
             message: A `MIMEMultipart` object representing the email message to be sent.
             receiver: A string representing the email address of the recipient.
+            timeout: A float representing the timeout of the SMTP connection in seconds.
         """
-        with smtplib.SMTP(self.config.SMTP_SERVER, self.config.SMTP_PORT) as server:
+        with smtplib.SMTP(self.config.SMTP_SERVER, self.config.SMTP_PORT, timeout=timeout) as server:
             server.starttls()
             logger.info(f'Logging in with {self.config.SMTP_USERNAME}')
             server.login(self.config.SMTP_USERNAME, self.config.SMTP_PASSWORD)
@@ -65,10 +68,14 @@ class MailSender(Sender):
 
         Returns:
             A boolean indicating whether the email was successfully sent.
+
+        Raises:
+            DeadlineExceededException: If the deadline of the run is already exceeded.
         """
+        timeout = call_timeout(self.deadline, self.config.SMTP_TIMEOUT, "sending email")
         try:
             message = self._create_mime_message(subject, msg, receiver)
-            self._send_with_smtp(message, receiver)
+            self._send_with_smtp(message, receiver, timeout)
             logger.info(f'Sent email to {receiver}')
             return True
         except Exception as e:
@@ -18,6 +18,18 @@ class Event(db.Model):
         city: A string representing the city.
         country: A string representing the country.
         user_id: An integer representing the ID of the user who subscribed to the event.
+        timezone: A string representing the IANA timezone of the location, used to send reports at local time.
+        send_minute: An integer representing the UTC minute of the report period at which the report is sent.
+            See `notify.models.send_window` for details.
+        only_changes: A boolean indicating whether a report is sent only if the forecast changed noticeably
+            since the last report sent for the event.
+        alert_measure: A string representing the measure checked by an `EventType.ALERT` event,
+            e.g. "precipitation_probability". See `notify.weather.alerts` for details.
+        alert_operator: A string, ">" if the alert is sent when the measure exceeds the threshold, or "<"
+            if it falls below it.
+        alert_threshold: A float representing the threshold of the alert.
+        location_hash: An integer representing the hash of the city and country, see `notify.models.shard`.
+            It is set when the event is created, so sharded runs select the events of their shard in SQL.
     """
 
     event_id = db.Column(db.Integer, primary_key=True)
@@ -26,8 +38,43 @@ class Event(db.Model):
     city = db.Column(db.String(70), nullable=False)
     country = db.Column(db.String(70), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"))
+    timezone = db.Column(db.String(64), nullable=True)
+    send_minute = db.Column(db.Integer, nullable=True)
+    only_changes = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    alert_measure = db.Column(db.String(32), nullable=True)
+    alert_operator = db.Column(db.String(1), nullable=True)
+    alert_threshold = db.Column(db.Float, nullable=True)
+    location_hash = db.Column(db.BigInteger, nullable=True)
 
-    __table_args__ = (db.UniqueConstraint("user_id", "frequency", "city", "country", name="unique_event"),)
+    # A user has one report of every type per location and frequency, and any number of alerts there,
+    # as long as their rules differ. Reports have no rule, so they are kept unique by a separate index.
+    __table_args__ = (
+        db.Index(
+            "unique_report",
+            user_id,
+            frequency,
+            city,
+            country,
+            event_type,
+            unique=True,
+            postgresql_where=alert_measure.is_(None),
+            sqlite_where=alert_measure.is_(None),
+        ),
+        db.Index(
+            "unique_alert",
+            user_id,
+            frequency,
+            city,
+            country,
+            alert_measure,
+            alert_operator,
+            alert_threshold,
+            unique=True,
+            postgresql_where=alert_measure.isnot(None),
+            sqlite_where=alert_measure.isnot(None),
+        ),
+        db.Index("ix_event_send_window", "frequency", "send_minute"),
+    )
 
     def __str__(self: Self) -> str:
         return (
@@ -47,4 +94,7 @@ class Event(db.Model):
             and self.user_id == other.user_id
             and self.city == other.city
             and self.country == other.country
+            and self.alert_measure == other.alert_measure
+            and self.alert_operator == other.alert_operator
+            and self.alert_threshold == other.alert_threshold
         )
@@ -13,6 +13,7 @@ class EventType(Enum):
     ALL = "all"
     TEMPERATURE = "temperature"
     PRECIPITATION = "precipitation"
+    ALERT = "alert"
 
 
 class Frequency(Enum):
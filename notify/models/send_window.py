@@ -0,0 +1,75 @@
+"""
+Helpers for timezone-aware send windows.
+
+Reports are sent at a fixed local time in the timezone of the event location. The time is stored
+with the event as the UTC minute of the report period: the minute of the day for hourly reports
+and the minute of the week (starting on Monday) for daily reports. A run then only processes
+the events whose send minute matches the current UTC minute.
+"""
+from datetime import UTC, datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from notify.models.query_params import Frequency
+
+DEFAULT_TIMEZONE = "Europe/Warsaw"
+
+# Local (weekday, time) of the report, weekday is None for reports sent every day.
+SEND_TIMES: dict[Frequency, tuple[int | None, time]] = {
+    Frequency.HOUR: (None, time(6, 0)),
+    Frequency.DAY: (0, time(6, 10)),
+}
+
+PERIOD_MINUTES = {Frequency.HOUR: 24 * 60, Frequency.DAY: 7 * 24 * 60}
+
+
+def is_valid_timezone(timezone: str | None) -> bool:
+    if not timezone:
+        return False
+    try:
+        ZoneInfo(timezone)
+        return True
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+
+
+def minute_of_period(frequency: Frequency, moment: datetime) -> int:
+    """
+    Returns the minute of the report period of the given moment, in UTC.
+
+    Args:
+        frequency: A `Frequency` object selecting the period, a day for `HOUR` and a week for `DAY`.
+        moment: A timezone-aware `datetime` object.
+    """
+    moment = moment.astimezone(UTC)
+    minute = moment.hour * 60 + moment.minute
+    if frequency == Frequency.DAY:
+        minute += moment.weekday() * 24 * 60
+    return minute
+
+
+def send_minute(frequency: Frequency, timezone: str | None, now: datetime | None = None) -> int:
+    """
+    Returns the UTC send minute of the next report for a location in the given timezone.
+
+    The UTC offset is taken at the next local send time, so the result changes when daylight saving
+    time starts or ends, and has to be refreshed periodically.
+
+    Args:
+        frequency: A `Frequency` object representing the frequency of the report.
+        timezone: A string representing the IANA timezone of the location. `DEFAULT_TIMEZONE` is used
+            if it is missing or unknown.
+        now: An optional timezone-aware `datetime` object. Defaults to the current time.
+
+    Returns:
+        An integer representing the minute of the report period, as returned by `minute_of_period`.
+    """
+    zone = ZoneInfo(timezone if is_valid_timezone(timezone) else DEFAULT_TIMEZONE)
+    local_now = (now or datetime.now(UTC)).astimezone(zone)
+    weekday, at = SEND_TIMES[frequency]
+
+    due = local_now.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+    if weekday is not None:
+        due += timedelta(days=(weekday - due.weekday()) % 7)
+    if due < local_now:
+        due += timedelta(days=1 if weekday is None else 7)
+    return minute_of_period(frequency, due)
@@ -0,0 +1,20 @@
+"""
+Sharding of scheduled runs.
+
+A run can be split between several workers, each sending the reports of the locations in its shard.
+A shard is given as a tuple of its index and the number of shards.
+The hash of a location is stored with its events, so the database returns only the rows of a shard.
+"""
+import zlib
+
+Shard = tuple[int, int]
+
+
+def location_hash(city: str, country: str) -> int:
+    """Return the hash of a location. The hash is stable across processes, unlike the built-in `hash`."""
+    return zlib.crc32(f"{city}|{country}".encode("utf-8"))
+
+
+def shard_of(city: str, country: str, shard_count: int) -> int:
+    """Return the shard of a location."""
+    return location_hash(city, country) % shard_count
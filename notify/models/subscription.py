@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+
+from notify.models.event import Event
+
+
+@dataclass
+class Subscription:
+    """
+    Represents a single recipient of a scheduled weather report.
+
+    This class pairs an event with the user data needed to deliver it, so the scheduler
+    does not have to keep whole `User` rows around while a run is in progress.
+
+    Attributes:
+        user_id: An integer representing the ID of the user who subscribed to the event.
+        email: A string representing the email address the report is sent to.
+        event: An `Event` object representing the subscribed event.
+    """
+
+    user_id: int
+    email: str
+    event: Event
@@ -1,3 +1,6 @@
+from typing import Iterator, Sequence
+
+from sqlalchemy import or_, tuple_
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.scoping import scoped_session
 
@@ -5,6 +8,9 @@ from notify.app.database import session_scope
 from notify.app.logger import LoggerType, create_logger
 from notify.models.event import Event
 from notify.models.query_params import Frequency
+from notify.models.shard import Shard, location_hash, shard_of
+from notify.models.subscription import Subscription
+from notify.models.user import User
 
 from .repository import Repository
 
@@ -56,3 +62,213 @@ class EventRepository(Repository):
         with session_scope(self.session) as session:
             events = session.query(Event).where(Event.user_id == user_id, Event.frequency == frequency).all()
         return events
+
+    def get_locations(
+        self, frequency: Frequency | None = None, send_minute: int | None = None
+    ) -> list[tuple[str, str, Frequency]]:
+        """
+        Retrieve the distinct locations of all events.
+
+        Args:
+            frequency: An optional `Frequency` object. If given, only locations of events with this frequency
+                are returned.
+            send_minute: An optional integer. If given, only locations of events sent at this UTC minute
+                of the report period are returned.
+
+        Returns:
+            A list of (city, country, frequency) tuples.
+        """
+        query = self.session.query(Event.city, Event.country, Event.frequency).distinct()
+        if frequency is not None:
+            query = query.where(Event.frequency == frequency)
+        if send_minute is not None:
+            query = query.where(Event.send_minute == send_minute)
+        with session_scope(self.session):
+            locations = query.order_by(Event.city, Event.country).all()
+        return [(city, country, frequency) for city, country, frequency in locations]
+
+    def get_send_minutes(self, frequency: Frequency) -> set[int]:
+        """
+        Retrieve the distinct send minutes of all events with the given frequency.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the events.
+
+        Returns:
+            A set of integers representing the UTC minutes of the report period at which events are sent.
+        """
+        with session_scope(self.session) as session:
+            minutes = (
+                session.query(Event.send_minute)
+                .where(Event.frequency == frequency, Event.send_minute.is_not(None))
+                .distinct()
+                .all()
+            )
+        return {minute for (minute,) in minutes}
+
+    def get_timezones(self, frequency: Frequency) -> list[str | None]:
+        with session_scope(self.session) as session:
+            timezones = session.query(Event.timezone).where(Event.frequency == frequency).distinct().all()
+        return [timezone for (timezone,) in timezones]
+
+    def set_send_minute(self, frequency: Frequency, timezone: str | None, send_minute: int) -> int:
+        """
+        Update the send minute of all events with the given frequency and timezone.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the events to update.
+            timezone: A string representing the timezone of the events to update, or None for events
+                without a timezone.
+            send_minute: An integer representing the new UTC send minute.
+
+        Returns:
+            An integer representing the number of updated events.
+        """
+        timezone_filter = Event.timezone.is_(None) if timezone is None else Event.timezone == timezone
+        with session_scope(self.session) as session:
+            updated = (
+                session.query(Event)
+                .where(
+                    Event.frequency == frequency,
+                    timezone_filter,
+                    or_(Event.send_minute.is_(None), Event.send_minute != send_minute),
+                )
+                .update({Event.send_minute: send_minute}, synchronize_session=False)
+            )
+        return updated
+
+    def set_location_hashes(self) -> int:
+        """
+        Set the location hash of events created before it was stored.
+
+        Returns:
+            An integer representing the number of updated events.
+        """
+        updated = 0
+        with session_scope(self.session) as session:
+            locations = session.query(Event.city, Event.country).where(Event.location_hash.is_(None)).distinct().all()
+            for city, country in locations:
+                updated += (
+                    session.query(Event)
+                    .where(Event.city == city, Event.country == country, Event.location_hash.is_(None))
+                    .update({Event.location_hash: location_hash(city, country)}, synchronize_session=False)
+                )
+        return updated
+
+    def stream_subscriptions(
+        self,
+        frequency: Frequency | Sequence[Frequency],
+        batch_size: int = 1000,
+        after: tuple[str, str] | None = None,
+        send_minute: int | None = None,
+        shard: Shard | None = None,
+    ) -> Iterator[Subscription]:
+        """
+        Stream all subscriptions with the given frequency or frequencies using a single joined query.
+
+        Rows are fetched in batches of `batch_size` through a server-side cursor, so memory usage does not
+        depend on the number of users. Users without matching events are not returned. Subscriptions are
+        ordered by location and frequency, so that all subscribers of a location are returned one after another.
+
+        Args:
+            frequency: A `Frequency` object, or a sequence of them, representing the frequencies of the events
+                to stream.
+            batch_size: An integer representing the number of rows fetched per round trip.
+            after: An optional (city, country) tuple. Only locations ordered after it are returned,
+                which is used to resume an interrupted run.
+            send_minute: An optional integer. If given, only events sent at this UTC minute of the report period
+                are returned.
+            shard: An optional (index, count) tuple. If given, only locations of this shard are returned.
+                Rows are selected by their location hash in SQL. Rows created before the hash was stored
+                are checked while they are read.
+
+        Yields:
+            `Subscription` objects holding the user ID, email and a detached `Event` object.
+        """
+        query = self._subscriptions_query(frequency, send_minute).order_by(
+            Event.city, Event.country, Event.frequency, User.user_id, Event.event_id
+        )
+        if after is not None:
+            query = query.where(tuple_(Event.city, Event.country) > tuple_(*after))
+        if shard is not None:
+            index, count = shard
+            query = query.where(or_(Event.location_hash.is_(None), Event.location_hash % count == index))
+        yield from self._stream(query, batch_size, shard)
+
+    def stream_user_subscriptions(
+        self,
+        frequency: Frequency,
+        batch_size: int = 1000,
+        after_user: int | None = None,
+        send_minute: int | None = None,
+    ) -> Iterator[Subscription]:
+        """
+        Stream all subscriptions with the given frequency, ordered by user, using a single joined query.
+
+        Like `stream_subscriptions`, but all subscriptions of a user are returned one after another,
+        so the events of every user are read without a query per user.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the events to stream.
+            batch_size: An integer representing the number of rows fetched per round trip.
+            after_user: An optional integer. Only users with a greater ID are returned, which is used to resume
+                an interrupted run.
+            send_minute: An optional integer. If given, only events sent at this UTC minute of the report period
+                are returned.
+
+        Yields:
+            `Subscription` objects holding the user ID, email and a detached `Event` object.
+        """
+        query = self._subscriptions_query(frequency, send_minute).order_by(User.user_id, Event.event_id)
+        if after_user is not None:
+            query = query.where(User.user_id > after_user)
+        yield from self._stream(query, batch_size)
+
+    def _subscriptions_query(self, frequency: Frequency | Sequence[Frequency], send_minute: int | None = None):
+        query = self.session.query(
+            User.user_id,
+            User.email,
+            Event.event_id,
+            Event.event_type,
+            Event.frequency,
+            Event.city,
+            Event.country,
+            Event.only_changes,
+            Event.location_hash,
+            Event.alert_measure,
+            Event.alert_operator,
+            Event.alert_threshold,
+        ).join(Event, Event.user_id == User.user_id)
+        if isinstance(frequency, Frequency):
+            query = query.where(Event.frequency == frequency)
+        else:
+            query = query.where(Event.frequency.in_(list(frequency)))
+        if send_minute is not None:
+            query = query.where(Event.send_minute == send_minute)
+        return query
+
+    @staticmethod
+    def _stream(query, batch_size: int, shard: Shard | None = None) -> Iterator[Subscription]:
+        location, in_shard = None, True
+        for user_id, email, event_id, event_type, event_frequency, city, country, only_changes, hashed, *alert in (
+            query.yield_per(batch_size)
+        ):
+            if shard is not None and hashed is None:
+                if (city, country) != location:
+                    location, in_shard = (city, country), shard_of(city, country, shard[1]) == shard[0]
+                if not in_shard:
+                    continue
+            event = Event(
+                event_id=event_id,
+                event_type=event_type,
+                frequency=event_frequency,
+                city=city,
+                country=country,
+                user_id=user_id,
+                only_changes=only_changes,
+                location_hash=hashed,
+                alert_measure=alert[0],
+                alert_operator=alert[1],
+                alert_threshold=alert[2],
+            )
+            yield Subscription(user_id=user_id, email=email, event=event)
@@ -1,8 +1,15 @@
+from datetime import datetime
+from typing import Iterator, Sequence
+
 from notify.app.logger import LoggerType, create_logger
 from notify.models.event import Event
 from notify.models.query_params import EventType, Frequency
+from notify.models.send_window import DEFAULT_TIMEZONE, is_valid_timezone, send_minute
+from notify.models.shard import Shard, location_hash
+from notify.models.subscription import Subscription
 from notify.models.user import User
 from notify.repositories.event_repository import EventRepository
+from notify.weather.alerts import ABOVE, BELOW, FREQUENCY_MEASURES
 from notify.weather.location_provider import OpenMeteoLocationProvider
 
 logger = create_logger(LoggerType.EVENT, "EVENT_SERVICE")
@@ -23,7 +30,12 @@ class EventService:
         location_provider: A location provider object for retrieving location data.
     """
 
-    event_type = {"all": EventType.ALL, "precipitation": EventType.PRECIPITATION, "temperature": EventType.TEMPERATURE}
+    event_type = {
+        "all": EventType.ALL,
+        "precipitation": EventType.PRECIPITATION,
+        "temperature": EventType.TEMPERATURE,
+        "alert": EventType.ALERT,
+    }
     frequency = {"hour": Frequency.HOUR, "day": Frequency.DAY}
 
     def __init__(self, event_repository: EventRepository, location_provider=OpenMeteoLocationProvider()) -> None:
@@ -52,13 +64,29 @@ class EventService:
             return False
 
         city, country, event_type, frequency = data["city"], data["country"], data["event_type"], data["frequency"]
-        if self.location_provider.get_location(city, country) is None:
+        location = self.location_provider.search(city, country)
+        if location is None:
             logger.warning(f"Failed to create event, location not found for {city}, {country}")
             return False
 
         event_type = self.event_type[event_type.lower()]
         frequency = self.frequency[frequency.lower()]
-        event = Event(user_id=user.user_id, event_type=event_type, frequency=frequency, city=city, country=country)
+        timezone = self._get_timezone(location)
+        event = Event(
+            user_id=user.user_id,
+            event_type=event_type,
+            frequency=frequency,
+            city=city,
+            country=country,
+            timezone=timezone,
+            send_minute=send_minute(frequency, timezone),
+            only_changes=data.get("only_changes", False),
+            location_hash=location_hash(city, country),
+        )
+        if event_type == EventType.ALERT:
+            event.alert_measure = data["alert_measure"]
+            event.alert_operator = data["alert_operator"]
+            event.alert_threshold = float(data["alert_threshold"])
 
         try:
             self.repository.create(event)
@@ -137,6 +165,125 @@ class EventService:
             logger.exception(e)
             return None
 
+    def get_locations(
+        self, frequency: Frequency | None = None, send_minute: int | None = None
+    ) -> list[tuple[str, str, Frequency]] | None:
+        """
+        Retrieve the distinct locations of all events.
+
+        Args:
+            frequency: An optional `Frequency` object limiting the locations to events with this frequency.
+            send_minute: An optional integer limiting the locations to events sent at this UTC minute.
+
+        Returns:
+            A list of (city, country, frequency) tuples, or None if an error occurred.
+        """
+        try:
+            return self.repository.get_locations(frequency, send_minute)
+        except Exception as e:
+            logger.exception(e)
+            return None
+
+    def get_send_minutes(self, frequency: Frequency) -> set[int] | None:
+        """
+        Retrieve the distinct send minutes of all events with the given frequency.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the events.
+
+        Returns:
+            A set of integers representing the UTC send minutes, or None if an error occurred.
+        """
+        try:
+            return self.repository.get_send_minutes(frequency)
+        except Exception as e:
+            logger.exception(e)
+            return None
+
+    def refresh_send_minutes(self, now: datetime | None = None) -> int:
+        """
+        Recalculate the send minutes of all events, following daylight saving time changes.
+
+        Args:
+            now: An optional timezone-aware `datetime` object. Defaults to the current time.
+
+        Returns:
+            An integer representing the number of updated events.
+        """
+        updated = 0
+        try:
+            for frequency in Frequency:
+                for timezone in self.repository.get_timezones(frequency):
+                    minute = send_minute(frequency, timezone, now)
+                    updated += self.repository.set_send_minute(frequency, timezone, minute)
+        except Exception as e:
+            logger.exception(e)
+        logger.info(f"Send minutes updated for {updated} events")
+        return updated
+
+    def get_subscriptions(
+        self,
+        frequency: Frequency | Sequence[Frequency],
+        batch_size: int = 1000,
+        after: tuple[str, str] | None = None,
+        send_minute: int | None = None,
+        shard: Shard | None = None,
+    ) -> Iterator[Subscription]:
+        """
+        Stream all subscriptions with the given frequency, ordered by location.
+
+        Args:
+            frequency: A `Frequency` object, or a sequence of them, representing the frequencies
+                of the subscriptions to be retrieved.
+            batch_size: An integer representing the number of rows fetched from the database at once.
+            after: An optional (city, country) tuple. Only locations ordered after it are returned.
+            send_minute: An optional integer. Only events sent at this UTC minute of the report period are returned.
+            shard: An optional (index, count) tuple. Only locations of this shard are returned.
+
+        Yields:
+            `Subscription` objects. If an error occurs, it is logged and raised, so a run reading the stream
+            does not finish as if all subscriptions were processed.
+        """
+        try:
+            yield from self.repository.stream_subscriptions(frequency, batch_size, after, send_minute, shard)
+        except Exception as e:
+            logger.exception(e)
+            raise
+
+    def get_user_subscriptions(
+        self,
+        frequency: Frequency,
+        batch_size: int = 1000,
+        after_user: int | None = None,
+        send_minute: int | None = None,
+    ) -> Iterator[Subscription]:
+        """
+        Stream all subscriptions with the given frequency, ordered by user.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the subscriptions to be retrieved.
+            batch_size: An integer representing the number of rows fetched from the database at once.
+            after_user: An optional integer. Only users with a greater ID are returned.
+            send_minute: An optional integer. Only events sent at this UTC minute of the report period are returned.
+
+        Yields:
+            `Subscription` objects. If an error occurs, it is logged and raised.
+        """
+        try:
+            yield from self.repository.stream_user_subscriptions(frequency, batch_size, after_user, send_minute)
+        except Exception as e:
+            logger.exception(e)
+            raise
+
+    @staticmethod
+    def _get_timezone(location: dict) -> str:
+        """
+        Read the timezone of a location found by the location provider, falling back to `DEFAULT_TIMEZONE`
+        if it is not available.
+        """
+        timezone = location.get("timezone")
+        return timezone if is_valid_timezone(timezone) else DEFAULT_TIMEZONE
+
     def _validate_event(self, data: dict) -> bool:
         """
         Validate event data for creating a new event.
@@ -156,5 +303,27 @@ class EventService:
             return False
         if (country := data.get("country")) is None or len(country) < 2 or len(country) > 70:
             return False
+        if not isinstance(data.get("only_changes", False), bool):
+            return False
+        if data["event_type"].lower() == "alert":
+            return self._validate_alert(data)
 
         return True
+
+    def _validate_alert(self, data: dict) -> bool:
+        """
+        Validate the rule of an alert event. The measure must be available in the forecast of the event frequency.
+
+        Args:
+            data: A dictionary representing the data to be validated.
+
+        Returns:
+            A boolean value indicating whether the rule is valid.
+        """
+        frequency = self.frequency[data["frequency"].lower()]
+        if data.get("alert_measure") not in FREQUENCY_MEASURES[frequency]:
+            return False
+        if data.get("alert_operator") not in (ABOVE, BELOW):
+            return False
+        threshold = data.get("alert_threshold")
+        return isinstance(threshold, (int, float)) and not isinstance(threshold, bool)
@@ -50,6 +50,34 @@ class WeatherService:
         except Exception as e:
             logger.exception(e)
 
+    def store_weathers(
+        self, city: str, country: str, weathers: dict[Frequency, list[DayMeasurements] | list[HourMeasurements]]
+    ) -> None:
+        """
+        Store weather data of several frequencies for a single location in MongoDB collection at once.
+
+        Args:
+            city: A string representing the city for which the weather data is being stored.
+            country: A string representing the country for which the weather data is being stored.
+            weathers: A dictionary mapping a `Frequency` object to a list of `DayMeasurements` or
+                `HourMeasurements` objects representing the weather data to be stored.
+        """
+        date = datetime.datetime.now().strftime("%Y-%m-%d")
+        data = [
+            {
+                "frequency": frequency.value,
+                "city": city,
+                "country": country,
+                "date": date,
+                "weather": [measurement.__dict__ for measurement in weather],
+            }
+            for frequency, weather in weathers.items()
+        ]
+        try:
+            self.collection.insert_many(data)
+        except Exception as e:
+            logger.exception(e)
+
     def get_weather(
         self, frequency: Frequency, city: str, country: str, date: str
     ) -> list[DayMeasurements] | list[HourMeasurements] | None:
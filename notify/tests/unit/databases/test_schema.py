@@ -0,0 +1,26 @@
+from unittest.mock import MagicMock, patch
+
+from notify.app.schema import EVENT_UPGRADES, upgrade_schema
+
+
+def test_upgrade_schema():
+    db = MagicMock()
+    db.engine.dialect.name = "postgresql"
+    connection = db.engine.begin.return_value.__enter__.return_value
+
+    with patch("notify.app.schema.EventRepository") as repository:
+        upgrade_schema(db)
+
+    statements = [str(call.args[0]) for call in connection.execute.call_args_list]
+    assert statements == ["ALTER TYPE eventtype ADD VALUE IF NOT EXISTS 'ALERT'", *EVENT_UPGRADES]
+    assert "only_changes BOOLEAN NOT NULL DEFAULT false" in EVENT_UPGRADES[2]
+    repository.return_value.set_location_hashes.assert_called_once_with()
+
+
+def test_upgrade_schema_skips_other_databases():
+    db = MagicMock()
+    db.engine.dialect.name = "sqlite"
+
+    upgrade_schema(db)
+
+    db.engine.begin.assert_not_called()
@@ -3,6 +3,7 @@ import pytest
 from notify.models.event import Event
 from notify.models.measurements import DayMeasurements, HourMeasurements
 from notify.models.query_params import EventType, Frequency
+from notify.weather.alerts import Alert, AlertRule
 from notify.weather.message_builder import TextMessageBuilder
 
 # Event, Weather
@@ -76,3 +77,39 @@ def test_get_combinations(event_type, event_frequency):
     print(event_type, event_frequency)
     event, weather = create_filled(event_type, event_frequency)
     assert builder.compose_message(event, weather)
+
+
+def test_compose_alert_message(filled_day):
+    _, weather = filled_day
+    event = Event(event_type=EventType.ALERT, frequency=Frequency.DAY, city="Warsaw", country="Poland",
+                  alert_measure="temperature", alert_operator="<", alert_threshold=-10)
+
+    title, message = TextMessageBuilder().compose_message(event, weather)
+
+    assert title == "Weather alert for Warsaw"
+    assert message == "Alert temperature < -10 for Warsaw, Poland: temperature of -23 at 2021-10-12."
+
+
+def test_compose_alert_message_not_triggered(filled_day):
+    _, weather = filled_day
+    event = Event(event_type=EventType.ALERT, frequency=Frequency.DAY, city="Warsaw", country="Poland",
+                  alert_measure="precipitation", alert_operator=">", alert_threshold=10)
+    assert TextMessageBuilder().compose_message(event, weather) == (None, None)
+
+
+def test_compose_alert_message_with_alert(filled_day):
+    _, weather = filled_day
+    event = Event(event_type=EventType.ALERT, frequency=Frequency.DAY, city="Warsaw", country="Poland",
+                  alert_measure="precipitation", alert_operator=">", alert_threshold=10)
+    alert = Alert(AlertRule.from_event(event), 12.5, "2021-10-11")
+
+    title, message = TextMessageBuilder().compose_message(event, weather, alert)
+
+    assert title == "Weather alert for Warsaw"
+    assert message == "Alert precipitation > 10 for Warsaw, Poland: precipitation of 12.5 at 2021-10-11."
+
+
+def test_compose_digest():
+    title, message = TextMessageBuilder().compose_digest([("Report A", "first"), ("Report B", "second")])
+    assert title == "Weather digest (2 reports)"
+    assert message == "Report A\n\nfirst\n" + "-" * 40 + "\n\nReport B\n\nsecond"
@@ -4,6 +4,7 @@ from sqlalchemy.exc import IntegrityError
 
 from notify.models.event import Event
 from notify.models.query_params import EventType, Frequency
+from notify.models.shard import location_hash, shard_of
 
 
 class TestEventRepository:
@@ -25,6 +26,22 @@ class TestEventRepository:
         with pytest.raises(IntegrityError):
             self.event_repo.create(event2)
 
+    def test_event_create_alerts_next_to_report(self):
+        def alert(measure: str, threshold: float) -> Event:
+            return Event(user_id=1, event_type=EventType.ALERT, frequency=Frequency.HOUR, city="Warsaw",
+                         country="Poland", alert_measure=measure, alert_operator=">", alert_threshold=threshold)
+
+        self.event_repo.create(
+            Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Warsaw", country="Poland")
+        )
+        self.event_repo.create(alert("temperature", 30))
+        self.event_repo.create(alert("temperature", 35))
+        self.event_repo.create(alert("humidity", 90))
+        assert self.event_repo.session.query(Event).count() == 4
+
+        with pytest.raises(IntegrityError):
+            self.event_repo.create(alert("temperature", 30))
+
     def test_event_delete(self):
         event = Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Warsaw", country="Poland")
         self.event_repo.create(event)
@@ -76,3 +93,130 @@ def test_event_get_by_frequency(event_repo):
 
     assert len(event_repo.get_events_by_frequency(1, Frequency.HOUR)) == 2
     assert len(event_repo.get_events_by_frequency(1, Frequency.DAY)) == 1
+
+
+def test_event_stream_subscriptions(user_repo_filled, event_repo):
+    event1 = Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Warsaw", country="Poland")
+    event2 = Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Warsaw", country="Poland")
+    event3 = Event(user_id=1, event_type=EventType.TEMPERATURE, frequency=Frequency.HOUR, city="Berlin", country="DE")
+    event4 = Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    for event in (event1, event2, event3, event4):
+        event_repo.create(event)
+
+    subscriptions = list(event_repo.stream_subscriptions(Frequency.HOUR, batch_size=1))
+
+    assert [(s.user_id, s.email, s.event.city) for s in subscriptions] == [
+        (1, "john_doe@example.com", "Berlin"),
+        (1, "john_doe@example.com", "Warsaw"),
+        (2, "jane_doe@example.com", "Warsaw"),
+    ]
+    assert subscriptions[0].event == event3
+
+
+def test_event_stream_subscriptions_no_events(user_repo_filled, event_repo):
+    assert list(event_repo.stream_subscriptions(Frequency.DAY)) == []
+
+
+def test_event_stream_subscriptions_after(user_repo_filled, event_repo):
+    for city in ("Berlin", "London", "Warsaw"):
+        event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city=city, country="EU"))
+
+    subscriptions = event_repo.stream_subscriptions(Frequency.DAY, after=("London", "EU"))
+    assert [s.event.city for s in subscriptions] == ["Warsaw"]
+
+
+def test_event_stream_subscriptions_shard(user_repo_filled, event_repo):
+    cities = ("Berlin", "London", "Oslo", "Paris", "Warsaw")
+    for city in cities:
+        # Events created before the location hash was stored have none, and are checked while they are read.
+        hashed = location_hash(city, "EU") if city != "Oslo" else None
+        event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city=city, country="EU",
+                                location_hash=hashed))
+
+    shards = [[s.event.city for s in event_repo.stream_subscriptions(Frequency.DAY, shard=(i, 2))] for i in range(2)]
+
+    assert sorted(shards[0] + shards[1]) == list(cities)
+    for index, shard in enumerate(shards):
+        assert all(shard_of(city, "EU", 2) == index for city in shard)
+
+
+def test_event_set_location_hashes(user_repo_filled, event_repo):
+    for city in ("Berlin", "Warsaw"):
+        event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city=city, country="EU"))
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Oslo", country="EU",
+                            location_hash=location_hash("Oslo", "EU")))
+
+    assert event_repo.set_location_hashes() == 2
+    assert {e.city: e.location_hash for e in event_repo.session.query(Event)} == {
+        city: location_hash(city, "EU") for city in ("Berlin", "Oslo", "Warsaw")
+    }
+    assert event_repo.set_location_hashes() == 0
+
+
+def test_event_stream_subscriptions_shard_uses_stored_hash(user_repo_filled, event_repo):
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="Berlin",
+                            country="EU", location_hash=3))
+
+    assert [s.event.city for s in event_repo.stream_subscriptions(Frequency.DAY, shard=(1, 2))] == ["Berlin"]
+    assert list(event_repo.stream_subscriptions(Frequency.DAY, shard=(0, 2))) == []
+
+
+def test_event_stream_user_subscriptions(user_repo_filled, event_repo):
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.DAY, city="Berlin", country="DE"))
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="Warsaw", country="PL"))
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="Berlin", country="DE"))
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Oslo", country="NO"))
+
+    subscriptions = list(event_repo.stream_user_subscriptions(Frequency.DAY))
+    assert [(s.user_id, s.event.city) for s in subscriptions] == [(1, "Warsaw"), (1, "Berlin"), (2, "Berlin")]
+    assert [s.user_id for s in event_repo.stream_user_subscriptions(Frequency.DAY, after_user=1)] == [2]
+
+
+def test_event_get_locations(user_repo_filled, event_repo):
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="Warsaw", country="PL"))
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.DAY, city="Warsaw", country="PL"))
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Berlin", country="DE"))
+
+    assert event_repo.get_locations(Frequency.DAY) == [("Warsaw", "PL", Frequency.DAY)]
+    assert event_repo.get_locations() == [("Berlin", "DE", Frequency.HOUR), ("Warsaw", "PL", Frequency.DAY)]
+
+
+def test_event_send_minutes(user_repo_filled, event_repo):
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Warsaw", country="PL",
+                            timezone="Europe/Warsaw", send_minute=300))
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Tokyo", country="JP",
+                            timezone="Asia/Tokyo", send_minute=1260))
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Berlin", country="DE"))
+
+    assert sorted(event_repo.get_timezones(Frequency.HOUR), key=str) == ["Asia/Tokyo", "Europe/Warsaw", None]
+    assert event_repo.get_send_minutes(Frequency.HOUR) == {300, 1260}
+    assert event_repo.get_send_minutes(Frequency.DAY) == set()
+    assert event_repo.set_send_minute(Frequency.HOUR, "Europe/Warsaw", 240) == 1
+    assert event_repo.set_send_minute(Frequency.HOUR, "Europe/Warsaw", 240) == 0
+    assert event_repo.set_send_minute(Frequency.HOUR, None, 300) == 1
+
+    subscriptions = list(event_repo.stream_subscriptions(Frequency.HOUR, send_minute=240))
+    assert [s.event.city for s in subscriptions] == ["Warsaw"]
+    assert event_repo.get_locations(Frequency.HOUR, send_minute=300) == [("Berlin", "DE", Frequency.HOUR)]
+
+
+def test_event_stream_subscriptions_many_frequencies(user_repo_filled, event_repo):
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="Warsaw", country="PL"))
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Warsaw", country="PL"))
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.HOUR, city="Berlin", country="DE"))
+
+    subscriptions = list(event_repo.stream_subscriptions([Frequency.HOUR, Frequency.DAY]))
+    assert [(s.event.city, s.event.frequency) for s in subscriptions] == [
+        ("Berlin", Frequency.HOUR),
+        ("Warsaw", Frequency.DAY),
+        ("Warsaw", Frequency.HOUR),
+    ]
+
+
+def test_event_stream_subscriptions_only_changes(user_repo_filled, event_repo):
+    event_repo.create(Event(user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="Warsaw", country="PL",
+                            only_changes=True))
+    event_repo.create(Event(user_id=2, event_type=EventType.ALL, frequency=Frequency.DAY, city="Warsaw", country="PL"))
+
+    subscriptions = event_repo.stream_subscriptions(Frequency.DAY)
+    assert [(s.user_id, s.event.only_changes) for s in subscriptions] == [(1, True), (2, False)]
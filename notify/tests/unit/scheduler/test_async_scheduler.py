@@ -0,0 +1,266 @@
+import asyncio
+import time
+from threading import Lock
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from notify.app.deadline import Deadline
+from notify.celery_app.async_scheduled_events import (AsyncMailScheduler,
+                                                      PooledSender,
+                                                      ThreadedWeatherProvider)
+from notify.celery_app.checkpoints import RUN_FINISHED
+from notify.celery_app.config import SchedulerConfig
+from notify.celery_app.scheduled_events import RunSummary
+from notify.exceptions.exceptions import DeadlineExceededException
+from notify.models.event import Event
+from notify.models.measurements import DayMeasurements
+from notify.models.query_params import EventType, Frequency
+from notify.models.subscription import Subscription
+from notify.weather.message_builder import TextMessageBuilder
+
+
+def test_async_mail_scheduler():
+    mock_sender = AsyncMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = AsyncMock()
+    mock_message_builder = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    nowhere = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Nowhere", country="None")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        Subscription(2, "bob@example.com", london),
+        Subscription(2, "bob@example.com", nowhere),
+    ]
+    mock_weather_provider.get_weather.side_effect = lambda frequency, city, country: (
+        ["weather"] if city == "London" else None
+    )
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    mock_sender.send.return_value = True
+
+    scheduler = AsyncMailScheduler(
+        mock_sender,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(concurrency=2),
+    )
+
+    with patch("notify.celery_app.async_scheduled_events.http_client.aclose") as aclose:
+        assert scheduler.run() == RunSummary(sent=2, failed=0, skipped=1)
+    assert mock_weather_provider.get_weather.await_count == 2
+    mock_sender.send.assert_any_await("Subject", "Message", "alice@example.com")
+    mock_sender.send.assert_any_await("Subject", "Message", "bob@example.com")
+    mock_sender.aclose.assert_awaited_once()
+    aclose.assert_awaited_once()
+
+
+def test_async_mail_scheduler_defers_reports_past_deadline():
+    mock_sender = AsyncMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = AsyncMock()
+    mock_message_builder = MagicMock()
+    mock_catch_up = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    paris = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Paris", country="FR")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        Subscription(2, "bob@example.com", paris),
+    ]
+    mock_weather_provider.get_weather.side_effect = lambda frequency, city, country: (
+        ["weather"] if city == "London" else None
+    )
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    mock_sender.send.side_effect = DeadlineExceededException("sending email")
+
+    scheduler = AsyncMailScheduler(
+        mock_sender,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(concurrency=2),
+        deadline=Deadline(60),
+        catch_up=mock_catch_up,
+    )
+
+    assert scheduler.run() == RunSummary(sent=0, failed=0, skipped=1, deferred=1)
+    (deferred,), _ = mock_catch_up.push.call_args
+    assert [(s.email, s.event.city) for s in deferred] == [("alice@example.com", "London")]
+
+    scheduler.deadline = Deadline(0)
+    assert scheduler.run() == RunSummary(deferred=2)
+
+
+def test_async_mail_scheduler_limits_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def send(subject, msg, receiver):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return True
+
+    mock_sender = AsyncMock()
+    mock_sender.send = send
+    mock_database_events = MagicMock()
+    mock_weather_provider = AsyncMock()
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder = MagicMock()
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    event = Event(event_type=EventType.ALL, frequency=Frequency.HOUR, city="London", country="UK")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(i, f"user{i}@example.com", event) for i in range(20)
+    ]
+
+    scheduler = AsyncMailScheduler(
+        mock_sender,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.HOUR,
+        SchedulerConfig(concurrency=5),
+    )
+
+    assert scheduler.run().sent == 20
+    assert peak == 5
+
+
+def test_pooled_sender_limits_sends_to_workers():
+    lock = Lock()
+    in_flight = 0
+    peak = 0
+
+    def send(subject, msg, receiver):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return True
+
+    sender = MagicMock()
+    sender.send = send
+    ledger = MagicMock()
+    ledger.was_delivered.return_value = False
+    mock_database_events = MagicMock()
+    mock_weather_provider = AsyncMock()
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder = MagicMock()
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    event = Event(event_type=EventType.ALL, frequency=Frequency.HOUR, city="London", country="UK")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(i, f"user{i}@example.com", event) for i in range(12)
+    ]
+
+    pooled_sender = PooledSender(sender, workers=3)
+    scheduler = AsyncMailScheduler(
+        pooled_sender,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.HOUR,
+        SchedulerConfig(concurrency=40),
+        ledger=ledger,
+    )
+
+    assert scheduler.run().sent == 12
+    assert peak == 3
+    assert ledger.mark_delivered.call_count == 12
+    assert pooled_sender._executor is None
+
+
+def test_async_mail_scheduler_evaluates_alerts_per_location():
+    mock_sender = AsyncMock()
+    mock_sender.send.return_value = True
+    mock_database_events = MagicMock()
+    mock_weather_provider = AsyncMock()
+    mock_weather_provider.get_weather.return_value = [DayMeasurements("2021-10-10", (1, 25), 2.1, 3)]
+
+    def alert(user_id: int, operator: str, threshold: float) -> Subscription:
+        event = Event(event_id=user_id, user_id=user_id, event_type=EventType.ALERT, frequency=Frequency.DAY,
+                      city="London", country="UK", alert_measure="temperature", alert_operator=operator,
+                      alert_threshold=threshold)
+        return Subscription(user_id, f"user{user_id}@example.com", event)
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        alert(2, "<", 0),
+        alert(3, ">", 20),
+    ]
+
+    scheduler = AsyncMailScheduler(
+        mock_sender, mock_database_events, mock_weather_provider, TextMessageBuilder(), Frequency.DAY
+    )
+
+    assert scheduler.run() == RunSummary(sent=2, skipped=1)
+    assert [call.args[2] for call in mock_sender.send.await_args_list] == ["alice@example.com", "user3@example.com"]
+    assert scheduler.metrics.counters["quiet_alerts"] == 1
+
+
+def test_async_mail_scheduler_checkpoints_locations():
+    mock_sender = AsyncMock()
+    mock_sender.send.return_value = True
+    mock_database_events = MagicMock()
+    mock_weather_provider = AsyncMock()
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder = MagicMock()
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    checkpoints = MagicMock()
+    checkpoints.get.return_value = ["Berlin", "DE"]
+
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(i, f"user{i}@example.com", Event(event_type=EventType.ALL, frequency=Frequency.DAY,
+                                                      city=city, country="EU"))
+        for i, city in enumerate(["London", "Oslo", "Paris"])
+    ]
+
+    scheduler = AsyncMailScheduler(
+        mock_sender,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(concurrency=1),
+        checkpoints=checkpoints,
+    )
+
+    assert scheduler.run().sent == 3
+    mock_database_events.get_subscriptions.assert_called_once_with(
+        Frequency.DAY, after=("Berlin", "DE"), send_minute=None, shard=None
+    )
+    saved = [call.args[1] for call in checkpoints.save.call_args_list]
+    assert saved == [["London", "EU"], ["Oslo", "EU"], RUN_FINISHED]
+
+    checkpoints.get.return_value = RUN_FINISHED
+    assert scheduler.run() == RunSummary()
+    assert mock_database_events.get_subscriptions.call_count == 1
+
+
+def test_threaded_adapters():
+    sender = MagicMock()
+    sender.send.return_value = True
+    weather_provider = MagicMock()
+    weather_provider.get_weather.return_value = ["weather"]
+
+    async def send():
+        pooled_sender = PooledSender(sender)
+        try:
+            return await pooled_sender.send("Subject", "Message", "alice@example.com")
+        finally:
+            await pooled_sender.aclose()
+
+    assert asyncio.run(send())
+    assert asyncio.run(ThreadedWeatherProvider(weather_provider).get_weather(Frequency.DAY, "London", "UK")) == [
+        "weather"
+    ]
+    weather_provider.get_weather.assert_called_once_with(Frequency.DAY, "London", "UK")
@@ -0,0 +1,39 @@
+import pytest
+
+from notify.celery_app.benchmark import Benchmark, SyntheticDatabase, main
+from notify.celery_app.config import SchedulerConfig
+from notify.models.query_params import Frequency
+
+
+def test_synthetic_database_orders_subscriptions_by_location():
+    database = SyntheticDatabase(10, 3, Frequency.DAY)
+    locations = [s.event.city for s in database.get_subscriptions(Frequency.DAY)]
+    assert locations == ["City0"] * 4 + ["City1"] * 3 + ["City2"] * 3
+    assert list(database.get_subscriptions(Frequency.HOUR)) == []
+    assert database.location_of("user7@example.com") == ("City1", "Benchland")
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        SchedulerConfig(),
+        SchedulerConfig(grouped=True),
+        SchedulerConfig(grouped=True, workers=4),
+        SchedulerConfig(engine="async"),
+        SchedulerConfig(pipeline=True),
+    ],
+)
+def test_benchmark_sends_all_events(config):
+    benchmark = Benchmark(50, 5, Frequency.HOUR, config)
+    result = benchmark.run()
+
+    assert result.sent == benchmark.sender.count == 50
+    assert len(benchmark.latencies) == 50
+    assert 0 <= result.p50 <= result.p95 <= result.p99
+    assert result.peak_memory > 0
+
+
+def test_benchmark_main(capsys):
+    result = main(["--events", "20", "--locations", "2", "--frequency", "day", "--grouped"])
+    assert result.sent == 20
+    assert "events/s" in capsys.readouterr().out
@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock
+
+from notify.celery_app.cache_warmer import CacheWarmer
+from notify.models.query_params import Frequency
+
+
+def test_cache_warmer_resolves_all_locations():
+    weather_provider = MagicMock()
+    weather_provider.get_weather.side_effect = [["weather"], ValueError("Location not found"), ["weather"]]
+    database_locations = MagicMock()
+    database_locations.get_locations.return_value = [
+        ("Berlin", "Germany", Frequency.HOUR),
+        ("Nowhere", "None", Frequency.HOUR),
+        ("Warsaw", "Poland", Frequency.HOUR),
+    ]
+
+    warmer = CacheWarmer(weather_provider, database_locations, rate=0)
+
+    assert warmer.run(Frequency.HOUR) == 2
+    database_locations.get_locations.assert_called_once_with(Frequency.HOUR, None)
+    weather_provider.get_weather.assert_any_call(Frequency.HOUR, "Warsaw", "Poland")
+
+
+def test_cache_warmer_limits_rate(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("notify.celery_app.cache_warmer.time.sleep", sleeps.append)
+    weather_provider = MagicMock()
+    weather_provider.get_weather.return_value = ["weather"]
+    database_locations = MagicMock()
+    database_locations.get_locations.return_value = [("Warsaw", "Poland", Frequency.DAY)] * 3
+
+    CacheWarmer(weather_provider, database_locations, rate=2).run(Frequency.DAY)
+
+    assert len(sleeps) == 3
+    assert all(0.4 < sleep <= 0.5 for sleep in sleeps)
+
+
+def test_cache_warmer_no_locations():
+    database_locations = MagicMock()
+    database_locations.get_locations.return_value = None
+    assert CacheWarmer(MagicMock(), database_locations, rate=1).run(Frequency.DAY) == 0
+
+
+def test_cache_warmer_batches_locations():
+    weather_provider = MagicMock()
+    weather_provider.get_weather_batch.side_effect = lambda frequency, places: {place: ["weather"] for place in places}
+    database_locations = MagicMock()
+    database_locations.get_locations.return_value = [
+        ("Berlin", "Germany", Frequency.HOUR),
+        ("Paris", "France", Frequency.DAY),
+        ("Warsaw", "Poland", Frequency.HOUR),
+        ("Madrid", "Spain", Frequency.HOUR),
+    ]
+
+    assert CacheWarmer(weather_provider, database_locations, rate=0, batch_size=2).run(Frequency.HOUR) == 4
+
+    assert [call.args for call in weather_provider.get_weather_batch.call_args_list] == [
+        (Frequency.HOUR, [("Berlin", "Germany"), ("Warsaw", "Poland")]),
+        (Frequency.HOUR, [("Madrid", "Spain")]),
+        (Frequency.DAY, [("Paris", "France")]),
+    ]
+    weather_provider.get_weather.assert_not_called()
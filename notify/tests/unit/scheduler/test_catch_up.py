@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+from notify.celery_app.catch_up import (CLAIM_SCRIPT, CatchUpEvents, RedisCatchUpQueue, deserialize_subscription,
+                                        serialize_subscription)
+from notify.models.event import Event
+from notify.models.query_params import EventType, Frequency
+from notify.models.subscription import Subscription
+
+
+def subscription(user_id: int, city: str, frequency: Frequency = Frequency.HOUR) -> Subscription:
+    event = Event(
+        event_id=user_id, user_id=user_id, event_type=EventType.ALL, frequency=frequency, city=city, country="PL"
+    )
+    return Subscription(user_id=user_id, email=f"user{user_id}@example.com", event=event)
+
+
+def test_serialize_subscription():
+    original = subscription(1, "Warsaw", Frequency.DAY)
+    restored = deserialize_subscription(serialize_subscription(original).encode())
+    assert restored.user_id == 1
+    assert restored.email == "user1@example.com"
+    assert restored.event == original.event
+    assert restored.event.event_id == 1
+
+
+def test_push():
+    client = MagicMock()
+    pipeline = client.pipeline.return_value
+    RedisCatchUpQueue(client, ttl=60).push([subscription(1, "Warsaw"), subscription(2, "Berlin", Frequency.DAY)])
+    assert [call.args[0] for call in pipeline.rpush.call_args_list] == ["notify:catchup:hour", "notify:catchup:day"]
+    pipeline.expire.assert_any_call("notify:catchup:hour", 60)
+    pipeline.execute.assert_called_once()
+
+
+def test_claim_and_acknowledge():
+    client = MagicMock()
+    client.eval.return_value = [serialize_subscription(subscription(1, "Warsaw")).encode()]
+    queue = RedisCatchUpQueue(client, ttl=60)
+
+    claimed = queue.claim(Frequency.HOUR, "task-1")
+    queue.acknowledge(Frequency.HOUR, "task-1")
+
+    assert [s.user_id for s in claimed] == [1]
+    client.eval.assert_called_once_with(
+        CLAIM_SCRIPT, 2, "notify:catchup:hour", "notify:catchup:hour:processing:task-1", 60
+    )
+    client.delete.assert_called_once_with("notify:catchup:hour:processing:task-1")
+
+
+def test_claims_use_separate_processing_lists():
+    client = MagicMock()
+    client.eval.return_value = []
+    queue = RedisCatchUpQueue(client)
+
+    queue.claim(Frequency.DAY, "task-1")
+    queue.claim(Frequency.DAY, "task-2")
+    queue.acknowledge(Frequency.DAY, "task-2")
+
+    assert [call.args[3] for call in client.eval.call_args_list] == [
+        "notify:catchup:day:processing:task-1",
+        "notify:catchup:day:processing:task-2",
+    ]
+    client.delete.assert_called_once_with("notify:catchup:day:processing:task-2")
+
+
+def test_catch_up_events_are_ordered_by_location():
+    queue = MagicMock()
+    queue.claim.side_effect = lambda frequency, claim_id: {
+        Frequency.HOUR: [subscription(1, "Warsaw"), subscription(2, "Berlin")],
+        Frequency.DAY: [subscription(3, "Krakow", Frequency.DAY)],
+    }[frequency]
+
+    subscriptions = list(CatchUpEvents(queue, "task-1").get_subscriptions([Frequency.HOUR, Frequency.DAY]))
+
+    assert [s.event.city for s in subscriptions] == ["Berlin", "Krakow", "Warsaw"]
+    queue.claim.assert_called_with(Frequency.DAY, "task-1")
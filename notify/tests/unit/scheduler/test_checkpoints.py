@@ -0,0 +1,23 @@
+from unittest.mock import MagicMock
+
+from notify.celery_app.checkpoints import RedisCheckpointStore
+
+
+def test_save_checkpoint():
+    client = MagicMock()
+    store = RedisCheckpointStore(client, ttl=60)
+    store.save("hour:2023-06-01:0-1", ["Warsaw", "Poland"])
+    client.set.assert_called_once_with("notify:checkpoint:hour:2023-06-01:0-1", '["Warsaw", "Poland"]', ex=60)
+
+
+def test_get_checkpoint():
+    client = MagicMock()
+    client.get.return_value = b"42"
+    assert RedisCheckpointStore(client).get("hour:2023-06-01:0-1") == 42
+    client.get.assert_called_once_with("notify:checkpoint:hour:2023-06-01:0-1")
+
+
+def test_get_checkpoint_not_found():
+    client = MagicMock()
+    client.get.return_value = None
+    assert RedisCheckpointStore(client).get("hour:2023-06-01:0-1") is None
@@ -0,0 +1,67 @@
+import pstats
+
+import pytest
+
+from notify.celery_app.cli import create_config, format_report, parse_args, profile
+from notify.celery_app.config import SchedulerConfig
+from notify.celery_app.run_report import RunMetrics
+from notify.celery_app.scheduled_events import RunSummary
+
+
+def test_create_config():
+    args = parse_args(["day", "--concurrency", "8", "--shard-index", "1", "--shard-count", "4"])
+    config = create_config(args, SchedulerConfig(checkpoints=True, ledger=True))
+
+    assert (config.workers, config.shard_index, config.shard_count) == (8, 1, 4)
+    assert not config.merged
+    assert not config.checkpoints
+    assert config.ledger
+
+
+def test_create_config_async_merged():
+    config = create_config(parse_args(["merged", "--engine", "async", "--concurrency", "50"]), SchedulerConfig())
+    assert config.merged
+    assert (config.engine, config.concurrency, config.workers) == ("async", 50, 1)
+
+
+def test_create_config_dry_run():
+    config = SchedulerConfig(ledger=True, only_changes=True, run_budget=60, reports=True)
+    config = create_config(parse_args(["hour", "--dry-run"]), config)
+    assert (config.ledger, config.only_changes, config.run_budget, config.reports) == (False, False, 0, False)
+
+
+@pytest.mark.parametrize("argv", [["hour", "--shard-index", "2", "--shard-count", "2"], ["week"]])
+def test_parse_args_invalid(argv):
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+
+
+def test_profile(tmp_path, capsys):
+    path = tmp_path / "run.prof"
+    assert profile(lambda: sum(range(1000)), str(path)) == 499500
+    assert pstats.Stats(str(path)).total_calls > 0
+    assert str(path) in capsys.readouterr().out
+
+
+def test_format_report():
+    metrics = RunMetrics()
+    metrics.record("send_mail", 0.5)
+    metrics.increment("cache_hits", 3)
+    summary = RunSummary(sent=2, skipped=1)
+
+    report = format_report(summary, metrics.report("hour:2024-01-01:0-1", "hour", summary))
+
+    assert report.splitlines()[0] == "sent: 2, failed: 0, skipped: 1, deferred: 0"
+    assert "send_mail: 1 calls, total 0.500 s" in report
+    assert report.splitlines()[-1] == "cache_hits: 3"
+
+
+def test_format_report_memory():
+    summary = RunSummary()
+    report = RunMetrics().report("hour:2024-01-01:0-1", "hour", summary)
+    report["memory"] = {"peak": 3 * 1024 * 1024, "top": [{"site": "scheduled_events.py:10", "size": 2048, "count": 4}]}
+
+    lines = format_report(summary, report).splitlines()
+
+    assert lines[-2:] == ["peak memory: 3.00 MiB", "scheduled_events.py:10: 2.0 KiB in 4 blocks"]
+    assert create_config(parse_args(["hour", "--memory"]), SchedulerConfig()).memory_profile
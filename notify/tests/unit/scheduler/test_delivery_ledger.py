@@ -0,0 +1,19 @@
+from unittest.mock import MagicMock
+
+from notify.celery_app.delivery_ledger import RedisDeliveryLedger
+
+
+def test_was_delivered():
+    client = MagicMock()
+    client.sismember.return_value = 1
+    assert RedisDeliveryLedger(client).was_delivered(1, 2, "2023-06-01")
+    client.sismember.assert_called_once_with("notify:delivered:2023-06-01", "1:2")
+
+
+def test_mark_delivered():
+    client = MagicMock()
+    pipeline = client.pipeline.return_value
+    RedisDeliveryLedger(client, ttl=60).mark_delivered(1, 2, "2023-06-01")
+    pipeline.sadd.assert_called_once_with("notify:delivered:2023-06-01", "1:2")
+    pipeline.expire.assert_called_once_with("notify:delivered:2023-06-01", 60)
+    pipeline.execute.assert_called_once()
@@ -0,0 +1,101 @@
+from unittest.mock import MagicMock
+
+from notify.celery_app.forecast_changes import (ChangeFilter, ChangeThresholds, RedisForecastFingerprints,
+                                                fingerprint, has_changed)
+from notify.models.event import Event
+from notify.models.measurements import DayMeasurements, HourMeasurements
+from notify.models.query_params import EventType, Frequency
+
+
+def event(event_type: EventType = EventType.ALL, only_changes: bool = True) -> Event:
+    return Event(
+        event_id=2,
+        user_id=1,
+        event_type=event_type,
+        frequency=Frequency.DAY,
+        city="Warsaw",
+        country="PL",
+        only_changes=only_changes,
+    )
+
+
+def days(maximum: float, probability: float = 10) -> list[DayMeasurements]:
+    return [
+        DayMeasurements("2023-06-01", (10, maximum), 0.5, probability),
+        DayMeasurements("2023-06-02", (8, 20), 1.0, None),
+    ]
+
+
+def test_fingerprint_of_days():
+    assert fingerprint(days(25)) == {
+        "temperature_min": 8,
+        "temperature_max": 25,
+        "precipitation": 1.5,
+        "precipitation_probability": 10,
+    }
+
+
+def test_fingerprint_of_hours():
+    hours = [
+        HourMeasurements("2023-06-01T00:00", 12.5, 80, 0, 5),
+        HourMeasurements("2023-06-01T01:00", 11, 85, 0.2, 30),
+    ]
+    assert fingerprint(hours) == {
+        "temperature_min": 11,
+        "temperature_max": 12.5,
+        "precipitation": 0.2,
+        "precipitation_probability": 30,
+    }
+
+
+def test_has_changed():
+    thresholds = ChangeThresholds()
+    previous = fingerprint(days(25))
+    assert not has_changed(event(), previous, fingerprint(days(26)), thresholds)
+    assert has_changed(event(), previous, fingerprint(days(27)), thresholds)
+    assert has_changed(event(), previous, fingerprint(days(25, probability=50)), thresholds)
+
+
+def test_has_changed_compares_fields_of_event_type():
+    thresholds = ChangeThresholds()
+    previous = fingerprint(days(25))
+    assert not has_changed(event(EventType.PRECIPITATION), previous, fingerprint(days(30)), thresholds)
+    assert not has_changed(event(EventType.TEMPERATURE), previous, fingerprint(days(25, probability=90)), thresholds)
+
+
+def test_change_filter():
+    fingerprints = MagicMock()
+    fingerprints.get.return_value = fingerprint(days(25))
+    changes = ChangeFilter(fingerprints)
+
+    assert changes.is_unchanged(event(), days(25))
+    assert not changes.is_unchanged(event(), days(30))
+    assert not changes.is_unchanged(event(only_changes=False), days(25))
+    fingerprints.get.assert_called_with(1, 2)
+
+    changes.record(event(), days(30))
+    fingerprints.save.assert_called_once_with(1, 2, fingerprint(days(30)))
+
+
+def test_change_filter_without_fingerprint():
+    fingerprints = MagicMock()
+    fingerprints.get.return_value = None
+    assert not ChangeFilter(fingerprints).is_unchanged(event(), days(25))
+
+
+def test_change_filter_store_error():
+    fingerprints = MagicMock()
+    fingerprints.get.side_effect = ConnectionError
+    assert not ChangeFilter(fingerprints).is_unchanged(event(), days(25))
+
+
+def test_redis_fingerprints():
+    client = MagicMock()
+    client.get.return_value = b'{"temperature_min": 1}'
+    store = RedisForecastFingerprints(client, ttl=60)
+
+    assert store.get(1, 2) == {"temperature_min": 1}
+    client.get.assert_called_once_with("notify:fingerprint:1:2")
+
+    store.save(1, 2, {"temperature_min": 3})
+    client.set.assert_called_once_with("notify:fingerprint:1:2", '{"temperature_min": 3}', ex=60)
@@ -0,0 +1,33 @@
+import tracemalloc
+
+from notify.celery_app.memory_profile import MemoryProfiler
+
+
+def test_memory_profiler():
+    profiler = MemoryProfiler(every=2, top=3)
+    profiler.start()
+    assert tracemalloc.is_tracing()
+
+    data = []
+    for _ in range(5):
+        data.append(bytearray(100_000))
+        profiler.tick("users")
+    report = profiler.stop()
+
+    assert not tracemalloc.is_tracing()
+    assert [sample["label"] for sample in report["samples"]] == ["start", "2 users", "4 users", "finished"]
+    assert report["peak"] >= 500_000
+    assert len(report["top"]) <= 3
+    assert report["top"][0]["site"].startswith(__file__)
+    assert report["top"][0]["size"] >= 500_000
+
+
+def test_memory_profiler_keeps_tracing_started_before():
+    tracemalloc.start()
+    try:
+        profiler = MemoryProfiler()
+        profiler.start()
+        profiler.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from notify.celery_app.pipeline import Pipeline
+
+
+def test_pipeline_passes_items_through_stages():
+    results = []
+    lock = threading.Lock()
+
+    def double(item, emit):
+        emit(item * 2)
+
+    def collect(item, emit):
+        with lock:
+            results.append(item)
+
+    Pipeline(queue_size=2).add_stage(double, 3).add_stage(collect, 2).run(range(10))
+
+    assert sorted(results) == [i * 2 for i in range(10)]
+
+
+def test_pipeline_stage_error_does_not_stop_pipeline():
+    results = []
+
+    def fail_on_odd(item, emit):
+        if item % 2:
+            raise ValueError(item)
+        emit(item)
+
+    Pipeline().add_stage(fail_on_odd).add_stage(lambda item, emit: results.append(item)).run(range(6))
+
+    assert results == [0, 2, 4]
+
+
+def test_pipeline_items_error_stops_stages():
+    results = []
+
+    def items():
+        yield from range(3)
+        raise ConnectionError("connection lost")
+
+    with pytest.raises(ConnectionError):
+        Pipeline().add_stage(lambda item, emit: results.append(item), workers=2).run(items())
+
+    assert sorted(results) == [0, 1, 2]
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("pipeline-")]
+
+
+def test_pipeline_bounded_queue_applies_back_pressure():
+    produced = 0
+
+    def items():
+        nonlocal produced
+        for i in range(20):
+            produced += 1
+            yield i
+
+    def slow(item, emit):
+        time.sleep(0.01)
+        assert produced <= item + 4
+
+    Pipeline(queue_size=2).add_stage(slow, 1).run(items())
+
+    assert produced == 20
@@ -0,0 +1,59 @@
+import time
+from unittest.mock import MagicMock
+
+from notify.celery_app.run_lease import RELEASE_SCRIPT, RENEW_SCRIPT, RunLease
+
+
+def test_acquire():
+    client = MagicMock()
+    client.set.return_value = True
+    lease = RunLease(client, "hour:2023-06-01", ttl=60, token="token")
+
+    assert lease.acquire()
+    client.set.assert_called_once_with("notify:lease:hour:2023-06-01", "token", nx=True, ex=60)
+
+
+def test_acquire_held_by_another_worker():
+    client = MagicMock()
+    client.set.return_value = None
+    client.get.return_value = b"task:attempt"
+    lease = RunLease(client, "hour:2023-06-01")
+
+    assert not lease.acquire()
+    assert lease.holder() == "task:attempt"
+
+
+def test_renew_and_release():
+    client = MagicMock()
+    client.eval.return_value = 1
+    lease = RunLease(client, "day:2023-06-01", ttl=30, token="token")
+
+    assert lease.renew()
+    assert lease.renew(600)
+    lease.release()
+    client.eval.assert_any_call(RENEW_SCRIPT, 1, "notify:lease:day:2023-06-01", "token", 30)
+    client.eval.assert_any_call(RENEW_SCRIPT, 1, "notify:lease:day:2023-06-01", "token", 600)
+    client.eval.assert_any_call(RELEASE_SCRIPT, 1, "notify:lease:day:2023-06-01", "token")
+
+
+def test_heartbeat_renews_lease():
+    client = MagicMock()
+    client.eval.return_value = 1
+    lease = RunLease(client, "hour:2023-06-01", ttl=0.03, token="token")  # type: ignore
+
+    with lease:
+        time.sleep(0.1)
+
+    assert client.eval.call_count >= 2
+    assert all(call.args[0] == RENEW_SCRIPT for call in client.eval.call_args_list)
+
+
+def test_heartbeat_stops_when_lease_is_lost():
+    client = MagicMock()
+    client.eval.return_value = 0
+    lease = RunLease(client, "hour:2023-06-01", ttl=0.03, token="token")  # type: ignore
+
+    with lease:
+        time.sleep(0.1)
+
+    assert client.eval.call_count == 1
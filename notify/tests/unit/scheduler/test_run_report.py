@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock
+
+from notify.celery_app.run_report import MongoRunReportStore, RunMetrics, percentile, stage_statistics
+from notify.celery_app.scheduled_events import RunSummary
+
+
+def test_run_metrics_timers_and_counters():
+    metrics = RunMetrics()
+    with metrics.timer("send_mail"):
+        pass
+    metrics.record("send_mail", 0.5)
+    metrics.increment("cache_hits")
+    metrics.increment("cache_hits", 2)
+
+    assert list(metrics.timed("get_events", [1, 2, 3])) == [1, 2, 3]
+    assert len(metrics.durations["get_events"]) == 3
+    assert metrics.counters["cache_hits"] == 3
+
+    report = metrics.report("hour:2024-01-01:0-1", "hour", RunSummary(sent=2, failed=1))
+    assert report["run_id"] == "hour:2024-01-01:0-1"
+    assert report["sent"] == 2 and report["failed"] == 1 and report["skipped"] == 0
+    assert report["stages"]["send_mail"]["count"] == 2
+    assert report["stages"]["send_mail"]["max"] == 0.5
+    assert report["counters"] == {"cache_hits": 3}
+
+    metrics.reset()
+    assert not metrics.durations and not metrics.counters
+
+
+def test_stage_statistics():
+    statistics = stage_statistics(float(i) for i in range(100, 0, -1))
+    assert statistics["count"] == 100
+    assert statistics["mean"] == 50.5
+    assert (statistics["p50"], statistics["p95"], statistics["p99"]) == (50.0, 95.0, 99.0)
+    assert stage_statistics([])["p99"] == 0.0
+    assert percentile([1.0], 99) == 1.0
+
+
+def test_mongo_run_report_store():
+    collection = MagicMock()
+    report = {"run_id": "day:2024-01-01:0-1"}
+    MongoRunReportStore(collection).save(report)
+    collection.insert_one.assert_called_once_with(report)
+    assert "_id" not in report
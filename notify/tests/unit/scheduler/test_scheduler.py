@@ -1,11 +1,26 @@
 import datetime
-from unittest.mock import MagicMock
+import time
+from unittest.mock import MagicMock, patch
 
-from notify.celery_app.scheduled_events import MailScheduler
+import pytest
+from celery.schedules import crontab
+
+from notify.app.deadline import Deadline, call_timeout
+from notify.celery_app.checkpoints import RUN_FINISHED
+from notify.celery_app.config import SchedulerConfig
+from notify.celery_app.forecast_changes import ChangeFilter, fingerprint
+from notify.celery_app.memory_profile import MemoryProfiler
+from notify.celery_app.scheduled_events import MailScheduler, RunSummary
+from notify.celery_app.tasks import (create_run_lease, create_tasks, crontab_before,
+                                    summarize_run)
+from notify.exceptions.exceptions import DeadlineExceededException, RunDataException
 from notify.models.event import Event
 from notify.models.measurements import DayMeasurements
 from notify.models.query_params import EventType, Frequency
+from notify.models.shard import shard_of
+from notify.models.subscription import Subscription
 from notify.models.user import User
+from notify.weather.message_builder import TextMessageBuilder
 
 
 def test_mail_scheduler():
@@ -48,5 +63,850 @@ def test_mail_scheduler():
     mock_database_users.get_users.assert_called_once()
     mock_database_events.get_events_by_frequency.assert_called_once_with(user, Frequency.DAY)
     mock_weather_provider.get_weather.assert_called_once_with(Frequency.DAY, "London", "UK")
-    mock_message_builder.compose_message.assert_called_once_with(event, day_measurements)
+    mock_message_builder.compose_message.assert_called_once_with(event, day_measurements, None)
+    mock_sender.send.assert_called_once_with("Subject", "Message", "alice@example.com")
+
+
+def test_mail_scheduler_grouped_fetches_location_once():
+    mock_sender = MagicMock()
+    mock_database_users = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    paris = Event(event_type=EventType.TEMPERATURE, frequency=Frequency.DAY, city="Paris", country="France")
+
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        Subscription(2, "bob@example.com", london),
+        Subscription(2, "bob@example.com", paris),
+    ]
+    mock_weather_provider.get_weather.return_value = [DayMeasurements("2021-10-10", (1, 2), 2.1, 3)]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    scheduler = MailScheduler(
+        mock_sender,
+        mock_database_users,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+    )
+    scheduler.run()
+
+    assert mock_weather_provider.get_weather.call_count == 2
+    mock_weather_provider.get_weather.assert_any_call(Frequency.DAY, "London", "UK")
+    mock_weather_provider.get_weather.assert_any_call(Frequency.DAY, "Paris", "France")
+    assert mock_sender.send.call_count == 3
+    mock_database_events.get_subscriptions.assert_called_once_with(
+        Frequency.DAY, after=None, send_minute=None, shard=None
+    )
+    mock_database_users.get_users.assert_not_called()
+
+
+def test_mail_scheduler_grouped_failed_location_does_not_stop_run():
+    mock_sender = MagicMock()
+    mock_database_users = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    nowhere = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Nowhere", country="None")
+
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        Subscription(1, "alice@example.com", nowhere),
+    ]
+    mock_weather_provider.get_weather.side_effect = [["weather"], ValueError("Location not found")]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    scheduler = MailScheduler(
+        mock_sender,
+        mock_database_users,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+    )
+    scheduler.run()
+
+    mock_message_builder.compose_message.assert_called_once_with(london, ["weather"], None)
     mock_sender.send.assert_called_once_with("Subject", "Message", "alice@example.com")
+
+
+def test_mail_scheduler_shards_split_locations():
+    events = [
+        Event(event_type=EventType.ALL, frequency=Frequency.HOUR, city=city, country="Poland")
+        for city in ("Gdansk", "Krakow", "Lodz", "Poznan", "Warsaw", "Wroclaw")
+    ]
+    subscriptions = [Subscription(1, "alice@example.com", event) for event in events]
+
+    processed = []
+    for shard_index in range(3):
+        mock_database_events = MagicMock()
+        mock_database_events.get_subscriptions.side_effect = lambda frequency, after, send_minute, shard: [
+            s for s in subscriptions if shard_of(s.event.city, s.event.country, shard[1]) == shard[0]
+        ]
+        mock_weather_provider = MagicMock()
+        mock_weather_provider.get_weather.return_value = ["weather"]
+        mock_message_builder = MagicMock()
+        mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+        scheduler = MailScheduler(
+            MagicMock(),
+            MagicMock(),
+            mock_database_events,
+            mock_weather_provider,
+            mock_message_builder,
+            Frequency.HOUR,
+            SchedulerConfig(grouped=True, shard_count=3, shard_index=shard_index),
+        )
+        summary = scheduler.run()
+
+        cities = [call.args[1] for call in mock_weather_provider.get_weather.call_args_list]
+        assert all(shard_of(city, "Poland", 3) == shard_index for city in cities)
+        assert summary.sent == len(cities)
+        processed.extend(cities)
+
+    assert sorted(processed) == sorted(event.city for event in events)
+
+
+def test_mail_scheduler_run_summary():
+    mock_sender = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        Subscription(2, "bob@example.com", london),
+        Subscription(3, "carol@example.com", london),
+    ]
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.side_effect = [("Subject", "Message"), (None, None), ("Subject", "Message")]
+    mock_sender.send.side_effect = [True, False]
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+    )
+
+    assert scheduler.run() == RunSummary(sent=1, failed=1, skipped=1)
+
+
+def test_deadline():
+    assert Deadline(60).timeout(10) == 10
+    assert Deadline(5).timeout(10) <= 5
+    assert call_timeout(None, 10) == 10
+    with pytest.raises(DeadlineExceededException):
+        Deadline(0).timeout(10, "sending email")
+
+
+def test_mail_scheduler_defers_reports_after_deadline():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+    catch_up = MagicMock()
+    deadline = Deadline(60)
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    paris = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Paris", country="FR")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        Subscription(2, "bob@example.com", london),
+        Subscription(3, "carol@example.com", london),
+        Subscription(4, "dave@example.com", paris),
+    ]
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    def send(subject, msg, receiver):
+        if receiver == "bob@example.com":
+            deadline.expires_at = 0
+            raise DeadlineExceededException("sending email")
+        return True
+
+    scheduler = MailScheduler(
+        MagicMock(send=MagicMock(side_effect=send)),
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        deadline=deadline,
+        catch_up=catch_up,
+    )
+
+    assert scheduler.run() == RunSummary(sent=1, deferred=3)
+    deferred = [s.email for call in catch_up.push.call_args_list for s in call.args[0]]
+    assert deferred == ["bob@example.com", "carol@example.com", "dave@example.com"]
+    assert mock_weather_provider.get_weather.call_count == 1
+    assert scheduler.metrics.counters["deferred"] == 3
+
+
+def test_mail_scheduler_skips_unchanged_forecasts():
+    mock_sender = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+    fingerprints = MagicMock()
+
+    weather = [DayMeasurements("2021-10-10", (1, 2), 2.1, 3)]
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    unchanged = Event(event_id=1, user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="London",
+                      country="UK", only_changes=True)
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", unchanged),
+        Subscription(2, "bob@example.com", london),
+    ]
+    mock_weather_provider.get_weather.return_value = weather
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    mock_sender.send.return_value = True
+    fingerprints.get.return_value = fingerprint(weather)
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        changes=ChangeFilter(fingerprints),
+    )
+
+    assert scheduler.run() == RunSummary(sent=1, skipped=1)
+    mock_sender.send.assert_called_once_with("Subject", "Message", "bob@example.com")
+    assert scheduler.metrics.counters["unchanged_reports"] == 1
+    fingerprints.save.assert_not_called()
+
+
+def test_mail_scheduler_evaluates_alerts_per_location():
+    mock_sender = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+
+    def alert(user_id: int, operator: str, threshold: float) -> Subscription:
+        event = Event(event_id=user_id, user_id=user_id, event_type=EventType.ALERT, frequency=Frequency.DAY,
+                      city="London", country="UK", alert_measure="temperature", alert_operator=operator,
+                      alert_threshold=threshold)
+        return Subscription(user_id, f"user{user_id}@example.com", event)
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", london),
+        alert(2, "<", 0),
+        alert(3, ">", 30),
+        alert(4, ">", 20),
+    ]
+    mock_weather_provider.get_weather.return_value = [DayMeasurements("2021-10-10", (1, 25), 2.1, 3)]
+    mock_sender.send.return_value = True
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        TextMessageBuilder(),
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+    )
+
+    with patch("notify.weather.message_builder.evaluate") as evaluate:
+        assert scheduler.run() == RunSummary(sent=2, skipped=2)
+    assert [call.args[2] for call in mock_sender.send.call_args_list] == ["alice@example.com", "user4@example.com"]
+    assert "temperature of 25 at 2021-10-10" in mock_sender.send.call_args_list[1].args[1]
+    assert scheduler.metrics.counters["quiet_alerts"] == 2
+    evaluate.assert_not_called()
+
+
+def test_mail_scheduler_digest():
+    mock_sender = MagicMock()
+    mock_database_users = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+
+    def subscription(event_id: int, user_id: int, email: str, city: str) -> Subscription:
+        event = Event(event_id=event_id, user_id=user_id, event_type=EventType.ALL, frequency=Frequency.DAY,
+                      city=city, country="EU")
+        return Subscription(user_id, email, event)
+
+    mock_database_events.get_user_subscriptions.return_value = iter([
+        subscription(1, 1, "alice@example.com", "Warsaw"),
+        subscription(2, 1, "alice@example.com", "Berlin"),
+        subscription(3, 2, "bob@example.com", "Warsaw"),
+    ])
+    mock_weather_provider.get_weather.return_value = [DayMeasurements("2021-10-10", (1, 2), 2.1, 3)]
+    mock_sender.send.return_value = True
+    ledger = MagicMock()
+    ledger.was_delivered.return_value = False
+
+    scheduler = MailScheduler(
+        mock_sender,
+        mock_database_users,
+        mock_database_events,
+        mock_weather_provider,
+        TextMessageBuilder(),
+        Frequency.DAY,
+        SchedulerConfig(digest=True),
+        ledger=ledger,
+    )
+
+    assert scheduler.run() == RunSummary(sent=3)
+    titles = [(call.args[0], call.args[2]) for call in mock_sender.send.call_args_list]
+    assert titles == [
+        ("Weather digest (2 reports)", "alice@example.com"),
+        ("Weather report for Warsaw", "bob@example.com"),
+    ]
+    assert "Weather report for Berlin" in mock_sender.send.call_args_list[0].args[1]
+    assert mock_weather_provider.get_weather.call_count == 2
+    assert ledger.mark_delivered.call_count == 3
+    assert scheduler.metrics.counters["digests"] == 1
+    mock_database_events.get_user_subscriptions.assert_called_once_with(
+        Frequency.DAY, after_user=None, send_minute=None
+    )
+    mock_database_users.get_users.assert_not_called()
+    mock_database_events.get_events_by_frequency.assert_not_called()
+
+
+def test_summarize_run():
+    results = [{"sent": 2, "failed": 1, "skipped": 0}, {"sent": 3, "failed": 0, "skipped": 4}]
+    assert summarize_run(results, "hour") == {"sent": 5, "failed": 1, "skipped": 4, "deferred": 0}
+
+
+@pytest.mark.parametrize("grouped", [True, False])
+def test_mail_scheduler_concurrent_fetches_location_once(grouped):
+    mock_sender = MagicMock()
+    mock_database_users = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.HOUR, city="London", country="UK")
+    nowhere = Event(event_type=EventType.ALL, frequency=Frequency.HOUR, city="Nowhere", country="None")
+    users = [User(user_id=i, username=f"user{i}", email=f"user{i}@example.com") for i in range(20)]
+
+    mock_database_users.get_users.return_value = users
+    mock_database_events.get_events_by_frequency.return_value = [london, nowhere]
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(user.user_id, user.email, event) for event in (london, nowhere) for user in users
+    ]
+
+    def get_weather(frequency, city, country):
+        time.sleep(0.01)
+        if city == "Nowhere":
+            raise ValueError("Location not found")
+        return ["weather"]
+
+    mock_weather_provider.get_weather.side_effect = get_weather
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    scheduler = MailScheduler(
+        mock_sender,
+        mock_database_users,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.HOUR,
+        SchedulerConfig(grouped=grouped, workers=4),
+    )
+
+    assert scheduler.run() == RunSummary(sent=20, failed=20, skipped=0)
+    assert mock_weather_provider.get_weather.call_count == 2
+    assert mock_sender.send.call_count == 20
+
+
+class DictCheckpointStore:
+    def __init__(self, checkpoints=None):
+        self.checkpoints = checkpoints or {}
+
+    def get(self, run_id):
+        return self.checkpoints.get(run_id)
+
+    def save(self, run_id, watermark):
+        self.checkpoints[run_id] = watermark
+
+
+def test_mail_scheduler_grouped_resumes_from_checkpoint():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    paris = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Paris", country="France")
+    mock_database_events.get_subscriptions.return_value = [Subscription(1, "alice@example.com", paris)]
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    scheduler = MailScheduler(
+        MagicMock(),
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+    )
+    checkpoints = DictCheckpointStore({scheduler.run_id: ["London", "UK"]})
+    scheduler.checkpoints = checkpoints
+
+    assert scheduler.run().sent == 1
+    mock_database_events.get_subscriptions.assert_called_once_with(
+        Frequency.DAY, after=("London", "UK"), send_minute=None, shard=None
+    )
+    assert checkpoints.get(scheduler.run_id) == RUN_FINISHED
+
+    assert scheduler.run() == RunSummary()
+    mock_database_events.get_subscriptions.assert_called_once()
+
+
+def test_mail_scheduler_users_resume_from_checkpoint():
+    mock_database_users = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    users = [User(user_id=i, username=f"user{i}", email=f"user{i}@example.com") for i in (3, 1, 2)]
+    event = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    mock_database_users.get_users.return_value = users
+    mock_database_events.get_events_by_frequency.return_value = [event]
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    checkpoints = DictCheckpointStore()
+    scheduler = MailScheduler(
+        MagicMock(),
+        mock_database_users,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        checkpoints=checkpoints,
+    )
+    checkpoints.save(scheduler.run_id, 1)
+
+    assert scheduler.run().sent == 2
+    assert [call.args[0].user_id for call in mock_database_events.get_events_by_frequency.call_args_list] == [2, 3]
+
+
+def test_mail_scheduler_stream_error_does_not_finish_run():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    def subscriptions():
+        paris = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Paris", country="France")
+        london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+        yield Subscription(1, "alice@example.com", paris)
+        yield Subscription(2, "bob@example.com", london)
+        raise ConnectionError("connection lost")
+
+    mock_database_events.get_subscriptions.return_value = subscriptions()
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    checkpoints = DictCheckpointStore()
+    scheduler = MailScheduler(
+        MagicMock(),
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        checkpoints,
+    )
+
+    with pytest.raises(ConnectionError):
+        scheduler.run()
+    assert checkpoints.get(scheduler.run_id) == ["Paris", "France"]
+
+
+def test_mail_scheduler_users_error_does_not_finish_run():
+    mock_database_users = MagicMock()
+    mock_database_users.get_users.return_value = None
+    checkpoints = DictCheckpointStore()
+    scheduler = MailScheduler(
+        MagicMock(), mock_database_users, MagicMock(), MagicMock(), MagicMock(), Frequency.DAY, checkpoints=checkpoints
+    )
+
+    with pytest.raises(RunDataException):
+        scheduler.run()
+    assert checkpoints.get(scheduler.run_id) is None
+
+
+def test_mail_scheduler_concurrent_checkpoints_finished_locations():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    events = [
+        Event(event_type=EventType.ALL, frequency=Frequency.DAY, city=city, country="PL")
+        for city in ("Gdansk", "Krakow", "Warsaw")
+    ]
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(i, f"user{i}@example.com", event) for event in events for i in range(5)
+    ]
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    saved = []
+    checkpoints = DictCheckpointStore()
+    checkpoints.save = lambda run_id, watermark: saved.append(watermark)
+    scheduler = MailScheduler(
+        MagicMock(),
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True, workers=3),
+        checkpoints,
+    )
+
+    assert scheduler.run().sent == 15
+    assert saved[-1] == RUN_FINISHED
+    assert all(watermark in (["Gdansk", "PL"], ["Krakow", "PL"]) for watermark in saved[:-1])
+
+
+def test_mail_scheduler_concurrent_checkpoints_finished_users():
+    mock_database_users = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    users = [User(user_id=i, username=f"user{i}", email=f"user{i}@example.com") for i in (4, 2, 3, 1)]
+    events = [
+        Event(event_type=EventType.ALL, frequency=Frequency.DAY, city=city, country="PL")
+        for city in ("Gdansk", "Krakow", "Warsaw")
+    ]
+    mock_database_users.get_users.return_value = users
+    mock_database_events.get_events_by_frequency.return_value = events
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    saved = []
+    checkpoints = DictCheckpointStore()
+    checkpoints.get = lambda run_id: 1
+    checkpoints.save = lambda run_id, watermark: saved.append(watermark)
+    scheduler = MailScheduler(
+        MagicMock(),
+        mock_database_users,
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(workers=3),
+        checkpoints,
+    )
+
+    assert scheduler.run().sent == 9
+    assert [call.args[0].user_id for call in mock_database_events.get_events_by_frequency.call_args_list] == [2, 3, 4]
+    assert saved[-1] == RUN_FINISHED
+    assert saved[:-1] == sorted(saved[:-1])
+    assert all(watermark in (2, 3) for watermark in saved[:-1])
+
+
+def test_mail_scheduler_skips_delivered_reports():
+    mock_sender = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+    mock_ledger = MagicMock()
+
+    delivered = Event(event_id=1, user_id=1, event_type=EventType.ALL, frequency=Frequency.DAY, city="A", country="B")
+    pending = Event(event_id=2, user_id=2, event_type=EventType.ALL, frequency=Frequency.DAY, city="A", country="B")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(1, "alice@example.com", delivered),
+        Subscription(2, "bob@example.com", pending),
+    ]
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    mock_ledger.was_delivered.side_effect = lambda user_id, event_id, date: event_id == 1
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        ledger=mock_ledger,
+    )
+
+    assert scheduler.run() == RunSummary(sent=1, failed=0, skipped=1)
+    mock_message_builder.compose_message.assert_called_once_with(pending, ["weather"], None)
+    mock_sender.send.assert_called_once_with("Subject", "Message", "bob@example.com")
+    mock_ledger.mark_delivered.assert_called_once_with(2, 2, datetime.date.today().isoformat())
+
+
+def test_mail_scheduler_pipelined():
+    mock_sender = MagicMock()
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+
+    london = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    nowhere = Event(event_type=EventType.ALL, frequency=Frequency.DAY, city="Nowhere", country="None")
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(i, f"user{i}@example.com", event) for event in (london, nowhere) for i in range(10)
+    ]
+    mock_weather_provider.get_weather.side_effect = lambda frequency, city, country: (
+        ["weather"] if city == "London" else None
+    )
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    mock_sender.send.side_effect = lambda subject, msg, receiver: receiver != "user0@example.com"
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(pipeline=True, fetch_workers=2, render_workers=2, send_workers=3, queue_size=2),
+    )
+
+    assert scheduler.run() == RunSummary(sent=9, failed=1, skipped=10)
+    assert mock_weather_provider.get_weather.call_count == 2
+
+
+def test_mail_scheduler_pipelined_checkpoints_delivered_locations():
+    mock_sender = MagicMock()
+    mock_sender.send.return_value = True
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder = MagicMock()
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    checkpoints = MagicMock()
+    checkpoints.get.return_value = None
+
+    cities = ["Berlin", "London", "Oslo", "Paris"]
+    mock_database_events.get_subscriptions.return_value = [
+        Subscription(i, f"user{i}@example.com", Event(event_type=EventType.ALL, frequency=Frequency.DAY,
+                                                      city=city, country="EU"))
+        for city in cities
+        for i in range(5)
+    ]
+    saved = []
+    checkpoints.save.side_effect = lambda run_id, watermark: saved.append((watermark, mock_sender.send.call_count))
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(pipeline=True, fetch_workers=2, render_workers=2, send_workers=3, queue_size=2),
+        checkpoints=checkpoints,
+    )
+
+    assert scheduler.run().sent == 20
+    watermarks = [watermark for watermark, _ in saved]
+    assert watermarks[-2:] == [["Paris", "EU"], RUN_FINISHED]
+    # Locations are checkpointed in order, each once all of its reports and those before it were sent.
+    positions = [cities.index(watermark[0]) for watermark in watermarks[:-1]]
+    assert positions == sorted(positions)
+    assert all(sends >= 5 * (cities.index(watermark[0]) + 1) for watermark, sends in saved[:-1])
+
+
+def test_crontab_before():
+    assert crontab_before(6, 0, 15) == crontab(hour=5, minute=45)
+    assert crontab_before(6, 10, 15, day_of_week=1) == crontab(hour=5, minute=55, day_of_week=1)
+    assert crontab_before(0, 5, 10, day_of_week=1) == crontab(hour=23, minute=55, day_of_week=0)
+
+
+def test_create_tasks_prewarm():
+    names = [task["name"] for task in create_tasks(SchedulerConfig(prewarm_lead_minutes=20))]
+    assert "Warm weather cache 20 minutes before the 24 hour weather report" in names
+    assert len(create_tasks(SchedulerConfig(prewarm_lead_minutes=0))) == 2
+
+
+def test_create_tasks_send_windows():
+    names = [task["name"] for task in create_tasks(SchedulerConfig(send_windows=True))]
+    assert names == ["Send mail for events due in the current minute", "Recalculate send minutes every hour"]
+
+
+def test_mail_scheduler_send_minute():
+    mock_database_events = MagicMock()
+    mock_database_events.get_subscriptions.return_value = []
+    scheduler = MailScheduler(
+        MagicMock(),
+        MagicMock(),
+        mock_database_events,
+        MagicMock(),
+        MagicMock(),
+        Frequency.HOUR,
+        SchedulerConfig(grouped=True, send_minute=300),
+    )
+
+    scheduler.run()
+
+    mock_database_events.get_subscriptions.assert_called_once_with(
+        Frequency.HOUR, after=None, send_minute=300, shard=None
+    )
+    assert scheduler.run_id.endswith(":300")
+
+
+def test_mail_scheduler_saves_run_report():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+    mock_sender = MagicMock()
+    reports = MagicMock()
+    subscriptions = [
+        Subscription(i, f"user{i}@example.com", Event(event_type=EventType.ALL, frequency=Frequency.DAY,
+                                                      city="London", country="UK"))
+        for i in range(3)
+    ]
+    mock_database_events.get_subscriptions.return_value = iter(subscriptions)
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.side_effect = [("Subject", "Message"), (None, None), ("Subject", "Message")]
+    mock_sender.send.side_effect = [True, False]
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        reports=reports,
+    )
+    scheduler.run()
+
+    report = reports.save.call_args.args[0]
+    assert (report["sent"], report["failed"], report["skipped"]) == (1, 1, 1)
+    assert report["stages"]["get_events"]["count"] == 3
+    assert report["stages"]["get_weather"]["count"] == 1
+    assert report["stages"]["build_message"]["count"] == 3
+    assert report["stages"]["send_mail"]["count"] == 2
+    assert report["counters"] == {"empty_reports": 1, "send_failures": 1}
+    assert "memory" not in report
+
+
+def test_mail_scheduler_reports_memory():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+    reports = MagicMock()
+    mock_database_events.get_subscriptions.return_value = iter([
+        Subscription(i, f"user{i}@example.com", Event(event_type=EventType.ALL, frequency=Frequency.DAY,
+                                                      city=f"City{i}", country="UK"))
+        for i in range(4)
+    ])
+    mock_weather_provider.get_weather.return_value = ["weather"]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+
+    scheduler = MailScheduler(
+        MagicMock(),
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        reports=reports,
+        memory=MemoryProfiler(every=2, top=5),
+    )
+    scheduler.run()
+
+    memory = reports.save.call_args.args[0]["memory"]
+    assert memory is scheduler.memory_report
+    assert [sample["label"] for sample in memory["samples"]] == ["start", "2 locations", "4 locations", "finished"]
+    assert memory["peak"] > 0 and len(memory["top"]) <= 5
+
+
+def test_mail_scheduler_stops_memory_profile_on_error():
+    mock_database_events = MagicMock()
+    mock_database_events.get_subscriptions.side_effect = ConnectionError("connection lost")
+    memory = MagicMock()
+    scheduler = MailScheduler(
+        MagicMock(),
+        MagicMock(),
+        mock_database_events,
+        MagicMock(),
+        MagicMock(),
+        Frequency.DAY,
+        SchedulerConfig(grouped=True),
+        memory=memory,
+    )
+
+    with pytest.raises(ConnectionError):
+        scheduler.run()
+    memory.start.assert_called_once()
+    memory.stop.assert_called_once()
+
+
+def test_create_run_lease():
+    assert create_run_lease(SchedulerConfig(lease=False), "hour") is None
+
+    lease = create_run_lease(SchedulerConfig(lease=True, lease_ttl=30, send_minute=300), "HOUR", "token")
+    assert lease.key == f"notify:lease:hour:{datetime.date.today().isoformat()}:300"
+    assert (lease.ttl, lease.token) == (30, "token")
+
+
+def test_mail_scheduler_merged_resolves_location_once():
+    mock_database_events = MagicMock()
+    mock_weather_provider = MagicMock()
+    mock_message_builder = MagicMock()
+    mock_sender = MagicMock()
+    hour_event = Event(event_id=1, event_type=EventType.ALL, frequency=Frequency.HOUR, city="London", country="UK")
+    day_event = Event(event_id=2, event_type=EventType.ALL, frequency=Frequency.DAY, city="London", country="UK")
+    paris_event = Event(event_id=3, event_type=EventType.ALL, frequency=Frequency.DAY, city="Paris", country="FR")
+    mock_database_events.get_subscriptions.return_value = iter(
+        [
+            Subscription(1, "alice@example.com", hour_event),
+            Subscription(1, "alice@example.com", day_event),
+            Subscription(2, "bob@example.com", paris_event),
+        ]
+    )
+    mock_weather_provider.get_weathers.side_effect = [
+        {Frequency.HOUR: ["hourly"], Frequency.DAY: ["daily"]},
+        {Frequency.DAY: ["daily"]},
+    ]
+    mock_message_builder.compose_message.return_value = ("Subject", "Message")
+    mock_sender.send.return_value = True
+
+    scheduler = MailScheduler(
+        mock_sender,
+        MagicMock(),
+        mock_database_events,
+        mock_weather_provider,
+        mock_message_builder,
+        Frequency.HOUR,
+        SchedulerConfig(merged=True),
+    )
+    summary = scheduler.run()
+
+    assert summary == RunSummary(sent=3)
+    mock_database_events.get_subscriptions.assert_called_once_with(
+        [Frequency.HOUR, Frequency.DAY], after=None, send_minute=None, shard=None
+    )
+    mock_weather_provider.get_weathers.assert_any_call([Frequency.HOUR, Frequency.DAY], "London", "UK")
+    mock_weather_provider.get_weathers.assert_any_call([Frequency.DAY], "Paris", "FR")
+    mock_weather_provider.get_weather.assert_not_called()
+    mock_message_builder.compose_message.assert_any_call(hour_event, ["hourly"], None)
+    mock_message_builder.compose_message.assert_any_call(day_event, ["daily"], None)
+    assert scheduler.run_id.startswith("hour+day:")
+
+
+def test_create_tasks_merge_monday():
+    tasks = create_tasks(SchedulerConfig(merge_monday=True, prewarm_lead_minutes=15))
+    names = [task["name"] for task in tasks]
+    assert "Send mail for 7 day and 24 hour weather reports every Monday at 6:00" in names
+    assert "Send mail for 7 day weather report every Monday at 6:10" not in names
+    assert tasks[2]["crontab"] == crontab(hour=5, minute=45, day_of_week=1)
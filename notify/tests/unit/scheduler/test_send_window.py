@@ -0,0 +1,32 @@
+from datetime import UTC, datetime
+
+from notify.models.query_params import Frequency
+from notify.models.send_window import minute_of_period, send_minute
+
+# Wednesday, in winter time (Europe/Warsaw is UTC+1, America/New_York is UTC-5)
+WINTER = datetime(2024, 1, 10, 12, 0, tzinfo=UTC)
+# Wednesday, in summer time (Europe/Warsaw is UTC+2)
+SUMMER = datetime(2024, 7, 10, 12, 0, tzinfo=UTC)
+
+
+def test_minute_of_period():
+    assert minute_of_period(Frequency.HOUR, WINTER) == 12 * 60
+    assert minute_of_period(Frequency.DAY, WINTER) == 2 * 24 * 60 + 12 * 60
+
+
+def test_send_minute_hour():
+    assert send_minute(Frequency.HOUR, "Europe/Warsaw", WINTER) == 5 * 60
+    assert send_minute(Frequency.HOUR, "Europe/Warsaw", SUMMER) == 4 * 60
+    assert send_minute(Frequency.HOUR, "America/New_York", WINTER) == 11 * 60
+
+
+def test_send_minute_day():
+    assert send_minute(Frequency.DAY, "Europe/Warsaw", WINTER) == 5 * 60 + 10
+    assert send_minute(Frequency.DAY, "Asia/Tokyo", WINTER) == 6 * 24 * 60 + 21 * 60 + 10
+
+
+def test_send_minute_unknown_timezone():
+    assert send_minute(Frequency.HOUR, "Mars/Olympus_Mons", WINTER) == send_minute(
+        Frequency.HOUR, "Europe/Warsaw", WINTER
+    )
+    assert send_minute(Frequency.HOUR, None, WINTER) == 5 * 60
@@ -0,0 +1,39 @@
+from datetime import UTC, datetime, timedelta
+from unittest.mock import MagicMock
+
+from notify.celery_app.send_window_cursor import ADVANCE_SCRIPT, RedisSendWindowCursor
+
+NOW = datetime(2024, 1, 10, 12, 0, 30, tzinfo=UTC)
+CURRENT = int(NOW.timestamp()) // 60
+
+
+def test_claim_first_minute():
+    client = MagicMock()
+    client.eval.return_value = None
+
+    assert RedisSendWindowCursor(client, ttl=60).claim(NOW) == [datetime(2024, 1, 10, 12, 0, tzinfo=UTC)]
+    client.eval.assert_called_once_with(ADVANCE_SCRIPT, 1, "notify:send_window:last", CURRENT, 60)
+
+
+def test_claim_minutes_since_last_task():
+    client = MagicMock()
+    client.eval.return_value = str(CURRENT - 3).encode()
+
+    minutes = RedisSendWindowCursor(client).claim(NOW)
+
+    start = datetime(2024, 1, 10, 11, 58, tzinfo=UTC)
+    assert minutes == [start, start + timedelta(minutes=1), start + timedelta(minutes=2)]
+
+
+def test_claim_minute_already_handled():
+    client = MagicMock()
+    client.eval.return_value = str(CURRENT).encode()
+    assert RedisSendWindowCursor(client).claim(NOW) == []
+
+
+def test_claim_limited_by_backfill():
+    client = MagicMock()
+    client.eval.return_value = str(CURRENT - 600).encode()
+    minutes = RedisSendWindowCursor(client, backfill=5).claim(NOW)
+    assert len(minutes) == 5
+    assert minutes[-1] == datetime(2024, 1, 10, 12, 0, tzinfo=UTC)
@@ -1,9 +1,11 @@
+from datetime import UTC, datetime
 from unittest.mock import MagicMock
 
 import pytest
 
 from notify.models.event import Event
 from notify.models.query_params import EventType, Frequency
+from notify.models.shard import location_hash
 from notify.models.user import User
 from notify.repositories.event_repository import EventRepository
 from notify.services.event_service import EventService
@@ -70,3 +72,109 @@ def test_get_events(event_service, event_repo, user: User):
 def test_get_events_empty(event_service, event_repo, user: User):
     event_repo.get_events.return_value = []
     assert event_service.get_events(user) == []
+
+
+def test_get_subscriptions(event_service, event_repo):
+    event_repo.stream_subscriptions.return_value = iter(["subscription"])
+    assert list(event_service.get_subscriptions(Frequency.HOUR)) == ["subscription"]
+    event_repo.stream_subscriptions.assert_called_once_with(Frequency.HOUR, 1000, None, None, None)
+
+
+def test_get_subscriptions_error(event_service, event_repo):
+    event_repo.stream_subscriptions.side_effect = ValueError
+    with pytest.raises(ValueError):
+        list(event_service.get_subscriptions(Frequency.HOUR))
+
+
+def test_get_user_subscriptions(event_service, event_repo):
+    event_repo.stream_user_subscriptions.return_value = iter(["subscription"])
+    assert list(event_service.get_user_subscriptions(Frequency.DAY, after_user=3)) == ["subscription"]
+    event_repo.stream_user_subscriptions.assert_called_once_with(Frequency.DAY, 1000, 3, None)
+
+
+def test_create_event_timezone(event_repo, user: User):
+    location_provider = MagicMock()
+    location_provider.search.return_value = {"latitude": 35.69, "longitude": 139.69, "timezone": "Asia/Tokyo"}
+    event_service = EventService(event_repo, location_provider)
+
+    assert event_service.create(user, {"event_type": "all", "frequency": "hour", "city": "Tokyo", "country": "Japan"})
+    event = event_repo.create.call_args.args[0]
+    assert event.timezone == "Asia/Tokyo"
+    assert event.send_minute == 21 * 60
+    location_provider.search.assert_called_once_with("Tokyo", "Japan")
+
+
+def test_create_event_unknown_timezone(event_repo, user: User):
+    location_provider = MagicMock()
+    location_provider.search.return_value = {"latitude": 52.23, "longitude": 21.01}
+    event_service = EventService(event_repo, location_provider)
+
+    assert event_service.create(user, {"event_type": "all", "frequency": "hour", "city": "Warsaw", "country": "Poland"})
+    assert event_repo.create.call_args.args[0].timezone == "Europe/Warsaw"
+
+
+def test_create_event_location_not_found(event_repo, user: User):
+    location_provider = MagicMock()
+    location_provider.search.return_value = None
+    event_service = EventService(event_repo, location_provider)
+
+    assert not event_service.create(user, {"event_type": "all", "frequency": "day", "city": "Nowhere", "country": "XX"})
+    event_repo.create.assert_not_called()
+
+
+def test_refresh_send_minutes(event_service, event_repo):
+    event_repo.get_timezones.return_value = ["Europe/Warsaw", None]
+    event_repo.set_send_minute.return_value = 2
+    assert event_service.refresh_send_minutes(datetime(2024, 7, 10, 12, 0, tzinfo=UTC)) == 8
+    event_repo.set_send_minute.assert_any_call(Frequency.HOUR, "Europe/Warsaw", 4 * 60)
+    event_repo.set_send_minute.assert_any_call(Frequency.HOUR, None, 4 * 60)
+
+
+def test_create_hourly_humidity_alert_event(event_repo, user: User):
+    event_service = EventService(event_repo, MagicMock())
+    data = {
+        "event_type": "alert",
+        "frequency": "hour",
+        "city": "Warsaw",
+        "country": "Poland",
+        "alert_measure": "humidity",
+        "alert_operator": ">",
+        "alert_threshold": 90,
+    }
+
+    assert event_service.create(user, data)
+
+
+def test_create_alert_event(event_repo, user: User):
+    event_service = EventService(event_repo, MagicMock())
+    data = {
+        "event_type": "alert",
+        "frequency": "day",
+        "city": "Warsaw",
+        "country": "Poland",
+        "alert_measure": "precipitation_probability",
+        "alert_operator": ">",
+        "alert_threshold": 70,
+    }
+
+    assert event_service.create(user, data)
+    event = event_repo.create.call_args.args[0]
+    assert (event.alert_measure, event.alert_operator, event.alert_threshold) == ("precipitation_probability", ">", 70)
+    assert event.location_hash == location_hash("Warsaw", "Poland")
+
+
+@pytest.mark.parametrize(
+    "rule",
+    [
+        {"alert_measure": "wind", "alert_operator": ">", "alert_threshold": 1},
+        {"alert_measure": "temperature", "alert_operator": "=", "alert_threshold": 1},
+        {"alert_measure": "temperature", "alert_operator": "<", "alert_threshold": "cold"},
+        {"alert_measure": "temperature", "alert_operator": "<"},
+        {"alert_measure": "humidity", "alert_operator": ">", "alert_threshold": 90},
+    ],
+)
+def test_create_alert_event_invalid_rule(event_repo, user: User, rule: dict):
+    event_service = EventService(event_repo, MagicMock())
+    data = {"event_type": "alert", "frequency": "day", "city": "Warsaw", "country": "Poland", **rule}
+    assert not event_service.create(user, data)
+    event_repo.create.assert_not_called()
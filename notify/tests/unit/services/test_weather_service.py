@@ -3,7 +3,7 @@ from unittest.mock import MagicMock
 
 import pytest
 
-from notify.models.measurements import DayMeasurements
+from notify.models.measurements import DayMeasurements, HourMeasurements
 from notify.models.query_params import Frequency
 from notify.services.weather_service import WeatherService
 
@@ -50,3 +50,19 @@ def test_get_weather(mock_collection):
     mock_collection.find_one.assert_called_once_with(
         {"frequency": "day", "city": "New York", "country": "USA", "date": "2022-01-01"}
     )
+
+
+def test_store_weathers(mock_collection):
+    date = datetime.datetime.now().strftime("%Y-%m-%d")
+    day = {"date": date, "temperature": (1, 5), "precipitation": 0.5, "precipitation_probability": 10}
+    hour = {"date": f"{date}T12:00", "temperature": 3, "humidity": 80, "precipitation": 0.1,
+            "precipitation_probability": 10}
+    service = WeatherService(mock_collection)
+
+    service.store_weathers("Warsaw", "Poland", {Frequency.HOUR: [HourMeasurements(**hour)],
+                                                Frequency.DAY: [DayMeasurements(**day)]})
+
+    mock_collection.insert_many.assert_called_once_with([
+        {"frequency": "hour", "city": "Warsaw", "country": "Poland", "date": date, "weather": [hour]},
+        {"frequency": "day", "city": "Warsaw", "country": "Poland", "date": date, "weather": [day]},
+    ])
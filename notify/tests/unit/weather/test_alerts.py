@@ -0,0 +1,67 @@
+import random
+
+from notify.models.measurements import DayMeasurements, HourMeasurements
+from notify.weather.alerts import MEASURES, Alert, AlertIndex, AlertRule, evaluate, extremes
+
+HOURS = [
+    HourMeasurements("2023-06-01T00:00", 4.5, 90, 0.0, 10),
+    HourMeasurements("2023-06-01T01:00", -1.0, 95, 0.4, 80),
+    HourMeasurements("2023-06-01T02:00", 7.0, 70, None, 40),
+]
+DAYS = [
+    DayMeasurements("2023-06-01", (3, 18), 0.0, 5),
+    DayMeasurements("2023-06-02", (-2, 11), 4.5, 75),
+]
+
+
+def test_extremes_of_hours():
+    found = extremes(HOURS, "temperature")
+    assert (found.low, found.low_date) == (-1.0, "2023-06-01T01:00")
+    assert (found.high, found.high_date) == (7.0, "2023-06-01T02:00")
+    assert extremes(HOURS, "precipitation").high == 0.4
+
+
+def test_extremes_of_days():
+    found = extremes(DAYS, "temperature")
+    assert (found.low, found.high) == (-2, 18)
+    assert extremes(DAYS, "humidity") is None
+
+
+def test_evaluate():
+    assert evaluate(AlertRule("precipitation_probability", ">", 70), DAYS) == Alert(
+        AlertRule("precipitation_probability", ">", 70), 75, "2023-06-02"
+    )
+    assert evaluate(AlertRule("temperature", "<", 0), DAYS).date == "2023-06-02"
+    assert evaluate(AlertRule("temperature", "<", -2), DAYS) is None
+    assert evaluate(AlertRule("humidity", ">", 50), DAYS) is None
+
+
+def test_alert_index():
+    rules = [
+        (AlertRule("temperature", ">", 6), "warm"),
+        (AlertRule("temperature", ">", 7), "hot"),
+        (AlertRule("temperature", "<", 0), "frost"),
+        (AlertRule("temperature", "<", -1), "deep frost"),
+        (AlertRule("precipitation_probability", ">", 50), "rain"),
+    ]
+    index = AlertIndex(rules)
+
+    assert len(index) == 5
+    assert sorted(item for item, _ in index.triggered(HOURS)) == ["frost", "rain", "warm"]
+
+
+def test_alert_index_matches_evaluate():
+    generator = random.Random(7)
+    weather = [
+        HourMeasurements(f"2023-06-01T{hour:02}:00", generator.uniform(-5, 25), generator.uniform(30, 100),
+                         generator.uniform(0, 2), generator.randint(0, 100))
+        for hour in range(24)
+    ]
+    rules = [
+        (AlertRule(generator.choice(MEASURES), generator.choice("<>"), generator.randint(-10, 100)), number)
+        for number in range(5000)
+    ]
+
+    triggered = {item: alert for item, alert in AlertIndex(rules).triggered(weather)}
+
+    assert triggered == {item: alert for rule, item in rules if (alert := evaluate(rule, weather)) is not None}
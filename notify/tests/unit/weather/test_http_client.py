@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from notify.app.deadline import Deadline
+from notify.app import http_client
+from notify.app.http_client import AsyncHttpClient, HttpClient, HttpClientConfig
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = 0
+    ports: list[int] = []
+
+    def do_GET(self):
+        FlakyHandler.ports.append(self.client_address[1])
+        status = 503 if FlakyHandler.failures > 0 else 200
+        FlakyHandler.failures -= 1
+        body = b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FlakyHandler.failures = 0
+    FlakyHandler.ports = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_client_retries_server_errors(server):
+    FlakyHandler.failures = 2
+    client = HttpClient(HttpClientConfig(retries=3, backoff_factor=0, backoff_jitter=0))
+
+    response = client.get(server, timeout=5)
+
+    assert response.json() == {"ok": True}
+    assert len(FlakyHandler.ports) == 3
+
+
+def test_http_client_gives_up_after_retries(server):
+    FlakyHandler.failures = 5
+    client = HttpClient(HttpClientConfig(retries=1, backoff_factor=0, backoff_jitter=0))
+    assert client.get(server, timeout=5).status_code == 503
+    assert len(FlakyHandler.ports) == 2
+
+
+def test_http_client_retries_within_deadline(server):
+    FlakyHandler.failures = 2
+    client = HttpClient(HttpClientConfig(retries=3, backoff_factor=1, backoff_jitter=0))
+
+    assert client.get(server, timeout=5, deadline=Deadline(0.5)).status_code == 503
+    assert len(FlakyHandler.ports) == 1
+
+
+def test_http_client_keeps_connections_alive(server):
+    client = HttpClient()
+    for _ in range(3):
+        client.get(server, timeout=5)
+    assert len(set(FlakyHandler.ports)) == 1
+    assert client.session().headers["Accept-Encoding"] == "gzip, deflate"
+
+
+def test_http_client_session_per_thread_and_process(monkeypatch):
+    client = HttpClient(HttpClientConfig(pool_maxsize=4))
+    session = client.session()
+    adapter = session.get_adapter("https://")
+
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(client.session()))
+    thread.start()
+    thread.join()
+
+    assert client.session() is session
+    assert sessions[0] is not session and sessions[0].get_adapter("https://") is adapter
+    assert adapter._pool_maxsize == 4
+
+    monkeypatch.setattr("notify.app.http_client.os.getpid", lambda: -1)
+    forked = client.session()
+    assert forked is not session and forked.get_adapter("https://") is not adapter
+
+
+class MockAsyncHttpClient(AsyncHttpClient):
+    def __init__(self, statuses, config):
+        super().__init__(config)
+        self.statuses = statuses
+
+    def create_client(self):
+        return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(self.statuses.pop(0))))
+
+
+def test_async_http_client_retries_server_errors():
+    client = MockAsyncHttpClient([503, 502, 200], HttpClientConfig(retries=3, backoff_factor=0, backoff_jitter=0))
+
+    async def get():
+        response = await client.get("http://open-meteo.test/")
+        await client.aclose()
+        return response.status_code
+
+    assert asyncio.run(get()) == 200
+    assert client.statuses == []
+
+
+def test_aclose_closes_client_of_running_loop():
+    async def use_and_close():
+        client = http_client.async_client.client()
+        await http_client.aclose()
+        return client, asyncio.get_running_loop() in http_client.async_client._clients
+
+    client, kept = asyncio.run(use_and_close())
+    assert client.is_closed
+    assert not kept
+
+
+def test_async_http_client_gives_up_after_retries():
+    client = MockAsyncHttpClient([503, 503, 200], HttpClientConfig(retries=1, backoff_factor=0, backoff_jitter=0))
+    assert asyncio.run(client.get("http://open-meteo.test/")).status_code == 503
+
+
+def test_async_http_client_retries_within_deadline():
+    client = MockAsyncHttpClient([503, 503, 200], HttpClientConfig(retries=3, backoff_factor=1, backoff_jitter=0))
+    response = asyncio.run(client.get("http://open-meteo.test/", timeout=5, deadline=Deadline(0.5)))
+    assert response.status_code == 503
+    assert client.statuses == [503, 200]
+
+
+def test_retry_policy_timeout():
+    client = HttpClient()
+    assert client.attempt_timeout(5, None) == 5
+    assert client.attempt_timeout(5, Deadline(60)) == 5
+    assert client.attempt_timeout(None, Deadline(1)) <= 1
+
+
+def test_async_http_client_backoff():
+    client = AsyncHttpClient(HttpClientConfig(backoff_factor=0.5, backoff_jitter=0.25, backoff_max=1.5))
+    assert 0.5 <= client.backoff(0) <= 0.75
+    assert 1.5 <= client.backoff(3) <= 1.75
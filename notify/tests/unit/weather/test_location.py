@@ -1,6 +1,10 @@
+import asyncio
+
 import pytest
 
-from notify.weather.location_provider import (NominatimLocationProvider,
+from notify.app import http_client
+from notify.weather.location_provider import (AsyncOpenMeteoLocationProvider,
+                                              NominatimLocationProvider,
                                               OpenMeteoLocationProvider)
 
 
@@ -43,3 +47,28 @@ class TestOpenMeteo:
 
     def test_get_location_invalid_input_om(self):
         assert self.provider.get_location("", "") is None
+
+
+def test_async_get_location(monkeypatch):
+    results = {"results": [{"latitude": 52.23, "longitude": 21.01, "timezone": "Europe/Warsaw"}]}
+    urls = []
+
+    async def aget(url, timeout, deadline=None):
+        urls.append(url)
+        return type("Response", (), {"json": lambda self: results})()
+
+    monkeypatch.setattr(http_client, "aget", aget)
+    provider = AsyncOpenMeteoLocationProvider()
+
+    assert asyncio.run(provider.get_location("Warsaw", "Poland")) == (52.23, 21.01)
+    assert asyncio.run(provider.get_timezone("Warsaw", "Poland")) == "Europe/Warsaw"
+    assert asyncio.run(provider.get_location("", "Poland")) is None
+    assert urls == [OpenMeteoLocationProvider().get_url("Warsaw", "Poland")] * 2
+
+
+def test_async_get_location_not_found(monkeypatch):
+    async def aget(url, timeout, deadline=None):
+        return type("Response", (), {"json": lambda self: {}})()
+
+    monkeypatch.setattr(http_client, "aget", aget)
+    assert asyncio.run(AsyncOpenMeteoLocationProvider().get_location("my home", "Outer space")) is None
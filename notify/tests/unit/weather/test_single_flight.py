@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from notify.weather.single_flight import RELEASE_SCRIPT, RedisFlightLock, SingleFlight
+
+
+def test_single_flight_shares_exception():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("Location not found")
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(single_flight.do, "hour:Nowhere", fail)
+        started.wait(5)
+        follower = executor.submit(single_flight.do, "hour:Nowhere", lambda: pytest.fail("called twice"))
+        threading.Timer(0.05, release.set).start()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+
+    assert single_flight.do("hour:Nowhere", lambda: ["weather"]) == (["weather"], False)
+
+
+def test_redis_flight_lock_waits_for_holder(monkeypatch):
+    monkeypatch.setattr("notify.weather.single_flight.time.sleep", lambda seconds: None)
+    client = MagicMock()
+    client.set.side_effect = [None, None, True]
+    lock = RedisFlightLock(client, ttl=5, wait=10)
+
+    token = lock.acquire("day:Warsaw:Poland:2024-01-01")
+    lock.release("day:Warsaw:Poland:2024-01-01", token)
+
+    assert client.set.call_count == 3
+    client.set.assert_called_with("notify:flight:day:Warsaw:Poland:2024-01-01", token, nx=True, px=5000)
+    client.eval.assert_called_once_with(RELEASE_SCRIPT, 1, "notify:flight:day:Warsaw:Poland:2024-01-01", token)
+
+
+def test_redis_flight_lock_gives_up():
+    client = MagicMock()
+    client.set.return_value = None
+    assert RedisFlightLock(client, wait=0).acquire("day:Warsaw:Poland:2024-01-01") is None
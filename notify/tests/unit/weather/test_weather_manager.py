@@ -1,10 +1,17 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from notify.celery_app.run_report import RunMetrics
 from notify.models.measurements import DayMeasurements, HourMeasurements
-from notify.weather.weather_manager import (DatabaseService, LocationProvider,
+from notify.weather.single_flight import SingleFlight
+from notify.weather.weather_manager import (AsyncWeatherManager,
+                                            DatabaseService, LocationProvider,
                                             WeatherManager)
 from notify.weather.weather_provider import OpenMeteo
 
@@ -155,3 +162,289 @@ def test_get_measurements_hourly_from_provider(
 
 
 from notify.models.query_params import Frequency
+
+
+def test_get_measurements_records_cache_metrics(mock_database_service, mock_location_provider, mock_weather_provider):
+    metrics = RunMetrics()
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service, metrics)
+    mock_database_service.get_weather.side_effect = [None, ["cached"]]
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_hourly.return_value = ["fetched"]
+
+    assert weather_manager.get_weather(Frequency.HOUR, "Warsaw", "Poland") == ["fetched"]
+    assert weather_manager.get_weather(Frequency.HOUR, "Warsaw", "Poland") == ["cached"]
+
+    assert metrics.counters == {"cache_hits": 1, "cache_misses": 1}
+    assert len(metrics.durations["cache_lookup"]) == 2
+    assert len(metrics.durations["geocoding"]) == len(metrics.durations["weather_request"]) == 1
+
+
+def test_get_weathers_looks_up_location_once(mock_database_service, mock_location_provider, mock_weather_provider,
+                                             weather_manager):
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_combined.return_value = (["hourly"], ["daily"])
+
+    weathers = weather_manager.get_weathers([Frequency.HOUR, Frequency.DAY], "Warsaw", "Poland")
+
+    assert weathers == {Frequency.HOUR: ["hourly"], Frequency.DAY: ["daily"]}
+    mock_location_provider.get_location.assert_called_once_with("Warsaw", "Poland")
+    mock_weather_provider.get_weather_combined.assert_called_once_with(52.23, 21.01)
+    mock_database_service.store_weathers.assert_called_once_with("Warsaw", "Poland", weathers)
+    mock_weather_provider.get_weather_hourly.assert_not_called()
+
+
+def test_get_weathers_fetches_missing_frequency(mock_database_service, mock_location_provider,
+                                                mock_weather_provider, weather_manager):
+    mock_database_service.get_weather.side_effect = [["cached"], None]
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_daily.return_value = ["daily"]
+
+    weathers = weather_manager.get_weathers([Frequency.HOUR, Frequency.DAY], "Warsaw", "Poland")
+
+    assert weathers == {Frequency.HOUR: ["cached"], Frequency.DAY: ["daily"]}
+    mock_weather_provider.get_weather_combined.assert_not_called()
+    mock_database_service.store_weather.assert_called_once_with(Frequency.DAY, "Warsaw", "Poland", ["daily"])
+
+
+def test_get_weathers_reads_weather_cached_by_lock_holder(mock_database_service, mock_location_provider,
+                                                          mock_weather_provider):
+    flight_lock = MagicMock()
+    flight_lock.acquire.return_value = "token"
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service,
+                                     single_flight=SingleFlight(), flight_lock=flight_lock)
+    # Both frequencies miss the cache, and the hourly weather is cached by the holder of its lock meanwhile.
+    mock_database_service.get_weather.side_effect = [None, None, ["cached hourly"], None]
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_daily.return_value = ["daily"]
+
+    weathers = weather_manager.get_weathers([Frequency.HOUR, Frequency.DAY], "Warsaw", "Poland")
+
+    assert weathers == {Frequency.HOUR: ["cached hourly"], Frequency.DAY: ["daily"]}
+    date = datetime.now().strftime("%Y-%m-%d")
+    assert [call.args[0] for call in flight_lock.acquire.call_args_list] == [
+        f"hour:Warsaw:Poland:{date}",
+        f"day:Warsaw:Poland:{date}",
+    ]
+    assert flight_lock.release.call_count == 2
+    mock_weather_provider.get_weather_combined.assert_not_called()
+    mock_location_provider.get_location.assert_called_once_with("Warsaw", "Poland")
+
+
+def test_get_weathers_coalesces_with_get_weather(mock_database_service, mock_location_provider,
+                                                 mock_weather_provider):
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service,
+                                     single_flight=SingleFlight())
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def get_weather_daily(latitude, longitude):
+        fetching.set()
+        release.wait(5)
+        return ["daily"]
+
+    mock_weather_provider.get_weather_daily.side_effect = get_weather_daily
+
+    with ThreadPoolExecutor(2) as executor:
+        leader = executor.submit(weather_manager.get_weather, Frequency.DAY, "Warsaw", "Poland")
+        fetching.wait(5)
+        follower = executor.submit(weather_manager.get_weathers, [Frequency.DAY], "Warsaw", "Poland")
+        while mock_database_service.get_weather.call_count < 2:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        release.set()
+
+    assert leader.result() == ["daily"]
+    assert follower.result() == {Frequency.DAY: ["daily"]}
+    mock_weather_provider.get_weather_daily.assert_called_once()
+
+
+def test_get_weathers_from_database(mock_database_service, mock_location_provider, weather_manager):
+    mock_database_service.get_weather.return_value = ["cached"]
+    assert weather_manager.get_weathers([Frequency.DAY], "Warsaw", "Poland") == {Frequency.DAY: ["cached"]}
+    mock_location_provider.get_location.assert_not_called()
+
+
+def test_get_weather_batch(mock_database_service, mock_location_provider, mock_weather_provider, weather_manager):
+    mock_database_service.get_weather.side_effect = [["cached"], None, None]
+    mock_location_provider.get_location.side_effect = [None, (52.23, 21.01)]
+    mock_weather_provider.get_weather_daily_batch.return_value = [["fetched"]]
+
+    weathers = weather_manager.get_weather_batch(
+        Frequency.DAY, [("Berlin", "Germany"), ("Nowhere", "None"), ("Warsaw", "Poland"), ("Berlin", "Germany")]
+    )
+
+    assert weathers == {("Berlin", "Germany"): ["cached"], ("Warsaw", "Poland"): ["fetched"]}
+    mock_weather_provider.get_weather_daily_batch.assert_called_once_with([(52.23, 21.01)])
+    mock_database_service.store_weather.assert_called_once_with(Frequency.DAY, "Warsaw", "Poland", ["fetched"])
+
+
+def test_empty_weather_is_not_stored(mock_database_service, mock_location_provider, mock_weather_provider,
+                                    weather_manager):
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_daily.return_value = []
+    mock_weather_provider.get_weather_daily_batch.return_value = [[]]
+
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == []
+    assert weather_manager.get_weather_batch(Frequency.DAY, [("Warsaw", "Poland")]) == {("Warsaw", "Poland"): []}
+    mock_database_service.store_weather.assert_not_called()
+
+
+def test_get_measurements_combined_does_not_store_empty_weather(mock_database_service, mock_location_provider,
+                                                                mock_weather_provider):
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service,
+                                     combined=True)
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_combined.return_value = (["hourly"], [])
+
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == []
+    mock_database_service.store_weathers.assert_called_once_with("Warsaw", "Poland", {Frequency.HOUR: ["hourly"]})
+
+    mock_weather_provider.get_weather_combined.return_value = ([], [])
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == []
+    mock_database_service.store_weathers.assert_called_once()
+
+
+def test_get_measurements_coalesces_concurrent_misses(mock_database_service, mock_location_provider,
+                                                      mock_weather_provider):
+    metrics = RunMetrics()
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service, metrics,
+                                     single_flight=SingleFlight())
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    fetching = threading.Event()
+    release = threading.Event()
+
+    def get_weather_hourly(latitude, longitude):
+        fetching.set()
+        release.wait(5)
+        return ["fetched"]
+
+    mock_weather_provider.get_weather_hourly.side_effect = get_weather_hourly
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(weather_manager.get_weather, Frequency.HOUR, "Warsaw", "Poland")
+        fetching.wait(5)
+        followers = [executor.submit(weather_manager.get_weather, Frequency.HOUR, "Warsaw", "Poland")
+                     for _ in range(3)]
+        while mock_database_service.get_weather.call_count < 4:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        release.set()
+        results = [leader.result()] + [follower.result() for follower in followers]
+
+    assert results == [["fetched"]] * 4
+    mock_location_provider.get_location.assert_called_once_with("Warsaw", "Poland")
+    mock_weather_provider.get_weather_hourly.assert_called_once()
+    mock_database_service.store_weather.assert_called_once()
+    assert metrics.counters["coalesced_misses"] == 3
+
+
+def test_get_measurements_reads_weather_cached_by_lock_holder(mock_database_service, mock_location_provider,
+                                                              mock_weather_provider):
+    flight_lock = MagicMock()
+    flight_lock.acquire.return_value = "token"
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service,
+                                     flight_lock=flight_lock)
+    mock_database_service.get_weather.side_effect = [None, ["cached"]]
+
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == ["cached"]
+
+    key = f"day:Warsaw:Poland:{datetime.now().strftime('%Y-%m-%d')}"
+    flight_lock.acquire.assert_called_once_with(key)
+    flight_lock.release.assert_called_once_with(key, "token")
+    mock_weather_provider.get_weather_daily.assert_not_called()
+
+
+def test_get_measurements_fetches_without_lock(mock_database_service, mock_location_provider,
+                                               mock_weather_provider):
+    flight_lock = MagicMock()
+    flight_lock.acquire.side_effect = ConnectionError("Redis unavailable")
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service,
+                                     flight_lock=flight_lock)
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_daily.return_value = ["fetched"]
+
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == ["fetched"]
+    flight_lock.release.assert_not_called()
+
+
+def test_get_measurements_combined(mock_database_service, mock_location_provider, mock_weather_provider):
+    weather_manager = WeatherManager(mock_weather_provider, mock_location_provider, mock_database_service,
+                                     combined=True)
+    mock_database_service.get_weather.return_value = None
+    mock_location_provider.get_location.return_value = (52.23, 21.01)
+    mock_weather_provider.get_weather_combined.return_value = (["hourly"], ["daily"])
+
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == ["daily"]
+    mock_database_service.store_weathers.assert_called_once_with(
+        "Warsaw", "Poland", {Frequency.HOUR: ["hourly"], Frequency.DAY: ["daily"]}
+    )
+
+    mock_database_service.get_weather.side_effect = [None, ["cached hourly"]]
+    mock_weather_provider.get_weather_daily.return_value = ["daily"]
+    assert weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland") == ["daily"]
+    mock_weather_provider.get_weather_combined.assert_called_once()
+    mock_database_service.store_weather.assert_called_once_with(Frequency.DAY, "Warsaw", "Poland", ["daily"])
+
+
+def test_async_get_weather_from_provider(mock_database_service):
+    location_provider = AsyncMock()
+    location_provider.get_location.return_value = (52.23, 21.01)
+    weather_provider = AsyncMock()
+    weather_provider.get_weather_hourly.return_value = ["fetched"]
+    metrics = RunMetrics()
+    weather_manager = AsyncWeatherManager(weather_provider, location_provider, mock_database_service, metrics=metrics)
+    mock_database_service.get_weather.return_value = None
+
+    assert asyncio.run(weather_manager.get_weather(Frequency.HOUR, "Warsaw", "Poland")) == ["fetched"]
+    location_provider.get_location.assert_awaited_once_with("Warsaw", "Poland")
+    weather_provider.get_weather_hourly.assert_awaited_once_with(52.23, 21.01)
+    mock_database_service.store_weather.assert_called_once_with(Frequency.HOUR, "Warsaw", "Poland", ["fetched"])
+    assert metrics.counters["cache_misses"] == 1
+
+    mock_database_service.get_weather.return_value = ["cached"]
+    assert asyncio.run(weather_manager.get_weather(Frequency.HOUR, "Warsaw", "Poland")) == ["cached"]
+    assert metrics.counters["cache_hits"] == 1
+
+
+def test_async_get_weather_reads_weather_cached_by_lock_holder(mock_database_service):
+    flight_lock = MagicMock()
+    flight_lock.acquire.return_value = "token"
+    weather_provider = AsyncMock()
+    weather_manager = AsyncWeatherManager(weather_provider, AsyncMock(), mock_database_service,
+                                          flight_lock=flight_lock)
+    mock_database_service.get_weather.side_effect = [None, ["cached"]]
+
+    assert asyncio.run(weather_manager.get_weather(Frequency.DAY, "Warsaw", "Poland")) == ["cached"]
+
+    key = f"day:Warsaw:Poland:{datetime.now().strftime('%Y-%m-%d')}"
+    flight_lock.release.assert_called_once_with(key, "token")
+    weather_provider.get_weather_daily.assert_not_awaited()
+
+
+def test_async_get_weather_combined(mock_database_service):
+    location_provider = AsyncMock()
+    location_provider.get_location.return_value = (52.23, 21.01)
+    weather_provider = AsyncMock()
+    weather_provider.get_weather_combined.return_value = (["hourly"], [])
+    weather_manager = AsyncWeatherManager(weather_provider, location_provider, mock_database_service, combined=True)
+    mock_database_service.get_weather.return_value = None
+
+    assert asyncio.run(weather_manager.get_weather(Frequency.HOUR, "Warsaw", "Poland")) == ["hourly"]
+    mock_database_service.store_weathers.assert_called_once_with("Warsaw", "Poland", {Frequency.HOUR: ["hourly"]})
+
+
+def test_async_get_weather_unknown_location(mock_database_service):
+    location_provider = AsyncMock()
+    location_provider.get_location.return_value = None
+    weather_manager = AsyncWeatherManager(AsyncMock(), location_provider, mock_database_service)
+    mock_database_service.get_weather.return_value = None
+
+    with pytest.raises(ValueError):
+        asyncio.run(weather_manager.get_weather(Frequency.DAY, "Atlantis", "Nowhere"))
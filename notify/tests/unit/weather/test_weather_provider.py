@@ -1,12 +1,17 @@
+import asyncio
 import json
 from unittest.mock import MagicMock
 
+import httpx
 import pytest
 import requests
 
+from notify.app import http_client
+from notify.app.deadline import Deadline
+from notify.exceptions.exceptions import DeadlineExceededException
 from notify.weather.weather_provider import (OPEN_MATEO_CONFIG,
-                                             DayMeasurements, HourMeasurements,
-                                             OpenMeteo)
+                                             AsyncOpenMeteo, DayMeasurements,
+                                             HourMeasurements, OpenMeteo)
 
 
 @pytest.fixture(scope="session")
@@ -63,7 +68,7 @@ def test_get_weather_daily(om_config, monkeypatch):
     mock_get = MagicMock()
     mock_get.return_value = MagicMock(ok=True, json=lambda: mock_results)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(http_client, "get", mock_get)
 
     provider = OpenMeteo()
     provider.config = om_config
@@ -89,7 +94,7 @@ def test_get_weather_hourly(om_config, monkeypatch):
     mock_get = MagicMock()
     mock_get.return_value = MagicMock(ok=True, json=lambda: mock_results)
 
-    monkeypatch.setattr(requests, "get", mock_get)
+    monkeypatch.setattr(http_client, "get", mock_get)
 
     provider = OpenMeteo()
     provider.config = om_config
@@ -112,3 +117,106 @@ def test_get_weather_hourly(om_config, monkeypatch):
         ),
     ]
     assert measurements == expected_measurements
+
+
+def test_get_weather_after_deadline(monkeypatch):
+    get = MagicMock()
+    monkeypatch.setattr(http_client, "get", get)
+    provider = OpenMeteo(Deadline(0))
+
+    with pytest.raises(DeadlineExceededException):
+        provider.get_weather_hourly(52.23, 21.01)
+    get.assert_not_called()
+
+
+def test_get_weather_daily_batch(monkeypatch):
+    def daily(day):
+        return {
+            "daily": {
+                "time": [day],
+                "temperature_2m_min": [-5.0],
+                "temperature_2m_max": [5.0],
+                "precipitation_sum": [0.0],
+                "precipitation_probability_max": [0.0],
+            }
+        }
+
+    responses = [[daily("2022-01-01"), daily("2022-01-02")], daily("2022-01-03")]
+    get = MagicMock(side_effect=[MagicMock(json=lambda r=r: r) for r in responses])
+    monkeypatch.setattr(http_client, "get", get)
+
+    provider = OpenMeteo(batch_size=2)
+    measurements = provider.get_weather_daily_batch([(52.23, 21.01), (52.52, 13.4), (50.06, 19.94)])
+
+    assert [[m.date for m in location] for location in measurements] == [["2022-01-01"], ["2022-01-02"],
+                                                                         ["2022-01-03"]]
+    assert get.call_count == 2
+    assert "latitude=52.23,52.52&longitude=21.01,13.4&daily=" in get.call_args_list[0].args[0]
+    assert "latitude=50.06&longitude=19.94&daily=" in get.call_args_list[1].args[0]
+
+
+def test_get_weather_hourly_batch_failed_request(monkeypatch):
+    monkeypatch.setattr(http_client, "get", MagicMock(side_effect=requests.exceptions.Timeout))
+    assert OpenMeteo().get_weather_hourly_batch([(52.23, 21.01), (52.52, 13.4)]) == [[], []]
+
+
+def test_async_open_meteo_matches_open_meteo(monkeypatch):
+    results = {
+        "hourly": {
+            "time": ["2022-01-01T00:00:00Z"],
+            "temperature_2m": [0.0],
+            "relativehumidity_2m": [50.0],
+            "precipitation": [0.0],
+            "precipitation_probability": [0.0],
+        }
+    }
+    urls = []
+
+    async def aget(url, timeout, deadline=None):
+        urls.append(url)
+        return MagicMock(json=lambda: results)
+
+    monkeypatch.setattr(http_client, "aget", aget)
+    monkeypatch.setattr(http_client, "get", MagicMock(return_value=MagicMock(json=lambda: results)))
+
+    measurements = asyncio.run(AsyncOpenMeteo().get_weather_hourly(52.23, 21.01))
+
+    assert measurements == OpenMeteo().get_weather_hourly(52.23, 21.01)
+    assert urls == [OpenMeteo()._format_url_hourly(52.23, 21.01)]
+
+
+def test_async_open_meteo_failed_request(monkeypatch):
+    async def aget(url, timeout, deadline=None):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(http_client, "aget", aget)
+    assert asyncio.run(AsyncOpenMeteo().get_weather_daily(52.23, 21.01)) == []
+
+
+def test_get_weather_combined(monkeypatch):
+    results = {
+        "hourly": {
+            "time": ["2022-01-01T23:00", "2022-01-02T00:00"],
+            "temperature_2m": [0.0, 1.0],
+            "relativehumidity_2m": [50.0, 60.0],
+            "precipitation": [0.0, 0.1],
+            "precipitation_probability": [0.0, 20.0],
+        },
+        "daily": {
+            "time": ["2022-01-01", "2022-01-02"],
+            "temperature_2m_min": [-5.0, -3.0],
+            "temperature_2m_max": [5.0, 4.0],
+            "precipitation_sum": [0.0, 1.0],
+            "precipitation_probability_max": [0.0, 20.0],
+        },
+    }
+    get = MagicMock(return_value=MagicMock(json=lambda: results))
+    monkeypatch.setattr(http_client, "get", get)
+
+    hourly, daily = OpenMeteo().get_weather_combined(52.23, 21.01)
+
+    assert hourly == [HourMeasurements("2022-01-01T23:00", 0.0, 50.0, 0.0, 0.0)]
+    assert [day.date for day in daily] == ["2022-01-01", "2022-01-02"]
+    get.assert_called_once()
+    assert "&hourly=" in get.call_args.args[0] and "&daily=" in get.call_args.args[0]
+    assert "forecast_days" not in get.call_args.args[0]
@@ -0,0 +1,174 @@
+"""
+Threshold alerts evaluated against forecasts.
+
+An alert event holds a single rule, such as "precipitation_probability > 70" or "temperature < 0".
+A rule is triggered if the forecast of the report period crosses the threshold at any time.
+
+Rules of all subscribers of a location are evaluated at once by `AlertIndex`. The extremes of every measure
+are computed once per forecast, and the rules are kept sorted by threshold, so the triggered rules are found
+with a binary search instead of comparing every rule with every hour of the forecast.
+"""
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Generic, Iterable, Iterator, TypeVar
+
+from notify.models.event import Event
+from notify.models.measurements import DayMeasurements, HourMeasurements
+from notify.models.query_params import Frequency
+
+T = TypeVar("T")
+
+MEASURES = ("temperature", "humidity", "precipitation", "precipitation_probability")
+# The daily forecast has no humidity, so a daily rule on it would never be triggered.
+FREQUENCY_MEASURES = {
+    Frequency.HOUR: MEASURES,
+    Frequency.DAY: ("temperature", "precipitation", "precipitation_probability"),
+}
+ABOVE = ">"
+BELOW = "<"
+
+
+@dataclass(frozen=True)
+class AlertRule:
+    """
+    Condition of an alert event.
+
+    Attributes:
+        measure: A string representing the measure compared with the threshold, one of `MEASURES`.
+        operator: A string, ">" if the alert is triggered above the threshold, or "<" if below it.
+        threshold: A float representing the threshold of the measure.
+    """
+
+    measure: str
+    operator: str
+    threshold: float
+
+    @classmethod
+    def from_event(cls, event: Event) -> "AlertRule":
+        return cls(event.alert_measure, event.alert_operator, event.alert_threshold)
+
+    def __str__(self) -> str:
+        return f"{self.measure} {self.operator} {self.threshold:g}"
+
+
+@dataclass(frozen=True)
+class Alert:
+    """
+    A triggered alert rule.
+
+    Attributes:
+        rule: An `AlertRule` object representing the triggered rule.
+        value: A float representing the extreme value of the measure which crossed the threshold.
+        date: A string representing the date of the measurement with that value.
+    """
+
+    rule: AlertRule
+    value: float
+    date: str
+
+
+@dataclass(frozen=True)
+class Extremes:
+    """Lowest and highest value of a measure in a forecast, with the dates they occur at."""
+
+    low: float
+    low_date: str
+    high: float
+    high_date: str
+
+
+def extremes(weather: Iterable[HourMeasurements | DayMeasurements], measure: str) -> Extremes | None:
+    """
+    Finds the lowest and highest value of a measure in a forecast.
+
+    The temperature of a `DayMeasurements` object is a (min, max) range, so its minimum counts as the low
+    and its maximum as the high.
+
+    Args:
+        weather: An iterable of `HourMeasurements` or `DayMeasurements` objects.
+        measure: A string representing the measure, one of `MEASURES`.
+
+    Returns:
+        An `Extremes` object, or None if the forecast has no values of the measure.
+    """
+    result = None
+    for measurement in weather:
+        value = getattr(measurement, measure, None)
+        if value is None:
+            continue
+        low, high = value if isinstance(value, tuple) else (value, value)
+        if result is None:
+            result = [low, measurement.date, high, measurement.date]
+            continue
+        if low < result[0]:
+            result[0:2] = low, measurement.date
+        if high > result[2]:
+            result[2:4] = high, measurement.date
+    return None if result is None else Extremes(*result)
+
+
+def evaluate(rule: AlertRule, weather: Iterable[HourMeasurements | DayMeasurements]) -> Alert | None:
+    """
+    Evaluates a single rule against a forecast.
+
+    Returns:
+        An `Alert` object if the rule is triggered, otherwise None.
+    """
+    found = extremes(weather, rule.measure)
+    if found is None:
+        return None
+    if rule.operator == ABOVE and found.high > rule.threshold:
+        return Alert(rule, found.high, found.high_date)
+    if rule.operator == BELOW and found.low < rule.threshold:
+        return Alert(rule, found.low, found.low_date)
+    return None
+
+
+class AlertIndex(Generic[T]):
+    """
+    Alert rules sorted by threshold for every measure and operator.
+
+    Rules above a threshold are triggered if the threshold is lower than the highest value of the measure,
+    which are the rules before the insertion point of that value. Rules below a threshold are triggered
+    if the threshold is higher than the lowest value, which are the rules after its insertion point.
+
+    Attributes:
+        items: A dictionary mapping (measure, operator) to a tuple of the sorted thresholds and the items
+            with the rules, in the same order.
+    """
+
+    def __init__(self, rules: Iterable[tuple[AlertRule, T]]) -> None:
+        grouped: dict[tuple[str, str], list[tuple[float, int, AlertRule, T]]] = {}
+        for position, (rule, item) in enumerate(rules):
+            grouped.setdefault((rule.measure, rule.operator), []).append((rule.threshold, position, rule, item))
+
+        self.items: dict[tuple[str, str], tuple[list[float], list[tuple[AlertRule, T]]]] = {}
+        for key, entries in grouped.items():
+            entries.sort(key=lambda entry: (entry[0], entry[1]))
+            self.items[key] = ([entry[0] for entry in entries], [(entry[2], entry[3]) for entry in entries])
+
+    def __len__(self) -> int:
+        return sum(len(thresholds) for thresholds, _ in self.items.values())
+
+    def triggered(self, weather: list[HourMeasurements] | list[DayMeasurements]) -> Iterator[tuple[T, Alert]]:
+        """
+        Evaluates all rules against a forecast.
+
+        Args:
+            weather: A list of `HourMeasurements` or `DayMeasurements` objects of a single location.
+
+        Yields:
+            Tuples of an item and the `Alert` of its rule, for every triggered rule.
+        """
+        found = {measure: extremes(weather, measure) for measure in {measure for measure, _ in self.items}}
+        for (measure, operator), (thresholds, items) in self.items.items():
+            if (values := found[measure]) is None:
+                continue
+            if operator == ABOVE:
+                matched = items[: bisect_left(thresholds, values.high)]
+                value, date = values.high, values.high_date
+            else:
+                matched = items[bisect_right(thresholds, values.low):]
+                value, date = values.low, values.low_date
+            for rule, item in matched:
+                yield item, Alert(rule, value, date)
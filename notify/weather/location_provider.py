@@ -1,8 +1,11 @@
 import json
 
+import httpx
 import requests
 from geopy.geocoders import Nominatim
 
+from notify.app import http_client
+from notify.app.deadline import Deadline, call_timeout
 from notify.app.logger import LoggerType, create_logger
 
 from . import OPEN_MATEO_CONFIG
@@ -33,21 +36,21 @@ class NominatimLocationProvider:
         return location.latitude, location.longitude  # type: ignore
 
 
-class OpenMeteoLocationProvider:
+class OpenMeteoLocationBase:
     """
-    Location provider using the OpenMeteo API.
-
-    This class provides a method for retrieving the latitude and longitude
-    of a given city and country using the OpenMeteo API.
+    Configuration, URLs and response parsing shared by the blocking and async OpenMeteo location providers.
 
     Attributes:
         config: A dictionary representing the configuration for the OpenMeteo API.
+        deadline: An optional `Deadline` object limiting the timeouts of the requests.
     """
 
     config: dict
+    timeout: float = 10
 
-    def __init__(self) -> None:
+    def __init__(self, deadline: Deadline | None = None) -> None:
         logger.info("Initializing location provider")
+        self.deadline = deadline
 
         with open(OPEN_MATEO_CONFIG) as f:
             self.config = json.load(f)
@@ -56,6 +59,39 @@ class OpenMeteoLocationProvider:
             logger.exception("OpenMeteo config not found")
             raise ValueError("OpenMeteo config not found")
 
+    def get_url(self, city: str, country: str) -> str:
+        """
+        Generate the URL for the OpenMeteo API based on the given city and country.
+
+        Args:
+            city: A string representing the city for which to generate the URL.
+            country: A string representing the country for which to generate the URL.
+
+        Returns:
+            A string representing the URL for the OpenMeteo API.
+        """
+        base_url = self.config["base_url_location"]
+        return f"{base_url}?name={city}%2C+{country}&count=1&language=en&format=json"
+
+    @staticmethod
+    def _best_match(location: dict | None, city: str, country: str) -> dict | None:
+        if location is None:
+            return location
+
+        if location.get("results") is None:
+            logger.warning(f"Location not found for {city}, {country}")
+            return None
+        return location["results"][0]
+
+
+class OpenMeteoLocationProvider(OpenMeteoLocationBase):
+    """
+    Location provider using the OpenMeteo API.
+
+    This class provides a method for retrieving the latitude and longitude
+    of a given city and country using the OpenMeteo API.
+    """
+
     def get_location(self, city: str, country: str) -> tuple[float, float] | None:
         """
         Retrieve the latitude and longitude of a location using the OpenMeteo API.
@@ -69,40 +105,111 @@ class OpenMeteoLocationProvider:
                 if the location could not be found.
         """
 
+        result = self.search(city, country)
+        if result is None:
+            return None
+        latitude, longitude = result["latitude"], result["longitude"]
+        return latitude, longitude
+
+    def get_timezone(self, city: str, country: str) -> str | None:
+        """
+        Retrieve the IANA timezone of a location using the OpenMeteo API.
+
+        Args:
+            city: A string representing the city for which to retrieve the timezone.
+            country: A string representing the country for which to retrieve the timezone.
+
+        Returns:
+            A string representing the timezone of the location (e.g. "Europe/Warsaw"), or None
+                if the location could not be found.
+        """
+        result = self.search(city, country)
+        if result is None:
+            return None
+        return result.get("timezone")
+
+    def search(self, city: str, country: str) -> dict | None:
+        """
+        Retrieve the best match for a location from the OpenMeteo geocoding API.
+
+        Args:
+            city: A string representing the city to search for.
+            country: A string representing the country to search for.
+
+        Returns:
+            A dictionary with the location data returned by the API, or None if the location could not be found.
+        """
         location = None
 
         if city in [None, ""] or country in [None, ""]:
             return location
 
+        timeout = call_timeout(self.deadline, self.timeout, "geocoding request")
         try:
             url = self.get_url(city, country)
             logger.debug(f"Url <{url}> | {city}, {country}")
-            location = requests.get(url, timeout=(10, 10)).json()
+            location = http_client.get(url, timeout, self.deadline).json()
         except requests.exceptions.Timeout as e:
             logger.exception(f"Timeout while getting location for {city}, {country}")
         except Exception as e:
             logger.exception(f"Error {e} while getting location for {city}, {country}")
 
-        if location is None:
-            return location
+        return self._best_match(location, city, country)
 
-        if location.get("results") is None:
-            logger.warning(f"Location not found for {city}, {country}")
+
+class AsyncOpenMeteoLocationProvider(OpenMeteoLocationBase):
+    """
+    Location provider using the OpenMeteo API without blocking the event loop.
+
+    It returns the same locations as `OpenMeteoLocationProvider`, but its methods are awaitable,
+    so a single process can keep many requests in flight.
+    """
+
+    async def get_location(self, city: str, country: str) -> tuple[float, float] | None:
+        """
+        Retrieve the latitude and longitude of a location using the OpenMeteo API.
+
+        Returns:
+            A tuple of floats representing the latitude and longitude of the location, or None
+                if the location could not be found.
+        """
+        result = await self.search(city, country)
+        if result is None:
             return None
-        results: dict[str, float] = location["results"][0]
-        latitude, longitude = results["latitude"], results["longitude"]
-        return latitude, longitude
+        return result["latitude"], result["longitude"]
 
-    def get_url(self, city: str, country: str) -> str:
+    async def get_timezone(self, city: str, country: str) -> str | None:
         """
-        Generate the URL for the OpenMeteo API based on the given city and country.
+        Retrieve the IANA timezone of a location using the OpenMeteo API.
 
-        Args:
-            city: A string representing the city for which to generate the URL.
-            country: A string representing the country for which to generate the URL.
+        Returns:
+            A string representing the timezone of the location, or None if the location could not be found.
+        """
+        result = await self.search(city, country)
+        if result is None:
+            return None
+        return result.get("timezone")
+
+    async def search(self, city: str, country: str) -> dict | None:
+        """
+        Retrieve the best match for a location from the OpenMeteo geocoding API.
 
         Returns:
-            A string representing the URL for the OpenMeteo API.
+            A dictionary with the location data returned by the API, or None if the location could not be found.
         """
-        base_url = self.config["base_url_location"]
-        return f"{base_url}?name={city}%2C+{country}&count=1&language=en&format=json"
+        location = None
+
+        if city in [None, ""] or country in [None, ""]:
+            return location
+
+        timeout = call_timeout(self.deadline, self.timeout, "geocoding request")
+        try:
+            url = self.get_url(city, country)
+            logger.debug(f"Url <{url}> | {city}, {country}")
+            location = (await http_client.aget(url, timeout, self.deadline)).json()
+        except httpx.TimeoutException:
+            logger.exception(f"Timeout while getting location for {city}, {country}")
+        except Exception as e:
+            logger.exception(f"Error {e} while getting location for {city}, {country}")
+
+        return self._best_match(location, city, country)
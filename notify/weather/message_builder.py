@@ -5,6 +5,8 @@ from notify.models.event import Event
 from notify.models.measurements import DayMeasurements, HourMeasurements
 from notify.models.query_params import EventType, Frequency
 
+from .alerts import Alert, AlertRule, evaluate
+
 logger = create_logger(LoggerType.MAIL, "MESSAGE_BUILDER")
 
 
@@ -27,16 +29,20 @@ class TextMessageBuilder:
             EventType.PRECIPITATION: self.get_precipitation,
         }
 
-    def compose_message(self, event: Event, weather: list[HourMeasurements] | list[DayMeasurements]):
+    def compose_message(
+        self, event: Event, weather: list[HourMeasurements] | list[DayMeasurements], alert: Alert | None = None
+    ):
         """
         Compose a text message from an event and weather data.
 
         This method composes a text message from an event and weather data.
         It calls the appropriate method for composing an hourly or daily message based on the event frequency.
+        Alert events get a short alert message instead, only if their rule is triggered.
 
         Args:
             event: An `Event` object representing the event for which to compose the message.
             weather: A list of `HourMeasurements` or `DayMeasurements` objects representing the weather data.
+            alert: An optional `Alert` object of an alert event, if its rule was already evaluated.
 
         Returns:
             A tuple containing the title and message of the text message, or tuple of None, None
@@ -48,6 +54,8 @@ class TextMessageBuilder:
         event_frequency = event.frequency
         title = f"Weather report for {event.city}"
 
+        if event_type == EventType.ALERT:
+            return self.compose_alert_message(event, weather, alert)
         if event_frequency == Frequency.HOUR:
             message = self.compose_hourly_message(weather, event_type)  # type: ignore
         elif event_frequency == Frequency.DAY:
@@ -57,6 +65,49 @@ class TextMessageBuilder:
             return None, None
         return title, message
 
+    def compose_alert_message(
+        self, event: Event, weather: list[HourMeasurements] | list[DayMeasurements], alert: Alert | None = None
+    ) -> tuple[str, str] | tuple[None, None]:
+        """
+        Compose an alert message if the rule of an alert event is triggered by the forecast.
+
+        Args:
+            event: An `Event` object of type `EventType.ALERT`.
+            weather: A list of `HourMeasurements` or `DayMeasurements` objects representing the weather data.
+            alert: An optional `Alert` object representing the triggered rule. The rule is evaluated against
+                the weather if not given.
+
+        Returns:
+            A tuple containing the title and message of the alert, or tuple of None, None if the rule
+                is not triggered.
+        """
+        if event.alert_measure is None or event.alert_threshold is None:
+            logger.info(f"Alert event #{event.event_id} has no rule")
+            return None, None
+        rule = AlertRule.from_event(event)
+        if alert is None:
+            alert = evaluate(rule, weather)
+        if alert is None:
+            return None, None
+        title = f"Weather alert for {event.city}"
+        message = f"Alert {rule} for {event.city}, {event.country}: {rule.measure} of {alert.value} at {alert.date}."
+        return title, message
+
+    def compose_digest(self, sections: list[tuple[str, str]]) -> tuple[str, str]:
+        """
+        Compose a single message from the reports of several events of a user.
+
+        Args:
+            sections: A list of tuples containing the title and message of every report.
+
+        Returns:
+            A tuple containing the title and message of the digest.
+        """
+        separator = "\n" + "-" * 40 + "\n\n"
+        title = f"Weather digest ({len(sections)} reports)"
+        message = separator.join(f"{section_title}\n\n{section}" for section_title, section in sections)
+        return title, message
+
     def compose_hourly_message(self, weather: list[HourMeasurements], event_type: EventType) -> str | None:
         """
         Compose an hourly message from a list of `HourMeasurements` objects.
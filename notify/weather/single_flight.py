@@ -0,0 +1,133 @@
+"""
+Coalescing of concurrent identical weather lookups.
+
+When the cache of a popular location expires, e.g. right after the date rolls over, many callers miss it
+at the same moment. `SingleFlight` lets one thread of a process fetch the weather, while the other threads
+asking for the same key wait for its result. `RedisFlightLock` does the same across processes: the holder
+of the lock fetches and caches the weather, and the others wait for the lock and then read the cache.
+"""
+import time
+from threading import Event, Lock
+from typing import Callable, Generic, Protocol, TypeVar
+from uuid import uuid4
+
+from redis import Redis
+
+from notify.app.logger import LoggerType, create_logger
+
+logger = create_logger(LoggerType.WEATHER, "SINGLE_FLIGHT")
+
+T = TypeVar("T")
+
+# The lock is deleted only if it still holds our token, so a lock which expired and was taken
+# by another process is never released by the previous holder.
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class Flight(Generic[T]):
+    """A call in progress, with the result or exception shared with every waiting caller."""
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    In-process coalescing of concurrent calls with the same key.
+
+    The first caller of a key runs the function. Callers arriving while it runs wait for it and get the same
+    result, or the same exception. Once the call is finished, the next caller of the key runs the function again,
+    so results are never kept longer than a single call.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, Flight[T]] = {}
+        self._lock = Lock()
+
+    def do(self, key: str, function: Callable[[], T]) -> tuple[T, bool]:
+        """
+        Call a function, unless a call with the same key is in progress.
+
+        Returns:
+            A tuple of the result of the function and a boolean indicating whether the result was shared
+                by a call in progress.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True  # type: ignore
+
+        try:
+            flight.result = function()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+class FlightLock(Protocol):
+    def acquire(self, key: str) -> str | None:
+        ...
+
+    def release(self, key: str, token: str) -> None:
+        ...
+
+
+class RedisFlightLock:
+    """
+    Lock shared by all processes fetching the weather of the same location.
+
+    `acquire` waits until the lock is free, up to `wait` seconds. A lock of a crashed process expires
+    after `ttl` seconds, so waiting callers do not block for longer than that.
+
+    Attributes:
+        client: A `Redis` object representing the Redis connection to use.
+        ttl: A float representing the number of seconds the lock is held at most.
+        wait: A float representing the number of seconds a caller waits for the lock before fetching anyway.
+        poll: A float representing the number of seconds between attempts to take the lock.
+    """
+
+    prefix = "notify:flight"
+
+    def __init__(self, client: Redis, ttl: float = 30, wait: float = 30, poll: float = 0.05) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.wait = wait
+        self.poll = poll
+
+    def acquire(self, key: str) -> str | None:
+        """
+        Take the lock of a key, waiting while another process holds it.
+
+        Returns:
+            A string representing the token of the lock, or None if the lock was not taken within `wait` seconds.
+        """
+        token = uuid4().hex
+        expires_at = time.monotonic() + self.wait
+        while not self.client.set(f"{self.prefix}:{key}", token, nx=True, px=int(self.ttl * 1000)):
+            if time.monotonic() >= expires_at:
+                logger.warning(f"Lock {key} not taken within {self.wait} s")
+                return None
+            time.sleep(self.poll)
+        return token
+
+    def release(self, key: str, token: str) -> None:
+        self.client.eval(RELEASE_SCRIPT, 1, f"{self.prefix}:{key}", token)
@@ -1,10 +1,14 @@
+import asyncio
+from contextlib import AbstractContextManager, nullcontext
 from datetime import datetime
-from typing import Protocol
+from functools import cache, partial
+from typing import Callable, Protocol
 
 from notify.app.logger import LoggerType, create_logger
 from notify.models.measurements import DayMeasurements, HourMeasurements
 from notify.models.query_params import Frequency
 
+from .single_flight import FlightLock, SingleFlight
 from .weather_provider import WeatherProvider
 
 logger = create_logger(LoggerType.WEATHER, "WEATHER_MANAGER")
@@ -15,16 +19,47 @@ class LocationProvider(Protocol):
         ...
 
 
+class AsyncLocationProvider(Protocol):
+    async def get_location(self, city: str, country: str) -> tuple[float, float] | None:
+        ...
+
+
+class AsyncWeatherProvider(Protocol):
+    async def get_weather_daily(self, latitude: float, longitude: float) -> list[DayMeasurements]:
+        ...
+
+    async def get_weather_hourly(self, latitude: float, longitude: float) -> list[HourMeasurements]:
+        ...
+
+    async def get_weather_combined(
+        self, latitude: float, longitude: float
+    ) -> tuple[list[HourMeasurements], list[DayMeasurements]]:
+        ...
+
+
 class DatabaseService(Protocol):
     def store_weather(self, frequency, city, country, weather) -> None:
         ...
 
+    def store_weathers(
+        self, city: str, country: str, weathers: dict[Frequency, list[DayMeasurements] | list[HourMeasurements]]
+    ) -> None:
+        ...
+
     def get_weather(
         self, frequency: Frequency, city: str, country: str, date: str
     ) -> list[DayMeasurements] | list[HourMeasurements] | None:
         ...
 
 
+class Metrics(Protocol):
+    def timer(self, stage: str) -> AbstractContextManager:
+        ...
+
+    def increment(self, counter: str, number: int = 1) -> None:
+        ...
+
+
 class WeatherManager:
     """
     Weather manager for retrieving weather data.
@@ -37,16 +72,35 @@ class WeatherManager:
         weather_provider: A `WeatherProvider` object representing the weather provider to use.
         location_provider: A `LocationProvider` object representing the location provider to use.
         database_service: A `DatabaseService` object representing the database service to use.
+        metrics: An optional `Metrics` object recording cache hits and misses and the time spent
+            in the cache, geocoding and weather requests.
+        single_flight: An optional `SingleFlight` object coalescing concurrent cache misses of the same
+            location in this process, so only one caller fetches the weather and the others wait for it.
+        flight_lock: An optional `FlightLock` object coalescing cache misses across processes. The caller
+            holding the lock fetches the weather, the others read it from the cache once the lock is released.
+        combined: A boolean indicating whether a miss of one frequency fetches the hourly and daily measurements
+            with a single request and caches both, unless the other frequency is already cached.
     """
 
     measurement_type = {"day": DayMeasurements, "hour": HourMeasurements}
 
     def __init__(
-        self, weather_provider: WeatherProvider, location_provider: LocationProvider, database_service: DatabaseService
+        self,
+        weather_provider: WeatherProvider,
+        location_provider: LocationProvider,
+        database_service: DatabaseService,
+        metrics: Metrics | None = None,
+        single_flight: SingleFlight | None = None,
+        flight_lock: FlightLock | None = None,
+        combined: bool = False,
     ) -> None:
         self.weather_provider = weather_provider
         self.location_provider = location_provider
         self.database_service = database_service
+        self.metrics = metrics
+        self.single_flight = single_flight
+        self.flight_lock = flight_lock
+        self.combined = combined
 
     def get_weather(
         self, frequency: Frequency, city: str, country: str
@@ -73,6 +127,7 @@ class WeatherManager:
         This method retrieves weather measurements for a given city, country, and frequency.
         It first checks the `DatabaseService` for cached data, and if none is found,
         it retrieves data from the `WeatherProvider` and stores it in the `DatabaseService`.
+        Concurrent misses of the same location are coalesced if `single_flight` or `flight_lock` is set.
 
         Args:
             city: A string representing the city for which to retrieve the weather measurements.
@@ -86,24 +141,227 @@ class WeatherManager:
         date = datetime.now().strftime("%Y-%m-%d")
         logger.info(f"Getting weather for {city}, {country}, {date}, {frequency}")
 
-        if weather := self.database_service.get_weather(frequency, city, country, date):
+        if weather := self._get_cached(frequency, city, country, date):
             return weather
+        return self._coalesce(
+            frequency, city, country, date, lambda: self._fetch_missing(frequency, city, country, date)
+        )
+
+    def _coalesce(
+        self, frequency: Frequency, city: str, country: str, date: str, fetch: Callable[[], list]
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        """
+        Fetch the weather of a location missing in the cache with `fetch`, unless a concurrent miss of the same
+        location and frequency fetches it, in this process through `single_flight` or in another one
+        through `flight_lock`.
+        """
+        if self.single_flight is None:
+            return self._fetch_locked(frequency, city, country, date, fetch)
+        key = f"{frequency.value}:{city}:{country}:{date}"
+        weather, shared = self.single_flight.do(key, lambda: self._fetch_locked(frequency, city, country, date, fetch))
+        if shared:
+            self._increment("coalesced_misses")
+        return weather
+
+    def _fetch_locked(
+        self, frequency: Frequency, city: str, country: str, date: str, fetch: Callable[[], list]
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        """Fetch the weather of a location while holding its `flight_lock`, unless another process cached it."""
+        if self.flight_lock is None:
+            return fetch()
+
+        key = f"{frequency.value}:{city}:{country}:{date}"
+        token = None
+        try:
+            token = self.flight_lock.acquire(key)
+        except Exception as e:
+            logger.exception(e)
+        try:
+            # The weather was probably fetched by the process which held the lock before.
+            with self._timer("cache_lookup"):
+                weather = self.database_service.get_weather(frequency, city, country, date)
+            if weather:
+                self._increment("coalesced_misses")
+                return weather
+            return fetch()
+        finally:
+            if token is not None:
+                self.flight_lock.release(key, token)
+
+    def _fetch_missing(
+        self, frequency: Frequency, city: str, country: str, date: str
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        location = self._get_location(city, country)
+        if not self.combined:
+            return self._fetch(frequency, city, country, location)
+
+        other = Frequency.DAY if frequency == Frequency.HOUR else Frequency.HOUR
+        with self._timer("cache_lookup"):
+            other_cached = self.database_service.get_weather(other, city, country, date)
+        if other_cached:
+            return self._fetch(frequency, city, country, location)
+        return self._fetch_combined(city, country, location)[frequency]
+
+    def get_weathers(
+        self, frequencies: list[Frequency], city: str, country: str
+    ) -> dict[Frequency, list[DayMeasurements] | list[HourMeasurements]]:
+        """
+        Retrieve weather measurements of several frequencies for a single location.
+
+        Measurements are read from the `DatabaseService` if possible. The location is looked up at most once,
+        even if the measurements of more than one frequency have to be retrieved from the `WeatherProvider`.
+        If both hourly and daily measurements are missing, they are retrieved with a single request.
+        Misses are coalesced with concurrent misses of the same frequency like in `get_weather`.
+
+        Args:
+            frequencies: A list of `Frequency` objects representing the frequencies of the measurements.
+            city: A string representing the city for which to retrieve the weather measurements.
+            country: A string representing the country for which to retrieve the weather measurements.
+
+        Returns:
+            A dictionary mapping every frequency to a list of `DayMeasurements` or `HourMeasurements` objects.
+        """
+        date = datetime.now().strftime("%Y-%m-%d")
+        logger.info(f"Getting weather for {city}, {country}, {date}, {frequencies}")
+
+        weathers = {}
+        missing = []
+        for frequency in frequencies:
+            if weather := self._get_cached(frequency, city, country, date):
+                weathers[frequency] = weather
+            else:
+                missing.append(frequency)
+
+        if not missing:
+            return weathers
+
+        location = cache(partial(self._get_location, city, country))
+        fetched: dict[Frequency, list[DayMeasurements] | list[HourMeasurements]] = {}
+
+        def fetch(frequency: Frequency) -> list[DayMeasurements] | list[HourMeasurements]:
+            # Both frequencies are fetched at once, unless the other one was cached meanwhile.
+            if any(other != frequency and other not in weathers for other in missing):
+                fetched.update(self._fetch_combined(city, country, location()))
+                return fetched[frequency]
+            return self._fetch(frequency, city, country, location())
+
+        for frequency in missing:
+            if frequency in fetched:
+                weathers[frequency] = fetched[frequency]
+            else:
+                weathers[frequency] = self._coalesce(frequency, city, country, date, partial(fetch, frequency))
+        return weathers
+
+    def get_weather_batch(
+        self, frequency: Frequency, places: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], list[DayMeasurements] | list[HourMeasurements]]:
+        """
+        Retrieve weather measurements of a single frequency for several locations.
+
+        Measurements are read from the `DatabaseService` if possible. The remaining locations are looked up
+        one by one, and their measurements are retrieved with the batch methods of the `WeatherProvider`,
+        which request many locations at once.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the weather measurements.
+            places: A list of (city, country) tuples.
+
+        Returns:
+            A dictionary mapping (city, country) to a list of `DayMeasurements` or `HourMeasurements` objects.
+                Locations which were not found are left out.
+        """
+        date = datetime.now().strftime("%Y-%m-%d")
+        logger.info(f"Getting weather for {len(places)} locations, {date}, {frequency}")
+
+        weathers = {}
+        missing = []
+        locations = []
+        for city, country in dict.fromkeys(places):
+            if weather := self._get_cached(frequency, city, country, date):
+                weathers[city, country] = weather
+                continue
+            try:
+                locations.append(self._get_location(city, country))
+                missing.append((city, country))
+            except ValueError as e:
+                logger.error(e)
+
+        if not missing:
+            return weathers
+
+        with self._timer("weather_request"):
+            if frequency == frequency.DAY:
+                received = self.weather_provider.get_weather_daily_batch(locations)
+            else:
+                received = self.weather_provider.get_weather_hourly_batch(locations)
+        logger.info(f"Weather received for {len(missing)} locations")
+
+        for (city, country), weather_received in zip(missing, received):
+            if weather_received:
+                with self._timer("cache_store"):
+                    self.database_service.store_weather(frequency, city, country, weather_received)
+            weathers[city, country] = weather_received
+        return weathers
 
-        location = self.location_provider.get_location(city, country)
+    def _get_cached(
+        self, frequency: Frequency, city: str, country: str, date: str
+    ) -> list[DayMeasurements] | list[HourMeasurements] | None:
+        with self._timer("cache_lookup"):
+            weather = self.database_service.get_weather(frequency, city, country, date)
+        self._increment("cache_hits" if weather else "cache_misses")
+        return weather
+
+    def _get_location(self, city: str, country: str) -> tuple[float, float]:
+        with self._timer("geocoding"):
+            location = self.location_provider.get_location(city, country)
         logger.info(f"Location found for {city}, {country}")
         if location is None:
             raise ValueError(f"Location not found for {city}, {country}")
+        return location
 
-        if frequency == frequency.DAY:
-            weather_received = self.weather_provider.get_weather_daily(*location)
-        else:
-            weather_received = self.weather_provider.get_weather_hourly(*location)
+    def _fetch(
+        self, frequency: Frequency, city: str, country: str, location: tuple[float, float]
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        with self._timer("weather_request"):
+            if frequency == frequency.DAY:
+                weather_received = self.weather_provider.get_weather_daily(*location)
+            else:
+                weather_received = self.weather_provider.get_weather_hourly(*location)
         logger.info(f"Weather received for {city}, {country}")
 
-        self.database_service.store_weather(frequency, city, country, weather_received)
-        logger.info(f"Weather stored for {city}, {country}")
+        # An empty result of a failed request is not cached, so the next lookup requests the weather again.
+        if weather_received:
+            with self._timer("cache_store"):
+                self.database_service.store_weather(frequency, city, country, weather_received)
+            logger.info(f"Weather stored for {city}, {country}")
         return weather_received
 
+    def _fetch_combined(
+        self, city: str, country: str, location: tuple[float, float]
+    ) -> dict[Frequency, list[DayMeasurements] | list[HourMeasurements]]:
+        with self._timer("weather_request"):
+            hourly, daily = self.weather_provider.get_weather_combined(*location)
+        logger.info(f"Hourly and daily weather received for {city}, {country}")
+        self._increment("combined_requests")
+
+        weathers: dict[Frequency, list[DayMeasurements] | list[HourMeasurements]] = {
+            Frequency.HOUR: hourly,
+            Frequency.DAY: daily,
+        }
+        received = {frequency: weather for frequency, weather in weathers.items() if weather}
+        if received:
+            with self._timer("cache_store"):
+                self.database_service.store_weathers(city, country, received)
+            logger.info(f"Weather stored for {city}, {country}")
+        return weathers
+
+    def _timer(self, stage: str) -> AbstractContextManager:
+        return nullcontext() if self.metrics is None else self.metrics.timer(stage)
+
+    def _increment(self, counter: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment(counter)
+
     def check_location(self, city: str, country: str) -> bool:
         """
         Check if a location is valid.
@@ -116,3 +374,144 @@ class WeatherManager:
             A boolean representing whether the location is valid.
         """
         return self.location_provider.get_location(city, country) is not None
+
+
+class AsyncWeatherManager:
+    """
+    Weather manager retrieving weather data without blocking the event loop.
+
+    It reads and stores the weather in the same cache as `WeatherManager`, but the location and the weather are
+    requested with awaitable providers, e.g. `AsyncOpenMeteoLocationProvider` and `AsyncOpenMeteo`, so a single
+    thread keeps many requests in flight. The cache and the `flight_lock` are short blocking calls, which run
+    in the default executor of the event loop.
+
+    Attributes:
+        weather_provider: An `AsyncWeatherProvider` object representing the weather provider to use.
+        location_provider: An `AsyncLocationProvider` object representing the location provider to use.
+        database_service: A `DatabaseService` object representing the database service to use.
+        metrics: An optional `Metrics` object, see `WeatherManager`.
+        flight_lock: An optional `FlightLock` object coalescing cache misses across processes, see `WeatherManager`.
+        combined: A boolean indicating whether a miss fetches and caches both the hourly and daily measurements,
+            see `WeatherManager`.
+    """
+
+    def __init__(
+        self,
+        weather_provider: AsyncWeatherProvider,
+        location_provider: AsyncLocationProvider,
+        database_service: DatabaseService,
+        metrics: Metrics | None = None,
+        flight_lock: FlightLock | None = None,
+        combined: bool = False,
+    ) -> None:
+        self.weather_provider = weather_provider
+        self.location_provider = location_provider
+        self.database_service = database_service
+        self.metrics = metrics
+        self.flight_lock = flight_lock
+        self.combined = combined
+
+    async def get_weather(
+        self, frequency: Frequency, city: str, country: str
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        """
+        Retrieve weather measurements from the cache, or from the `AsyncWeatherProvider` if they are not cached.
+
+        Args:
+            frequency: A `Frequency` object representing the frequency of the weather measurements to retrieve.
+            city: A string representing the city for which to retrieve the weather measurements.
+            country: A string representing the country for which to retrieve the weather measurements.
+
+        Returns:
+            A list of `DayMeasurements` or `HourMeasurements` objects.
+        """
+        date = datetime.now().strftime("%Y-%m-%d")
+        logger.info(f"Getting weather for {city}, {country}, {date}, {frequency}")
+
+        if weather := await self._get_cached(frequency, city, country, date):
+            self._increment("cache_hits")
+            return weather
+        self._increment("cache_misses")
+
+        if self.flight_lock is None:
+            return await self._fetch_missing(frequency, city, country, date)
+
+        key = f"{frequency.value}:{city}:{country}:{date}"
+        token = None
+        try:
+            token = await asyncio.to_thread(self.flight_lock.acquire, key)
+        except Exception as e:
+            logger.exception(e)
+        try:
+            # The weather was probably fetched by the process which held the lock before.
+            if weather := await self._get_cached(frequency, city, country, date):
+                self._increment("coalesced_misses")
+                return weather
+            return await self._fetch_missing(frequency, city, country, date)
+        finally:
+            if token is not None:
+                await asyncio.to_thread(self.flight_lock.release, key, token)
+
+    async def _fetch_missing(
+        self, frequency: Frequency, city: str, country: str, date: str
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        location = await self._get_location(city, country)
+        if self.combined:
+            other = Frequency.DAY if frequency == Frequency.HOUR else Frequency.HOUR
+            if not await self._get_cached(other, city, country, date):
+                return (await self._fetch_combined(city, country, location))[frequency]
+        return await self._fetch(frequency, city, country, location)
+
+    async def _get_cached(
+        self, frequency: Frequency, city: str, country: str, date: str
+    ) -> list[DayMeasurements] | list[HourMeasurements] | None:
+        with self._timer("cache_lookup"):
+            return await asyncio.to_thread(self.database_service.get_weather, frequency, city, country, date)
+
+    async def _get_location(self, city: str, country: str) -> tuple[float, float]:
+        with self._timer("geocoding"):
+            location = await self.location_provider.get_location(city, country)
+        if location is None:
+            raise ValueError(f"Location not found for {city}, {country}")
+        return location
+
+    async def _fetch(
+        self, frequency: Frequency, city: str, country: str, location: tuple[float, float]
+    ) -> list[DayMeasurements] | list[HourMeasurements]:
+        with self._timer("weather_request"):
+            if frequency == Frequency.DAY:
+                weather_received = await self.weather_provider.get_weather_daily(*location)
+            else:
+                weather_received = await self.weather_provider.get_weather_hourly(*location)
+        logger.info(f"Weather received for {city}, {country}")
+
+        # An empty result of a failed request is not cached, so the next lookup requests the weather again.
+        if weather_received:
+            with self._timer("cache_store"):
+                await asyncio.to_thread(self.database_service.store_weather, frequency, city, country, weather_received)
+        return weather_received
+
+    async def _fetch_combined(
+        self, city: str, country: str, location: tuple[float, float]
+    ) -> dict[Frequency, list[DayMeasurements] | list[HourMeasurements]]:
+        with self._timer("weather_request"):
+            hourly, daily = await self.weather_provider.get_weather_combined(*location)
+        logger.info(f"Hourly and daily weather received for {city}, {country}")
+        self._increment("combined_requests")
+
+        weathers: dict[Frequency, list[DayMeasurements] | list[HourMeasurements]] = {
+            Frequency.HOUR: hourly,
+            Frequency.DAY: daily,
+        }
+        received = {frequency: weather for frequency, weather in weathers.items() if weather}
+        if received:
+            with self._timer("cache_store"):
+                await asyncio.to_thread(self.database_service.store_weathers, city, country, received)
+        return weathers
+
+    def _timer(self, stage: str) -> AbstractContextManager:
+        return nullcontext() if self.metrics is None else self.metrics.timer(stage)
+
+    def _increment(self, counter: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment(counter)
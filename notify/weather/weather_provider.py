@@ -1,9 +1,13 @@
 import json
 from abc import ABC, abstractmethod
 from time import sleep
+from typing import Any, Callable, TypeVar
 
+import httpx
 import requests
 
+from notify.app import http_client
+from notify.app.deadline import Deadline, call_timeout
 from notify.app.logger import LoggerType, create_logger
 from notify.models.measurements import DayMeasurements, HourMeasurements
 
@@ -11,6 +15,8 @@ from . import OPEN_MATEO_CONFIG
 
 logger = create_logger(LoggerType.WEATHER, "OPENMATEO")
 
+T = TypeVar("T")
+
 
 class WeatherProvider(ABC):
     @abstractmethod
@@ -21,21 +27,63 @@ class WeatherProvider(ABC):
     def get_weather_hourly(self, latitude: float, longitude: float) -> list[HourMeasurements]:
         ...
 
+    def get_weather_daily_batch(self, locations: list[tuple[float, float]]) -> list[list[DayMeasurements]]:
+        """
+        Retrieve daily weather measurements of several locations.
 
-class OpenMeteo(WeatherProvider):
-    """
-    Weather provider using the OpenMeteo API.
+        Providers which can request several locations at once override this method.
+        By default, the locations are requested one by one.
+
+        Args:
+            locations: A list of (latitude, longitude) tuples.
+
+        Returns:
+            A list with a list of `DayMeasurements` objects for every location, in the order of `locations`.
+        """
+        return [self.get_weather_daily(*location) for location in locations]
+
+    def get_weather_hourly_batch(self, locations: list[tuple[float, float]]) -> list[list[HourMeasurements]]:
+        """
+        Retrieve hourly weather measurements of several locations.
+
+        Returns:
+            A list with a list of `HourMeasurements` objects for every location, in the order of `locations`.
+        """
+        return [self.get_weather_hourly(*location) for location in locations]
+
+    def get_weather_combined(
+        self, latitude: float, longitude: float
+    ) -> tuple[list[HourMeasurements], list[DayMeasurements]]:
+        """
+        Retrieve hourly and daily weather measurements of a single location.
+
+        Providers which can return both in a single response override this method.
+        By default, they are requested separately.
+
+        Returns:
+            A tuple of a list of `HourMeasurements` objects and a list of `DayMeasurements` objects.
+        """
+        return self.get_weather_hourly(latitude, longitude), self.get_weather_daily(latitude, longitude)
 
-    This class provides methods for retrieving daily and hourly weather measurements using the OpenMeteo API.
+
+class OpenMeteoBase:
+    """
+    Configuration, URLs and response parsing shared by the blocking and async OpenMeteo providers.
 
     Attributes:
         config: A dictionary representing the configuration for the OpenMeteo API.
         base_url: A string representing the base URL for the OpenMeteo API.
+        deadline: An optional `Deadline` object limiting the timeouts of the requests.
+        batch_size: An integer representing the maximum number of locations in a single request.
     """
 
     config: dict
+    timeout: float = 10
+
+    def __init__(self, deadline: Deadline | None = None, batch_size: int = 100) -> None:
+        self.deadline = deadline
+        self.batch_size = max(1, batch_size)
 
-    def __init__(self) -> None:
         with open(OPEN_MATEO_CONFIG) as f:
             self.config = json.load(f)
             self.base_url = self.config["base_url"]
@@ -44,13 +92,15 @@ class OpenMeteo(WeatherProvider):
             logger.exception("OpenMeteo config not found")
             raise ValueError("OpenMeteo config not found")
 
-    def _format_url_hourly(self, latitude: float, longitude: float) -> str:
+    def _format_url_hourly(self, latitude: float | str, longitude: float | str) -> str:
         """
         Format the URL for retrieving hourly weather measurements.
 
         Args:
-            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
-            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements,
+                or a string with comma-separated latitudes of several locations.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements,
+                or a string with comma-separated longitudes of several locations.
 
         Returns:
             A string representing the URL for retrieving hourly weather measurements from the OpenMeteo API.
@@ -62,13 +112,15 @@ class OpenMeteo(WeatherProvider):
         )
         return url
 
-    def _format_url_daily(self, latitude: float, longitude: float) -> str:
+    def _format_url_daily(self, latitude: float | str, longitude: float | str) -> str:
         """
         Format the URL for retrieving daily weather measurements.
 
         Args:
-            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
-            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements,
+                or a string with comma-separated latitudes of several locations.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements,
+                or a string with comma-separated longitudes of several locations.
 
         Returns:
             A string representing the URL for retrieving daily weather measurements from the OpenMeteo API.
@@ -80,31 +132,23 @@ class OpenMeteo(WeatherProvider):
         )
         return url
 
-    def get_weather_daily(self, latitude: float, longitude: float) -> list[DayMeasurements]:
+    def _format_url_combined(self, latitude: float, longitude: float) -> str:
         """
-        Retrieve daily weather measurements.
+        Format the URL for retrieving hourly and daily weather measurements in a single request.
 
-        Args:
-            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
-            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
-
-        Returns:
-            A list of `DayMeasurements` objects representing the daily weather measurements for the location.
+        The forecast covers the days of the daily URL, so the hourly measurements are limited to the first day
+        by `_parse_combined`, like with the hourly URL.
         """
-        url = self._format_url_daily(latitude, longitude)
-        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
-
-        results = None
-        try:
-            results = requests.get(url, timeout=(10, 10)).json()
-        except requests.exceptions.Timeout:
-            logger.exception(f"Timeout while getting daily weather for {latitude}, {longitude}")
-        except Exception as e:
-            logger.exception(f"Error {e} while getting daily weather for {latitude}, {longitude}")
-
-        if results is None:
-            return []
+        url = (
+            f"{self.base_url}?latitude={latitude}&longitude={longitude}"
+            "&hourly=temperature_2m,relativehumidity_2m,precipitation,precipitation_probability"
+            "&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,"
+            "precipitation_probability_max&timezone=auto"
+        )
+        return url
 
+    @staticmethod
+    def _parse_daily(results: dict) -> list[DayMeasurements]:
         results = results["daily"]
         measurements = []
         for values in zip(
@@ -125,31 +169,15 @@ class OpenMeteo(WeatherProvider):
             )
         return measurements
 
-    def get_weather_hourly(self, latitude: float, longitude: float) -> list[HourMeasurements]:
-        """
-        Retrieve hourly weather measurements.
-
-        Args:
-            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
-            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
-
-        Returns:
-            A list of `HourMeasurements` objects representing the hourly weather measurements for the location.
-        """
-        url = self._format_url_hourly(latitude, longitude)
-        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
-
-        results = None
-        try:
-            results = requests.get(url, timeout=(10, 10)).json()
-        except requests.exceptions.Timeout:
-            logger.exception(f"Timeout while getting daily weather for {latitude}, {longitude}")
-        except Exception as e:
-            logger.exception(f"Error {e} while getting daily weather for {latitude}, {longitude}")
-
-        if results is None:
-            return []
+    @classmethod
+    def _parse_combined(cls, results: dict) -> tuple[list[HourMeasurements], list[DayMeasurements]]:
+        hourly = cls._parse_hourly(results)
+        # Hours are in local time of the location, so the first day is the day of the first hour.
+        first_day = hourly[0].date[:10] if hourly else None
+        return [hour for hour in hourly if hour.date[:10] == first_day], cls._parse_daily(results)
 
+    @staticmethod
+    def _parse_hourly(results: dict) -> list[HourMeasurements]:
         results = results["hourly"]
         measurements = []
         for values in zip(
@@ -170,3 +198,216 @@ class OpenMeteo(WeatherProvider):
                 )
             )
         return measurements
+
+
+class OpenMeteo(OpenMeteoBase, WeatherProvider):
+    """
+    Weather provider using the OpenMeteo API.
+
+    This class provides methods for retrieving daily and hourly weather measurements using the OpenMeteo API.
+    The forecast endpoint accepts comma-separated lists of coordinates, so the batch methods request
+    up to `batch_size` locations at once.
+    """
+
+    def get_weather_daily(self, latitude: float, longitude: float) -> list[DayMeasurements]:
+        """
+        Retrieve daily weather measurements.
+
+        Args:
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+
+        Returns:
+            A list of `DayMeasurements` objects representing the daily weather measurements for the location.
+        """
+        url = self._format_url_daily(latitude, longitude)
+        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
+
+        results = self._request(url, f"daily weather for {latitude}, {longitude}")
+        if results is None:
+            return []
+        return self._parse_daily(results)
+
+    def get_weather_hourly(self, latitude: float, longitude: float) -> list[HourMeasurements]:
+        """
+        Retrieve hourly weather measurements.
+
+        Args:
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+
+        Returns:
+            A list of `HourMeasurements` objects representing the hourly weather measurements for the location.
+        """
+        url = self._format_url_hourly(latitude, longitude)
+        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
+
+        results = self._request(url, f"hourly weather for {latitude}, {longitude}")
+        if results is None:
+            return []
+        return self._parse_hourly(results)
+
+    def get_weather_combined(
+        self, latitude: float, longitude: float
+    ) -> tuple[list[HourMeasurements], list[DayMeasurements]]:
+        """
+        Retrieve hourly and daily weather measurements with a single request.
+
+        Args:
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+
+        Returns:
+            A tuple of a list of `HourMeasurements` objects of the current day and a list of `DayMeasurements`
+                objects, the same as `get_weather_hourly` and `get_weather_daily` return. Both lists are empty
+                if the request failed.
+        """
+        url = self._format_url_combined(latitude, longitude)
+        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
+
+        results = self._request(url, f"hourly and daily weather for {latitude}, {longitude}")
+        if results is None:
+            return [], []
+        return self._parse_combined(results)
+
+    def get_weather_daily_batch(self, locations: list[tuple[float, float]]) -> list[list[DayMeasurements]]:
+        """
+        Retrieve daily weather measurements of several locations with one request per `batch_size` locations.
+
+        Args:
+            locations: A list of (latitude, longitude) tuples.
+
+        Returns:
+            A list with a list of `DayMeasurements` objects for every location, in the order of `locations`.
+                The list is empty for the locations of a failed request.
+        """
+        return self._get_batch(locations, self._format_url_daily, self._parse_daily, "daily")
+
+    def get_weather_hourly_batch(self, locations: list[tuple[float, float]]) -> list[list[HourMeasurements]]:
+        """
+        Retrieve hourly weather measurements of several locations with one request per `batch_size` locations.
+
+        Args:
+            locations: A list of (latitude, longitude) tuples.
+
+        Returns:
+            A list with a list of `HourMeasurements` objects for every location, in the order of `locations`.
+                The list is empty for the locations of a failed request.
+        """
+        return self._get_batch(locations, self._format_url_hourly, self._parse_hourly, "hourly")
+
+    def _get_batch(
+        self,
+        locations: list[tuple[float, float]],
+        format_url: Callable[[str, str], str],
+        parse: Callable[[dict], list[T]],
+        kind: str,
+    ) -> list[list[T]]:
+        measurements: list[list[T]] = []
+        for start in range(0, len(locations), self.batch_size):
+            chunk = locations[start: start + self.batch_size]
+            latitudes = ",".join(str(latitude) for latitude, _ in chunk)
+            longitudes = ",".join(str(longitude) for _, longitude in chunk)
+            logger.info(f"Getting {kind} weather for {len(chunk)} locations")
+
+            results = self._request(format_url(latitudes, longitudes), f"{kind} weather for {len(chunk)} locations")
+            if isinstance(results, dict) and results.get("error"):
+                logger.error(f"Error {results.get('reason')} while getting {kind} weather for {len(chunk)} locations")
+                results = None
+            # A single location is returned as an object, several locations as a list of objects.
+            if isinstance(results, dict):
+                results = [results]
+            if results is None or len(results) != len(chunk):
+                if results is not None:
+                    logger.error(f"Expected {len(chunk)} locations in {kind} weather, received {len(results)}")
+                measurements.extend([] for _ in chunk)
+                continue
+            measurements.extend(parse(result) for result in results)
+        return measurements
+
+    def _request(self, url: str, description: str) -> Any:
+        """
+        Send a request to the OpenMeteo API through the pooled client of the process.
+
+        Returns:
+            The decoded JSON response, or None if the request failed.
+        """
+        timeout = call_timeout(self.deadline, self.timeout, "weather request")
+        try:
+            return http_client.get(url, timeout, self.deadline).json()
+        except requests.exceptions.Timeout:
+            logger.exception(f"Timeout while getting {description}")
+        except Exception as e:
+            logger.exception(f"Error {e} while getting {description}")
+        return None
+
+
+class AsyncOpenMeteo(OpenMeteoBase):
+    """
+    Weather provider using the OpenMeteo API without blocking the event loop.
+
+    It sends the same requests and returns the same measurements as `OpenMeteo`, but its methods are awaitable,
+    so a single process can keep many requests in flight. Connections are pooled by the async client of the
+    running event loop, see `notify.app.http_client.AsyncHttpClient`.
+    """
+
+    async def get_weather_daily(self, latitude: float, longitude: float) -> list[DayMeasurements]:
+        """
+        Retrieve daily weather measurements.
+
+        Args:
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+
+        Returns:
+            A list of `DayMeasurements` objects representing the daily weather measurements for the location.
+        """
+        url = self._format_url_daily(latitude, longitude)
+        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
+
+        results = await self._request(url, f"daily weather for {latitude}, {longitude}")
+        if results is None:
+            return []
+        return self._parse_daily(results)
+
+    async def get_weather_hourly(self, latitude: float, longitude: float) -> list[HourMeasurements]:
+        """
+        Retrieve hourly weather measurements.
+
+        Args:
+            latitude: A float representing the latitude of the location for which to retrieve weather measurements.
+            longitude: A float representing the longitude of the location for which to retrieve weather measurements.
+
+        Returns:
+            A list of `HourMeasurements` objects representing the hourly weather measurements for the location.
+        """
+        url = self._format_url_hourly(latitude, longitude)
+        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
+
+        results = await self._request(url, f"hourly weather for {latitude}, {longitude}")
+        if results is None:
+            return []
+        return self._parse_hourly(results)
+
+    async def get_weather_combined(
+        self, latitude: float, longitude: float
+    ) -> tuple[list[HourMeasurements], list[DayMeasurements]]:
+        """Retrieve hourly and daily weather measurements in one request, see `OpenMeteo.get_weather_combined`."""
+        url = self._format_url_combined(latitude, longitude)
+        logger.info(f"Getting weather for {latitude}, {longitude} at url {url}")
+
+        results = await self._request(url, f"hourly and daily weather for {latitude}, {longitude}")
+        if results is None:
+            return [], []
+        return self._parse_combined(results)
+
+    async def _request(self, url: str, description: str) -> Any:
+        timeout = call_timeout(self.deadline, self.timeout, "weather request")
+        try:
+            response = await http_client.aget(url, timeout, self.deadline)
+            return response.json()
+        except httpx.TimeoutException:
+            logger.exception(f"Timeout while getting {description}")
+        except Exception as e:
+            logger.exception(f"Error {e} while getting {description}")
+        return None